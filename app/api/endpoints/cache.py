@@ -1,6 +1,13 @@
 from fastapi import APIRouter
 from ...schemas.responses import BaseResponse
-from ...core.cache import cache
+from ...core.cache import cache, result_cache
+from ...core.memo import base64_memo
+from ...core.imaging import normalizer
+from ...core.variants import variants
+from ...core.events import events
+from ...core.eta import estimator
+from ...core.lifecycle import lifecycle
+from ...core.config import settings
 from ...core.logger import get_logger
 from typing import Dict, Any
 
@@ -14,20 +21,22 @@ async def get_cache_status():
     """
     try:
         cache_data = {
-            "status": {
-                "current_size": len(cache._cache),
-                "max_size": cache._cache.maxsize,
-                "ttl": getattr(cache._cache, 'ttl', None)
-            },
+            "status": cache.stats(),
+            "results": result_cache.stats(),
+            "base64_memo": base64_memo.stats(),
+            "normalizer": normalizer.stats(),
+            "variants": variants.stats(),
+            "events": events.stats(),
+            "eta": estimator.stats(),
+            "storage": lifecycle.stats() if settings.STORAGE_LIFECYCLE else None,
             "entries": {}
         }
 
-        # Iterate through cache entries without TTL calculations
-        for key, value in cache._cache.items():
+        for key, value, ttl_remaining in cache.items():
             try:
                 cache_data["entries"][str(key)] = {
                     "value": value,
-                    "ttl_remaining": None  # TTL removed for compatibility
+                    "ttl_remaining": ttl_remaining
                 }
             except Exception as e:
                 logger.warning(f"Error processing cache entry {key}: {str(e)}")
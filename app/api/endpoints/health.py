@@ -1,7 +1,9 @@
 from fastapi import APIRouter
 from ...schemas.responses import HealthResponse, RootResponse
 from ...core.config import settings
-from ...core.logger import get_logger
+from ...core.http_client import http_client
+from ...core.segmind import segmind
+from ...core.logger import get_logger, log_sampled
 
 logger = get_logger()
 router = APIRouter()
@@ -34,9 +36,11 @@ async def health_check():
     try:
         health_data = {
             "version": settings.VERSION,
-            "status": "healthy"
+            "status": "healthy",
+            "http_pool": http_client.stats(),
+            "segmind": segmind.stats()
         }
-        logger.info("Health check performed successfully")
+        log_sampled("INFO", "health.ok", "Health check performed successfully")
         return HealthResponse(
             status_code=1000,
             message="System is healthy",
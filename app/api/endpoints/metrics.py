@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Response
+from ...core.metrics import metrics
+from ...core.cache import cache
+from ...core.memo import base64_memo
+from ...core.scheduler import scheduler
+from ...core.segmind import segmind
+from ...core.events import events
+from ...core.http_client import http_client
+from ...core.lifecycle import lifecycle
+from ...core.variants import variants
+from ...core.config import settings
+from ...core.logger import get_logger
+
+logger = get_logger()
+router = APIRouter()
+
+# Gauges and counters that already exist as stats() of the core components are
+# read at scrape time instead of being recorded again on every request
+metrics.gauge_callback("scheduler_jobs_queued", "Jobs waiting in the scheduler queue", lambda: scheduler.stats()["depth"])
+metrics.gauge_callback("scheduler_jobs_in_flight", "Jobs being run by scheduler workers", lambda: scheduler.stats()["in_flight"])
+metrics.gauge_callback("scheduler_workers", "Scheduler worker pool size", lambda: scheduler.workers)
+metrics.counter_callback(
+    "scheduler_jobs_total", "Scheduler jobs by outcome",
+    lambda: {(outcome,): scheduler.stats()[outcome] for outcome in ("completed", "failed", "rejected")},
+    ("outcome",)
+)
+metrics.counter_callback(
+    "cache_lookups_total", "Job store lookups by result",
+    lambda: {("hit",): cache.stats()["hits"], ("miss",): cache.stats()["misses"]},
+    ("result",)
+)
+metrics.counter_callback(
+    "base64_memo_lookups_total", "Encoded image memo lookups by result",
+    lambda: {("hit",): base64_memo.stats()["hits"], ("miss",): base64_memo.stats()["misses"]},
+    ("result",)
+)
+metrics.gauge_callback("cache_entries", "Records in the job store", lambda: cache.currsize)
+metrics.gauge_callback("segmind_in_flight", "Segmind calls in flight", lambda: segmind.limiter.in_flight)
+metrics.gauge_callback("segmind_concurrency_limit", "Current AIMD concurrency limit of the Segmind client", lambda: int(segmind.limiter.limit))
+metrics.gauge_callback(
+    "segmind_breaker_open", "1 while the Segmind circuit breaker is not closed",
+    lambda: int(segmind.breaker.state != segmind.breaker.CLOSED)
+)
+metrics.counter_callback(
+    "segmind_calls_total", "Segmind client calls, attempts, retries and failures",
+    lambda: {(kind,): segmind.stats()[kind] for kind in ("calls", "attempts", "retried", "failed")},
+    ("kind",)
+)
+metrics.counter_callback(
+    "image_variant_requests_total", "Preview variant requests by outcome",
+    lambda: {(outcome,): variants.stats()[outcome] for outcome in ("hits", "rendered", "joined", "failed")},
+    ("outcome",)
+)
+metrics.gauge_callback("event_subscribers", "Open status event streams and long polls", lambda: events.stats()["subscribers"])
+metrics.gauge_callback("http_pool_connections_in_use", "Outbound connections in use", lambda: http_client.stats()["in_use"])
+if settings.STORAGE_LIFECYCLE:
+    metrics.gauge_callback("storage_files", "Files in the storage lifecycle index", lambda: lifecycle.usage()[0])
+    metrics.gauge_callback("storage_bytes", "Bytes of files in the storage lifecycle index", lambda: lifecycle.usage()[1])
+    metrics.counter_callback(
+        "storage_files_removed_total", "Files removed by the storage sweeper of this worker",
+        lambda: {("expired",): lifecycle.expired, ("evicted",): lifecycle.evicted},
+        ("reason",)
+    )
+    metrics.counter_callback("storage_bytes_freed_total", "Bytes freed by the storage sweeper of this worker", lambda: lifecycle.bytes_freed)
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """
+    Metrics of this worker in the Prometheus text format
+    """
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -1,53 +1,136 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Header, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Callable, Optional, Dict, Any, List, Tuple
 import uuid
 import base64
+import hashlib
+import json
 import os
 import requests
 import random
+import time
 import aiofiles
 import aiohttp
 import asyncio
 from pathlib import Path
-from ...schemas.responses import InitiateProcessResponse, ProcessBookResponse, ProcessStatusResponse, ProcessStatus, InitProcessData
-from ...core.cache import cache
+from ...schemas.responses import (
+    InitiateProcessResponse, ProcessBookResponse, ProcessBookBatchResponse, ProcessStatusResponse,
+    ProcessStatus, BatchPageStatus, InitProcessData
+)
+from ...core.cache import cache, result_cache
+from ...core.events import events, RESYNC
+from ...core.eta import estimator
+from ...core.segmind import segmind
+from ...core.http_client import http_client
+from ...core.memo import base64_memo, SingleFlight
+from ...core.imaging import normalizer
+from ...core.masking import mask_faces_async
+from ...core.lifecycle import lifecycle
+from ...core.storage import find_stored, storage_path
+from ...core.streaming import ImageSource
+from ...core.scheduler import scheduler, QueueFullError, SchedulerClosedError
+from ...core.metrics import page_stage_seconds, page_jobs
 from ...core.config import settings
 from ...core.logger import get_logger
 
 logger = get_logger()
 router = APIRouter()
 
+# Stages of a page job: image preparation (normalize, mask, base64), the Segmind
+# round trip, the result write, recording state changes, and the job as a whole
+STAGE_PREPARE = page_stage_seconds.labels("prepare")
+STAGE_SEGMIND = page_stage_seconds.labels("segmind")
+STAGE_WRITE = page_stage_seconds.labels("write")
+STAGE_RECORD = page_stage_seconds.labels("record")
+STAGE_TOTAL = page_stage_seconds.labels("total")
+
 # Helper functions for image conversion
 async def image_file_to_base64(image_path: str) -> str:
     async with aiofiles.open(image_path, 'rb') as f:
         image_data = await f.read()
     return base64.b64encode(image_data).decode('utf-8')
 
-async def image_url_to_base64(image_url: str) -> str:
-    async with aiohttp.ClientSession() as session:
-        async with session.get(image_url) as response:
-            image_data = await response.read()
-            return base64.b64encode(image_data).decode('utf-8')
+async def read_image_bytes(image_ref: str) -> bytes:
+    if image_ref.startswith(('http://', 'https://')):
+        session = await http_client.get_session()
+        async with session.get(image_ref) as response:
+            return await response.read()
+    full_path = find_stored(image_ref)
+    if not os.path.exists(full_path):
+        raise FileNotFoundError(f"Image not found: {full_path}")
+    async with aiofiles.open(full_path, 'rb') as f:
+        return await f.read()
 
-async def resolve_image_to_base64(image_ref: str) -> str:
+async def resolve_image(image_ref: str) -> ImageSource:
     if image_ref.startswith(('http://', 'https://')):
-        return await image_url_to_base64(image_ref)
-    else:
-        full_path = os.path.join(settings.UPLOAD_DIR, image_ref)
-        if not os.path.exists(full_path):
-            raise FileNotFoundError(f"Image not found: {full_path}")
-        return await image_file_to_base64(full_path)
+        return ImageSource(data=await read_image_bytes(image_ref))
+    full_path = find_stored(image_ref)
+    if not os.path.exists(full_path):
+        raise FileNotFoundError(f"Image not found: {full_path}")
+    encoded = None
+    if 4 * ((os.path.getsize(full_path) + 2) // 3) <= base64_memo.max_bytes:
+        # Source photos and template pages are reused by many pages: share one
+        # encoding of each. Files the memo cannot hold are read while the request is sent.
+        encoded = await base64_memo.get(str(full_path), image_file_to_base64)
+    return ImageSource(path=full_path, encoded=encoded)
+
+async def masked_image(image_ref: str) -> ImageSource:
+    # Faces are masked in memory on the masking pool; nothing is written to disk
+    masked = await mask_faces_async(await read_image_bytes(image_ref), encode=".png")
+    return ImageSource(data=masked)
+
+async def prepare_image(image_ref: str, mask_face: bool = False) -> Tuple[ImageSource, int]:
+    """
+    Normalize an image and reference it for Segmind
+    :param image_ref: URL or filename relative to UPLOAD_DIR
+    :param mask_face: Make detected faces transparent first
+    :return: (image to send, payload bytes saved by normalization)
+    """
+    ref, saved = await normalizer.prepare(image_ref)
+    if mask_face:
+        return await masked_image(ref), saved
+    return await resolve_image(ref), saved
+
+async def buffered_payload(segmind_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Replace images by their base64 strings, for SEGMIND_STREAMING=false
+    :param segmind_data: Request body with ImageSource values
+    :return: Request body ready for json serialization
+    """
+    payload = {}
+    for key, value in segmind_data.items():
+        if isinstance(value, ImageSource):
+            value = await value.base64()
+        payload[key] = value
+    return payload
 
 class ProcessBookRequest(BaseModel):
     init_id: str
     source_url: str
     target_url: str
     prompt: Dict[str, Any]
+    priority: bool = False
+    deterministic: Optional[bool] = None  # Pin the seed and reuse identical results; defaults to SEGMIND_DETERMINISTIC
+    mask_face: bool = False  # Make faces in the target page transparent before the swap
+
+class BatchPage(BaseModel):
+    target_url: str
+    prompt: Dict[str, Any] = {}
+    mask_face: bool = False
+
+class ProcessBookBatchRequest(BaseModel):
+    init_id: str
+    source_url: str  # Shared by every page; resolved once per batch
+    pages: List[BatchPage]
+    priority: bool = False
+    deterministic: Optional[bool] = None
 
 class ProcessStatusRequest(BaseModel):
-    process_id: str
+    process_id: Optional[str] = None  # May be omitted when page_id is given
     page_id: Optional[str] = None
+    if_version: Optional[int] = None  # Version the client already has; unchanged answers are short
+    wait_seconds: float = 0  # With if_version, wait up to this long for a change (long poll)
 
 class PromptTemplate:
     DEFAULT_TEMPLATE = """
@@ -59,85 +142,244 @@ class PromptTemplate:
         custom_prompt = prompt_data.get('prompt', 'A professional headshot with natural lighting and neutral background')
         return cls.DEFAULT_TEMPLATE.format(prompt=custom_prompt).strip()
 
-async def process_image_background(process_id: str, page_id: str, source_url: str, target_url: str, prompt: Dict[str, Any]):
+TERMINAL_STATES = ("COMPLETED", "FAILED")
+
+def set_page_state(process_id: str, page_id: str, **fields: Any) -> Optional[int]:
+    """
+    Record a page state change and push it to event stream subscribers
+    :param process_id: Process ID (init_id)
+    :param page_id: Page ID
+    :param fields: Page fields to set, e.g. status="COMPLETED", url=...
+    :return: New record version, or None on failure
+    """
+    with STAGE_RECORD.time():
+        version = cache.update_page(process_id, page_id, **fields)
+        events.publish(process_id, {"page_id": page_id, "version": version, **fields})
+    if fields.get("status") in TERMINAL_STATES:
+        page_jobs.labels(fields["status"], fields.get("result_source", "none")).inc()
+    return version
+
+def page_aborter(process_id: str, page_id: str) -> Callable[[str], Optional[int]]:
+    """
+    Callback failing a page whose job the scheduler dropped or cancelled on
+    shutdown, so clients waiting on it see a terminal state
+    :param process_id: Process ID (init_id)
+    :param page_id: Page ID
+    :return: Callable taking the reason
+    """
+    def abort(reason: str) -> Optional[int]:
+        return set_page_state(process_id, page_id, status="FAILED", url=None, error=reason)
+    return abort
+
+async def wait_for_change(process_id: str, since: int, timeout: float) -> Optional[int]:
+    """
+    Wait until a process record's version moves past a known one
+    :param process_id: Process ID (init_id)
+    :param since: Version the caller already has
+    :param timeout: Maximum seconds to wait
+    :return: Current version (equal to since on timeout), or None if the record is gone
+    """
+    queue = events.subscribe(process_id)
+    try:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            version = cache.get_version(process_id)
+            remaining = deadline - loop.time()
+            if version != since or remaining <= 0:
+                return version
+            # Changes in this worker wake us at once; other workers' are seen on the next check
+            try:
+                await asyncio.wait_for(queue.get(), timeout=min(remaining, settings.EVENTS_POLL_INTERVAL))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        events.unsubscribe(process_id, queue)
+
+def completion_estimate(process_id: str, remaining: int) -> Dict[str, Optional[float]]:
+    """
+    Estimate when a process finishes and when its client should poll next
+    :param process_id: Process ID (init_id)
+    :param remaining: Pages not yet COMPLETED or FAILED
+    :return: eta_seconds, estimated_completion_at and next_poll_seconds
+    """
+    eta, next_poll = estimator.estimate(remaining, scheduler.fair_share(process_id))
+    return {
+        "eta_seconds": eta,
+        "estimated_completion_at": round(time.time() + eta, 2) if eta is not None else None,
+        "next_poll_seconds": next_poll,
+    }
+
+def parse_etag(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    value = value.strip()
+    # Not str.removeprefix: Python 3.8 is still supported
+    value = value[2:] if value.startswith("W/") else value
     try:
-        logger.info(f"Starting background task for {process_id}/{page_id}")
+        return int(value.strip('"'))
+    except ValueError:
+        return None
+
+# Identical deterministic jobs running in this worker share one Segmind call
+segmind_flight = SingleFlight()
+
+async def job_fingerprint(segmind_data: Dict[str, Any]) -> str:
+    """
+    Fingerprint a Segmind request from its images and parameters
+    :param segmind_data: Request body as sent to Segmind
+    :return: SHA-256 hex digest
+    """
+    digest = hashlib.sha256()
+    for key in sorted(segmind_data):
+        value = segmind_data[key]
+        if isinstance(value, ImageSource):
+            # Images by the digest of their bytes, so identical content matches whatever its name
+            value = f"sha256:{await value.digest()}"
+        digest.update(f"{key}={value};".encode('utf-8'))
+    return digest.hexdigest()
+
+def cached_result(fingerprint: str) -> Optional[str]:
+    """
+    Get the result file of a completed job with this fingerprint, if still on disk
+    :param fingerprint: Job fingerprint
+    :return: Result filename or None
+    """
+    filename = result_cache.get(f"result:{fingerprint}")
+    if filename and find_stored(filename).exists():
+        return filename
+    return None
+
+async def run_segmind(segmind_data: Dict[str, Any], page_id: str) -> str:
+    """
+    Call Segmind and save the returned image
+    :param segmind_data: Request body
+    :param page_id: Page the result file is named after
+    :return: Result filename in UPLOAD_DIR
+    """
+    new_filename = f"p_{page_id}_{uuid.uuid4()}_result.png"
+    output_path = storage_path(new_filename)
+    
+    # Retries, adaptive concurrency and the circuit breaker live in the client
+    started = time.monotonic()
+    if settings.SEGMIND_STREAMING:
+        # The result is written while it arrives, so the write is part of the Segmind stage
+        checksum, size = await segmind.swap_to_file(segmind_data, output_path)
+        elapsed = time.monotonic() - started
+    else:
+        image_data = await segmind.swap(await buffered_payload(segmind_data))
+        elapsed = time.monotonic() - started
+        with STAGE_WRITE.time():
+            async with aiofiles.open(output_path, "wb") as f:
+                await f.write(image_data)
+        checksum, size = hashlib.sha256(image_data).hexdigest(), len(image_data)
+    estimator.observe(elapsed)
+    STAGE_SEGMIND.observe(elapsed)
+    logger.debug(f"Stored {new_filename}: {size} bytes, sha256 {checksum}")
+    
+    return new_filename
+
+async def process_image_background(
+    process_id: str,
+    page_id: str,
+    source_url: str,
+    target_url: str,
+    prompt: Dict[str, Any],
+    deterministic: Optional[bool] = None,
+    mask_face: bool = False,
+    source: Optional[Tuple[ImageSource, int]] = None
+):
+    """
+    Run one page through Segmind and record the outcome on its page
+    :param source: Already prepared (image, bytes saved) source shared by a batch
+    """
+    # Every line logged while this page runs (including by the Segmind client) carries its IDs
+    with logger.contextualize(process_id=process_id, page_id=page_id), STAGE_TOTAL.time():
+        try:
+            logger.info(f"Starting background task for {process_id}/{page_id}")
         
-        # Get existing cache data
-        process_data = cache.get(process_id) or {}
-        process_data[page_id] = {"status": "PROCESSING", "url": None}
-        cache.set(process_id, process_data, expire=3600)
+            set_page_state(process_id, page_id, status="PROCESSING", url=None)
         
-        # Convert images to base64 asynchronously
-        source_base64, target_base64 = await asyncio.gather(
-            resolve_image_to_base64(source_url),
-            resolve_image_to_base64(target_url)
-        )
+            if deterministic is None:
+                deterministic = settings.SEGMIND_DETERMINISTIC
         
-        # Prepare Segmind API request
-        segmind_data = {
-            "source_image": target_base64,
-            "target_image": source_base64,
-            "face_strength": 0.8,
-            "style_strength": 0.8,
-            "seed": random.randint(1, 1000000),
-            "steps": 10,
-            "cfg": 1.5,
-            "output_format": "png",
-            "output_quality": 95,
-            "base64": False
-        }
+            # Downsize and recompress images off the event loop
+            with STAGE_PREPARE.time():
+                if source is None:
+                    source, (target_image, target_saved) = await asyncio.gather(
+                        prepare_image(source_url),
+                        prepare_image(target_url, mask_face)
+                    )
+                else:
+                    target_image, target_saved = await prepare_image(target_url, mask_face)
+            source_image, source_saved = source
+            payload_bytes_saved = source_saved + target_saved
         
-        # Make async HTTP request
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                settings.SEGMIND_API_URL,
-                json=segmind_data,
-                headers={'x-api-key': settings.SEGMIND_API_KEY},
-                timeout=100
-            ) as response:
-                
-                if response.status != 200:
-                    error_text = await response.text()
-                    logger.error(f"Segmind API error: {response.status} - {error_text[:200]}")
-                    raise HTTPException(status_code=500, detail="External API error")
-                
-                image_data = await response.read()
-        
-        # Save the result
-        new_filename = f"p_{page_id}_{uuid.uuid4()}_result.png"
-        output_path = os.path.join(settings.UPLOAD_DIR, new_filename)
-        
-        async with aiofiles.open(output_path, "wb") as f:
-            await f.write(image_data)
-        
-        # Generate file URL
-        file_url = f"{settings.APP_URL}/storage/uploads/{new_filename}"
+            # Prepare Segmind API request
+            segmind_data = {
+                "source_image": target_image,
+                "target_image": source_image,
+                "face_strength": 0.8,
+                "style_strength": 0.8,
+                "seed": settings.SEGMIND_SEED if deterministic else random.randint(1, 1000000),
+                "steps": 10,
+                "cfg": 1.5,
+                "output_format": "png",
+                "output_quality": 95,
+                "base64": False
+            }
         
-        # Update cache
-        process_data = cache.get(process_id) or {}
-        process_data[page_id] = {"status": "COMPLETED", "url": file_url}
-        cache.set(process_id, process_data, expire=3600)
+            result_source = "segmind"
+            if deterministic:
+                fingerprint = await job_fingerprint(segmind_data)
+                new_filename = cached_result(fingerprint)
+                if new_filename:
+                    result_source = "cache"
+                else:
+                    new_filename, shared = await segmind_flight.do(
+                        fingerprint, lambda: run_segmind(segmind_data, page_id)
+                    )
+                    if shared:
+                        result_source = "coalesced"
+                    else:
+                        result_cache.set(f"result:{fingerprint}", new_filename)
+            else:
+                new_filename = await run_segmind(segmind_data, page_id)
         
-        logger.info(f"Completed background task for {process_id}/{page_id}")
+            if settings.STORAGE_LIFECYCLE:
+                # A reusable result is kept as long as the result cache points at it
+                ttl = max(settings.JOB_TTL, settings.RESULT_CACHE_TTL) if deterministic else settings.JOB_TTL
+                lifecycle.track(new_filename, "result", owner=process_id, ttl=ttl)
         
-    except asyncio.TimeoutError:
-        logger.error("Segmind API request timed out")
-        process_data = cache.get(process_id) or {}
-        process_data[page_id] = {"status": "FAILED", "url": None, "error": "API timeout"}
-        cache.set(process_id, process_data, expire=3600)
-    except Exception as e:
-        logger.error(f"Background task failed: {str(e)}", exc_info=True)
-        process_data = cache.get(process_id) or {}
-        process_data[page_id] = {"status": "FAILED", "url": None, "error": str(e)}
-        cache.set(process_id, process_data, expire=3600)
+            # Generate file URL
+            file_url = f"{settings.APP_URL}/storage/uploads/{new_filename}"
+        
+            # Update cache
+            set_page_state(
+                process_id,
+                page_id,
+                status="COMPLETED",
+                url=file_url,
+                result_source=result_source,
+                payload_bytes_saved=payload_bytes_saved
+            )
         
+            logger.info(f"Completed background task for {process_id}/{page_id} ({result_source})")
         
+        except asyncio.TimeoutError:
+            logger.error("Segmind API request timed out")
+            set_page_state(process_id, page_id, status="FAILED", url=None, error="API timeout")
+        except Exception as e:
+            logger.error(f"Background task failed: {str(e)}", exc_info=True)
+            set_page_state(process_id, page_id, status="FAILED", url=None, error=str(e))
+        
+        
+
 @router.post("/initiate-process", response_model=InitiateProcessResponse)
 async def initiate_process():
     try:
         init_id = str(uuid.uuid4())
-        cache.set(init_id, {}, expire=3600)
+        cache.set(init_id, {}, expire=settings.JOB_TTL)
         logger.info(f"Process initiated with ID: {init_id}")
         return InitiateProcessResponse(
             status_code=3000,
@@ -153,31 +395,37 @@ async def initiate_process():
         )
 
 @router.post("/process/book", response_model=ProcessBookResponse)
-async def process_book(request: ProcessBookRequest, background_tasks: BackgroundTasks):
+async def process_book(request: ProcessBookRequest):
     try:
         # Validate init_id exists
-        existing_cache = cache.get(request.init_id)
-        if existing_cache is None:
+        if cache.get_version(request.init_id) is None:
             raise HTTPException(status_code=400, detail="Invalid init_id")
         
+        # Keep the uploaded images on disk for as long as the job can use them
+        if settings.STORAGE_LIFECYCLE:
+            lifecycle.claim((request.source_url, request.target_url), request.init_id)
+        
         # Generate page ID
         page_id = str(uuid.uuid4())
         
-        # Update cache
-        process_data = cache.get(request.init_id) or {}
-        process_data[page_id] = {"status": "PENDING", "url": None}
-        cache.set(request.init_id, process_data, expire=3600)
-        
-        # Start background task
-        background_tasks.add_task(
+        # Queue the page; raises when the scheduler is full or draining
+        scheduler.submit(
+            request.init_id,
             process_image_background,
             request.init_id,
             page_id,
             request.source_url,
             request.target_url,
-            request.prompt
+            request.prompt,
+            priority=request.priority,
+            on_abort=page_aborter(request.init_id, page_id),
+            deterministic=request.deterministic,
+            mask_face=request.mask_face
         )
         
+        # Update cache
+        set_page_state(request.init_id, page_id, status="PENDING", url=None)
+        
         logger.info(f"Processing started: {request.init_id}, page: {page_id}")
         return ProcessBookResponse(
             status_code=4000,
@@ -189,6 +437,26 @@ async def process_book(request: ProcessBookRequest, background_tasks: Background
                 url=None
             )
         )
+    except QueueFullError as e:
+        logger.warning(f"Book processing rejected, queue full: {request.init_id}")
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": str(e.retry_after)},
+            content=ProcessBookResponse(
+                status_code=4002,
+                message="Processing queue is full",
+                error=str(e)
+            ).model_dump()
+        )
+    except SchedulerClosedError as e:
+        return JSONResponse(
+            status_code=503,
+            content=ProcessBookResponse(
+                status_code=4003,
+                message="Service is shutting down",
+                error=str(e)
+            ).model_dump()
+        )
     except Exception as e:
         logger.error(f"Book processing failed: {str(e)}")
         return ProcessBookResponse(
@@ -197,12 +465,142 @@ async def process_book(request: ProcessBookRequest, background_tasks: Background
             error=str(e)
         )
 
+@router.post("/process/book/batch", response_model=ProcessBookBatchResponse)
+async def process_book_batch(request: ProcessBookBatchRequest):
+    try:
+        if cache.get_version(request.init_id) is None:
+            raise HTTPException(status_code=400, detail="Invalid init_id")
+        if not request.pages:
+            raise HTTPException(status_code=400, detail="No pages given")
+        if len(request.pages) > settings.BATCH_MAX_PAGES:
+            raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_MAX_PAGES} pages per batch")
+        
+        if settings.STORAGE_LIFECYCLE:
+            lifecycle.claim([request.source_url] + [page.target_url for page in request.pages], request.init_id)
+        
+        # The source photo is the same for every page: normalize and encode it once
+        with STAGE_PREPARE.time():
+            source = await prepare_image(request.source_url)
+        
+        # Fan out through the scheduler, which bounds how many pages run at once;
+        # a page that cannot be queued is reported without failing the others
+        results: List[BatchPageStatus] = []
+        pages: Dict[str, Dict[str, Any]] = {}
+        queue_full: Optional[QueueFullError] = None
+        for index, page in enumerate(request.pages):
+            page_id = str(uuid.uuid4())
+            try:
+                scheduler.submit(
+                    request.init_id,
+                    process_image_background,
+                    request.init_id,
+                    page_id,
+                    request.source_url,
+                    page.target_url,
+                    page.prompt,
+                    priority=request.priority,
+                    on_abort=page_aborter(request.init_id, page_id),
+                    deterministic=request.deterministic,
+                    mask_face=page.mask_face,
+                    source=source
+                )
+                status, error = "PENDING", None
+            except QueueFullError as e:
+                queue_full = e
+                status, error = "FAILED", str(e)
+            pages[page_id] = {"status": status, "url": None}
+            if error:
+                pages[page_id]["error"] = error
+            results.append(BatchPageStatus(
+                process_id=request.init_id,
+                page_id=page_id,
+                status=status,
+                index=index,
+                error=error
+            ))
+        
+        # One write records every page of the batch
+        version = cache.update_pages(request.init_id, pages)
+        for page_id, fields in pages.items():
+            events.publish(request.init_id, {"page_id": page_id, "version": version, **fields})
+        
+        accepted = sum(1 for result in results if result.status == "PENDING")
+        logger.info(f"Batch processing started: {request.init_id}, {accepted}/{len(results)} pages queued")
+        if not accepted and queue_full is not None:
+            return JSONResponse(
+                status_code=429,
+                headers={"Retry-After": str(queue_full.retry_after)},
+                content=ProcessBookBatchResponse(
+                    status_code=4002,
+                    message="Processing queue is full",
+                    data=results,
+                    error=str(queue_full)
+                ).model_dump()
+            )
+        return ProcessBookBatchResponse(
+            status_code=4000,
+            message=f"Processing started for {accepted} of {len(results)} pages",
+            data=results
+        )
+    except SchedulerClosedError as e:
+        return JSONResponse(
+            status_code=503,
+            content=ProcessBookBatchResponse(
+                status_code=4003,
+                message="Service is shutting down",
+                error=str(e)
+            ).model_dump()
+        )
+    except Exception as e:
+        logger.error(f"Batch book processing failed: {str(e)}")
+        return ProcessBookBatchResponse(
+            status_code=4001,
+            message="Processing failed",
+            error=str(e)
+        )
+
 @router.post("/process/status", response_model=ProcessStatusResponse)
-async def get_process_status(request: ProcessStatusRequest):
+async def get_process_status(
+    request: ProcessStatusRequest,
+    response: Response,
+    if_none_match: Optional[str] = Header(None)
+):
     try:
-        process_data = cache.get(request.process_id)
-        if process_data is None:
+        process_id = request.process_id
+        if not process_id:
+            if not request.page_id:
+                raise HTTPException(status_code=400, detail="process_id or page_id is required")
+            process_id = cache.find_by_page(request.page_id)
+            if process_id is None:
+                raise HTTPException(status_code=404, detail="Page not found")
+        
+        # Conditional request: the body field wins over the If-None-Match header
+        since = request.if_version if request.if_version is not None else parse_etag(if_none_match)
+        if since is not None:
+            wait = min(max(request.wait_seconds, 0), settings.STATUS_MAX_WAIT)
+            version = await wait_for_change(process_id, since, wait) if wait else cache.get_version(process_id)
+            if version is None:
+                raise HTTPException(status_code=404, detail="Process not found")
+            if version == since:
+                # Nothing changed: answer from the scheduler without reading the record
+                remaining = scheduler.queued_for(process_id) + scheduler.running_for(process_id)
+                headers = {"ETag": f'"{version}"', "Cache-Control": "no-cache"}
+                if request.if_version is None:
+                    return Response(status_code=304, headers=headers)
+                return JSONResponse(
+                    headers=headers,
+                    content=ProcessStatusResponse(
+                        status_code=5002,
+                        message="Status unchanged",
+                        version=version,
+                        **completion_estimate(process_id, remaining)
+                    ).model_dump()
+                )
+        
+        record = cache.get_record(process_id)
+        if record is None:
             raise HTTPException(status_code=404, detail="Process not found")
+        version, process_data = record
         
         if request.page_id:
             if request.page_id not in process_data:
@@ -212,7 +610,7 @@ async def get_process_status(request: ProcessStatusRequest):
             url = page_data.get("url")
             
             statuses = [ProcessStatus(
-                process_id=request.process_id,
+                process_id=process_id,
                 page_id=request.page_id,
                 status=status,
                 url=url
@@ -223,16 +621,22 @@ async def get_process_status(request: ProcessStatusRequest):
                 status = page_data.get("status", "UNKNOWN")
                 url = page_data.get("url")
                 statuses.append(ProcessStatus(
-                    process_id=request.process_id,
+                    process_id=process_id,
                     page_id=page_id,
                     status=status,
                     url=url
                 ))
         
+        remaining = sum(1 for page in process_data.values() if page.get("status") not in TERMINAL_STATES)
+        response.headers["ETag"] = f'"{version}"'
+        response.headers["Cache-Control"] = "no-cache"
         return ProcessStatusResponse(
             status_code=5000,
             message="Status retrieved successfully",
-            data=statuses
+            data=statuses,
+            version=version,
+            queue=scheduler.stats(process_id),
+            **completion_estimate(process_id, remaining)
         )
     except Exception as e:
         logger.error(f"Status retrieval failed: {str(e)}")
@@ -240,4 +644,125 @@ async def get_process_status(request: ProcessStatusRequest):
             status_code=5001,
             message="Status retrieval failed",
             error=str(e)
-        )
\ No newline at end of file
+        )
+
+def sse_event(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    lines = [] if event_id is None else [f"id: {event_id}"]
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+async def stream_page_events(process_id: str, queue: asyncio.Queue, version: int, pages: Dict[str, Any]):
+    """
+    Yield server-sent events for every page state change of a process until all
+    pages are terminal. Changes published in this worker arrive through the event
+    bus; changes made by other workers are picked up by a periodic version check.
+    """
+    loop = asyncio.get_running_loop()
+    states: Dict[str, Optional[str]] = {}
+    # Events up to this version are already covered by the last full read
+    seen_version = version
+
+    def page_event(page_id: str, page: Dict[str, Any], event_version: Optional[int]) -> str:
+        states[page_id] = page.get("status")
+        return sse_event("page", {
+            "process_id": process_id,
+            "page_id": page_id,
+            "status": page.get("status", "UNKNOWN"),
+            "url": page.get("url"),
+            "error": page.get("error"),
+        }, event_version)
+
+    def resync() -> Optional[List[str]]:
+        # Re-read the record and return events for the pages whose state changed
+        nonlocal version, seen_version
+        record = cache.get_record(process_id)
+        if record is None:
+            return None
+        version, pages = record
+        seen_version = version
+        return [
+            page_event(page_id, page, version)
+            for page_id, page in pages.items()
+            if states.get(page_id) != page.get("status")
+        ]
+
+    def finished() -> bool:
+        return bool(states) and all(status in TERMINAL_STATES for status in states.values())
+
+    expired = sse_event("end", {"process_id": process_id, "reason": "expired"})
+    try:
+        yield f"retry: {settings.EVENTS_RETRY_MS}\n\n"
+        for page_id, page in pages.items():
+            yield page_event(page_id, page, version)
+        last_sent = loop.time()
+
+        while not finished():
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=settings.EVENTS_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                current = cache.get_version(process_id)
+                if current is None:
+                    yield expired
+                    return
+                if current != version:
+                    changed = resync()
+                    if changed is None:
+                        yield expired
+                        return
+                    for chunk in changed:
+                        yield chunk
+                        last_sent = loop.time()
+                if loop.time() - last_sent >= settings.EVENTS_HEARTBEAT:
+                    # Comment line: keeps proxies from closing an idle connection
+                    yield ": heartbeat\n\n"
+                    last_sent = loop.time()
+                continue
+
+            event_version = event.get("version")
+            # Events were dropped, or a version was skipped (a change made by
+            # another worker): only a full read is complete
+            if event is RESYNC or (event_version is not None and event_version > version + 1):
+                changed = resync()
+                if changed is None:
+                    yield expired
+                    return
+                for chunk in changed:
+                    yield chunk
+                    last_sent = loop.time()
+                continue
+            if event_version is not None:
+                if event_version <= seen_version:
+                    continue
+                version = max(version, event_version)
+            yield page_event(event["page_id"], event, event_version)
+            last_sent = loop.time()
+
+        yield sse_event("end", {"process_id": process_id, "reason": "completed"}, version)
+    finally:
+        events.unsubscribe(process_id, queue)
+
+@router.get("/process/{process_id}/events")
+async def process_events(process_id: str):
+    # Subscribe before reading the record so no change falls between the two
+    queue = events.subscribe(process_id)
+    record = cache.get_record(process_id)
+    if record is None:
+        events.unsubscribe(process_id, queue)
+        return JSONResponse(
+            status_code=404,
+            content=ProcessStatusResponse(
+                status_code=5001,
+                message="Status retrieval failed",
+                error="Process not found"
+            ).model_dump()
+        )
+    version, pages = record
+    return StreamingResponse(
+        stream_page_events(process_id, queue, version, pages),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
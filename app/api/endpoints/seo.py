@@ -3,6 +3,7 @@ from pydantic import BaseModel
 from typing import List
 from openai import OpenAI
 from ...core.config import settings
+from ...core.metrics import openai_seconds
 from ...core.logger import get_logger
 
 logger = get_logger()
@@ -33,14 +34,15 @@ async def generate_seo_keywords(request: SEORequest):
         Please provide only the keywords, separated by commas.
         """
         
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are an SEO expert. Provide specific, relevant keywords based on the given description."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7
-        )
+        with openai_seconds.labels("generate-keywords").time():
+            response = client.chat.completions.create(
+                model="gpt-4",
+                messages=[
+                    {"role": "system", "content": "You are an SEO expert. Provide specific, relevant keywords based on the given description."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7
+            )
         
         # Extract and process keywords from the response
         keywords_text = response.choices[0].message.content.strip()
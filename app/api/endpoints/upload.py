@@ -1,6 +1,10 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.responses import JSONResponse
 from ...schemas.responses import UploadResponse, FileUploadResponse
 from ...core.config import settings
+from ...core.storage import get_content_store, stream_to_temp, find_stored, storage_path, UploadTooLargeError
+from ...core.metrics import upload_bytes, uploads
+from ...core.lifecycle import lifecycle
 from ...core.logger import get_logger
 import os
 import uuid
@@ -30,18 +34,36 @@ async def upload_file(file: UploadFile = File(...)):
                 detail=f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
             )
         
-        # Generate unique filename
+        # Reject early when the client declared a size over the limit
+        if file.size is not None and file.size > settings.UPLOAD_MAX_BYTES:
+            raise UploadTooLargeError(settings.UPLOAD_MAX_BYTES)
+        
         file_extension = file.filename.rsplit('.', 1)[1].lower()
-        new_filename = f"{uuid.uuid4()}.{file_extension}"
         
-        # Use Path for proper path handling
-        upload_path = Path("storage/uploads")
-        file_path = upload_path / new_filename
+        if settings.UPLOAD_DEDUP:
+            # Store once under the content digest; repeat uploads reuse the existing file
+            new_filename, created = await get_content_store().ingest(file.read, file_extension)
+            size = os.path.getsize(find_stored(new_filename))
+            uploads.labels(str(not created).lower()).inc()
+        else:
+            # Generate unique filename
+            new_filename = f"{uuid.uuid4()}.{file_extension}"
+            
+            # Use Path for proper path handling
+            upload_path = Path(settings.UPLOAD_DIR)
+            file_path = storage_path(new_filename)
+            
+            # Stream the file in chunks into a temp file, then move it into place atomically
+            tmp_path, checksum, size = await stream_to_temp(file.read, upload_path)
+            os.replace(tmp_path, file_path)
+            logger.debug(f"Stored {new_filename}: {size} bytes, sha256 {checksum}")
+            uploads.labels("false").inc()
+        
+        upload_bytes.inc(size)
         
-        # Save the file
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        # Index the file so it is deleted once no job can use it anymore
+        if settings.STORAGE_LIFECYCLE:
+            lifecycle.track(new_filename, "upload")
         
         # Generate file URL with API_V1_STR prefix
         file_url = f"{settings.APP_URL}/storage/uploads/{new_filename}"
@@ -57,6 +79,16 @@ async def upload_file(file: UploadFile = File(...)):
             )
         )
         
+    except UploadTooLargeError as e:
+        logger.warning(f"File upload rejected: {str(e)}")
+        return JSONResponse(
+            status_code=413,
+            content=UploadResponse(
+                status_code=2002,
+                message="File too large",
+                error=str(e)
+            ).model_dump()
+        )
     except Exception as e:
         logger.error(f"File upload failed: {str(e)}")
         return UploadResponse(
@@ -1,18 +1,42 @@
-from typing import Any, Optional
-from cachetools import TTLCache
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+from .config import settings
+from .store import JobStore, MemoryJobStore, create_store
+from .metrics import cache_operation_seconds
 from .logger import get_logger
 
 logger = get_logger()
 
+# Resolved once; recording is a perf_counter pair and a bucket increment
+_timers = {
+    operation: cache_operation_seconds.labels(operation)
+    for operation in ("set", "get", "update_page", "update_pages", "get_record", "get_version", "delete", "find_by_page")
+}
+
 class CacheManager:
-    def __init__(self, ttl: int = 3600, maxsize: int = 1000):
+    def __init__(
+        self,
+        ttl: int = 3600,
+        maxsize: int = 1000,
+        max_bytes: int = settings.CACHE_MAX_BYTES,
+        size_func: Optional[Callable[[Any], int]] = None,
+        store: Optional[JobStore] = None,
+    ):
         """
         Initialize cache with TTL (time-to-live) in seconds and maximum size
-        :param ttl: Time to live in seconds (default 1 hour)
+        :param ttl: Default time to live in seconds (default 1 hour)
         :param maxsize: Maximum number of items in cache (default 1000)
+        :param max_bytes: Memory budget for cached values in bytes
+        :param size_func: Optional callable measuring a value in bytes for the memory budget
+        :param store: Optional backend; defaults to the one selected by settings.CACHE_BACKEND
         """
-        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
-        logger.info(f"Cache initialized with TTL: {ttl}s, maxsize: {maxsize}")
+        if store is None and size_func is not None:
+            store = MemoryJobStore(ttl=ttl, maxsize=maxsize, max_bytes=max_bytes, size_func=size_func)
+        # Not "store or ...": an empty store is falsy (JobStore defines __len__)
+        self._store = store if store is not None else create_store(ttl=ttl, maxsize=maxsize, max_bytes=max_bytes)
+        logger.info(
+            f"Cache initialized with backend: {self._store.name}, TTL: {ttl}s, "
+            f"maxsize: {maxsize}, max_bytes: {max_bytes}"
+        )
 
     def set(self, key: str, value: Any, expire: Optional[int] = None) -> bool:
         """
@@ -23,13 +47,8 @@ class CacheManager:
         :return: True if successful, False otherwise
         """
         try:
-            if expire:
-                # If custom expiration provided, create a new cache just for this item
-                temp_cache = TTLCache(maxsize=1, ttl=expire)
-                temp_cache[key] = value
-                self._cache[key] = temp_cache[key]
-            else:
-                self._cache[key] = value
+            with _timers["set"].time():
+                self._store.set(key, value, expire)
             return True
         except Exception as e:
             logger.error(f"Error setting cache: {str(e)}")
@@ -42,11 +61,69 @@ class CacheManager:
         :return: Cached value or None if not found
         """
         try:
-            return self._cache.get(key)
+            with _timers["get"].time():
+                return self._store.get(key)
         except Exception as e:
             logger.error(f"Error getting cache: {str(e)}")
             return None
 
+    def update_page(self, process_id: str, page_id: str, **fields: Any) -> Optional[int]:
+        """
+        Atomically merge fields into a single page of a process record without
+        rewriting the record or resetting its TTL. Creates the page if missing.
+        :param process_id: Process ID (init_id)
+        :param page_id: Page ID
+        :param fields: Page fields to set, e.g. status="COMPLETED", url=...
+        :return: New record version, or None on failure
+        """
+        try:
+            with _timers["update_page"].time():
+                return self._store.update_page(process_id, page_id, fields)
+        except Exception as e:
+            logger.error(f"Error updating page {process_id}/{page_id} in cache: {str(e)}")
+            return None
+
+    def update_pages(self, process_id: str, pages: Dict[str, Dict[str, Any]]) -> Optional[int]:
+        """
+        Merge fields into several pages of a process record in one atomic write
+        :param process_id: Process ID (init_id)
+        :param pages: Mapping of page ID to the fields to set on that page
+        :return: New record version, or None on failure
+        """
+        try:
+            with _timers["update_pages"].time():
+                return self._store.update_pages(process_id, pages)
+        except Exception as e:
+            logger.error(f"Error updating {len(pages)} pages of {process_id} in cache: {str(e)}")
+            return None
+
+    def get_record(self, process_id: str) -> Optional[Tuple[int, Any]]:
+        """
+        Get a process record together with its version
+        :param process_id: Process ID (init_id)
+        :return: (version, pages) tuple or None if not found
+        """
+        try:
+            with _timers["get_record"].time():
+                return self._store.get_record(process_id)
+        except Exception as e:
+            logger.error(f"Error getting record from cache: {str(e)}")
+            return None
+
+    def get_version(self, process_id: str) -> Optional[int]:
+        """
+        Get the current version of a process record without reading it, so
+        readers can skip unchanged records
+        :param process_id: Process ID (init_id)
+        :return: Version number or None if not found
+        """
+        try:
+            with _timers["get_version"].time():
+                return self._store.get_version(process_id)
+        except Exception as e:
+            logger.error(f"Error getting record version from cache: {str(e)}")
+            return None
+
     def delete(self, key: str) -> bool:
         """
         Delete a value from cache
@@ -54,8 +131,8 @@ class CacheManager:
         :return: True if successful, False otherwise
         """
         try:
-            if key in self._cache:
-                del self._cache[key]
+            with _timers["delete"].time():
+                self._store.delete(key)
             return True
         except Exception as e:
             logger.error(f"Error deleting from cache: {str(e)}")
@@ -67,7 +144,7 @@ class CacheManager:
         :return: True if successful, False otherwise
         """
         try:
-            self._cache.clear()
+            self._store.clear()
             return True
         except Exception as e:
             logger.error(f"Error clearing cache: {str(e)}")
@@ -79,7 +156,37 @@ class CacheManager:
         Get current number of items in cache
         :return: Number of items
         """
-        return len(self._cache)
+        return len(self._store)
+
+    def find_by_page(self, page_id: str) -> Optional[str]:
+        """
+        Find the process that owns a page
+        :param page_id: Page ID
+        :return: Process ID or None if not found
+        """
+        try:
+            with _timers["find_by_page"].time():
+                return self._store.find_by_page(page_id)
+        except Exception as e:
+            logger.error(f"Error looking up page in cache: {str(e)}")
+            return None
+
+    def items(self) -> Iterator[Tuple[str, Any, Optional[float]]]:
+        """
+        Iterate over live entries
+        :return: Iterator of (key, value, ttl_remaining) tuples
+        """
+        return self._store.items()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get backend name, size and limits
+        :return: Dict of cache statistics
+        """
+        return self._store.stats()
+
+# Create a global cache instance with 1-hour default TTL, 1000 items and CACHE_MAX_BYTES max
+cache = CacheManager()
 
-# Create a global cache instance with 1-hour TTL and 1000 items max
-cache = CacheManager() 
\ No newline at end of file
+# Results of deterministic jobs by fingerprint; kept apart so they never evict job records
+result_cache = CacheManager(ttl=settings.RESULT_CACHE_TTL, maxsize=settings.RESULT_CACHE_MAXSIZE) 
\ No newline at end of file
@@ -12,13 +12,97 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = APP_NAME+"API"
     VERSION: str = "1.0.0"
     API_KEY: Optional[str] = os.getenv("API_KEY")
+    AUTH_PUBLIC_PATHS: str = os.getenv("AUTH_PUBLIC_PATHS", "/api/v1/health,/storage/uploads/*,/storage/variants/*")
+    RATE_LIMIT_PER_SECOND: float = float(os.getenv("RATE_LIMIT_PER_SECOND", "20"))
+    RATE_LIMIT_BURST: int = int(os.getenv("RATE_LIMIT_BURST", "40"))
     SEGMIND_API_KEY: Optional[str] = os.getenv("SEGMIND_API_KEY")
     SEGMIND_API_URL: str = "https://api.segmind.com/v1/faceswap-comic"
     OPENAI_API_KEY: Optional[str] = os.getenv("OPENAI_API_KEY")
     UPLOAD_DIR: str = "storage/uploads"
     APP_URL: str = os.getenv("APP_URL", "http://localhost:8000")
-    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "DEBUG")
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text").lower()
+    LOG_FILE: str = os.getenv("LOG_FILE", "logs/app.log")
+    LOG_ENQUEUE: bool = os.getenv("LOG_ENQUEUE", "true").lower() in ("1", "true", "yes")
+    LOG_ROTATE_BYTES: int = int(os.getenv("LOG_ROTATE_BYTES", str(500 * 1024 * 1024)))
+    LOG_RETENTION: str = os.getenv("LOG_RETENTION", "10 days")
+    LOG_SAMPLE_INTERVAL: float = float(os.getenv("LOG_SAMPLE_INTERVAL", "10"))
     BASE_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    HTTP_POOL_LIMIT: int = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+    HTTP_POOL_LIMIT_PER_HOST: int = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20"))
+    HTTP_KEEPALIVE_TIMEOUT: float = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+    HTTP_DNS_CACHE_TTL: int = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+    HTTP_CONNECT_TIMEOUT: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+    HTTP_READ_TIMEOUT: float = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+    SEGMIND_READ_TIMEOUT: float = float(os.getenv("SEGMIND_READ_TIMEOUT", "100"))
+    SEGMIND_INITIAL_CONCURRENCY: int = int(os.getenv("SEGMIND_INITIAL_CONCURRENCY", "4"))
+    SEGMIND_MIN_CONCURRENCY: int = int(os.getenv("SEGMIND_MIN_CONCURRENCY", "1"))
+    SEGMIND_MAX_CONCURRENCY: int = int(os.getenv("SEGMIND_MAX_CONCURRENCY", "16"))
+    SEGMIND_SLOW_SECONDS: float = float(os.getenv("SEGMIND_SLOW_SECONDS", "45"))
+    SEGMIND_DECREASE_FACTOR: float = float(os.getenv("SEGMIND_DECREASE_FACTOR", "0.5"))
+    SEGMIND_MAX_ERROR_RATE: float = float(os.getenv("SEGMIND_MAX_ERROR_RATE", "0.1"))
+    SEGMIND_RETRIES: int = int(os.getenv("SEGMIND_RETRIES", "3"))
+    SEGMIND_BACKOFF_BASE: float = float(os.getenv("SEGMIND_BACKOFF_BASE", "1"))
+    SEGMIND_BACKOFF_MAX: float = float(os.getenv("SEGMIND_BACKOFF_MAX", "30"))
+    SEGMIND_BREAKER_THRESHOLD: int = int(os.getenv("SEGMIND_BREAKER_THRESHOLD", "5"))
+    SEGMIND_BREAKER_RESET: float = float(os.getenv("SEGMIND_BREAKER_RESET", "30"))
+    SEGMIND_BREAKER_MAX_WAIT: float = float(os.getenv("SEGMIND_BREAKER_MAX_WAIT", "120"))
+    SEGMIND_STREAMING: bool = os.getenv("SEGMIND_STREAMING", "true").lower() in ("1", "true", "yes")
+    SEGMIND_DETERMINISTIC: bool = os.getenv("SEGMIND_DETERMINISTIC", "false").lower() in ("1", "true", "yes")
+    SEGMIND_SEED: int = int(os.getenv("SEGMIND_SEED", "42"))
+    RESULT_CACHE_TTL: int = int(os.getenv("RESULT_CACHE_TTL", "86400"))
+    RESULT_CACHE_MAXSIZE: int = int(os.getenv("RESULT_CACHE_MAXSIZE", "10000"))
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_SQLITE_PATH: str = os.getenv("CACHE_SQLITE_PATH", "storage/jobs.db")
+    CACHE_SQLITE_BUSY_TIMEOUT: float = float(os.getenv("CACHE_SQLITE_BUSY_TIMEOUT", "0.1"))
+    CACHE_SQLITE_RETRIES: int = int(os.getenv("CACHE_SQLITE_RETRIES", "5"))
+    CACHE_MAX_BYTES: int = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    UPLOAD_DEDUP: bool = os.getenv("UPLOAD_DEDUP", "false").lower() in ("1", "true", "yes")
+    UPLOAD_INDEX_PATH: str = os.getenv("UPLOAD_INDEX_PATH", "storage/uploads.db")
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+    UPLOAD_MAX_BYTES: int = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+    JOB_TTL: int = int(os.getenv("JOB_TTL", "3600"))
+    STORAGE_SHARDED: bool = os.getenv("STORAGE_SHARDED", "true").lower() in ("1", "true", "yes")
+    STATIC_MAX_AGE: int = int(os.getenv("STATIC_MAX_AGE", "3600"))
+    STATIC_ACCEL_REDIRECT: Optional[str] = os.getenv("STATIC_ACCEL_REDIRECT")
+    VARIANT_WIDTHS: str = os.getenv("VARIANT_WIDTHS", "160,320,400,640,800,1200")
+    VARIANT_QUALITY: int = int(os.getenv("VARIANT_QUALITY", "80"))
+    VARIANT_WORKERS: int = int(os.getenv("VARIANT_WORKERS", "2"))
+    STORAGE_LIFECYCLE: bool = os.getenv("STORAGE_LIFECYCLE", "false").lower() in ("1", "true", "yes")
+    STORAGE_INDEX_PATH: str = os.getenv("STORAGE_INDEX_PATH", "storage/lifecycle.db")
+    STORAGE_GRACE_SECONDS: float = float(os.getenv("STORAGE_GRACE_SECONDS", "3600"))
+    STORAGE_QUOTA_BYTES: int = int(os.getenv("STORAGE_QUOTA_BYTES", "0"))
+    STORAGE_QUOTA_LOW_WATERMARK: float = float(os.getenv("STORAGE_QUOTA_LOW_WATERMARK", "0.9"))
+    STORAGE_EVICT_MIN_IDLE: float = float(os.getenv("STORAGE_EVICT_MIN_IDLE", "900"))
+    STORAGE_SWEEP_INTERVAL: float = float(os.getenv("STORAGE_SWEEP_INTERVAL", "60"))
+    STORAGE_SWEEP_BATCH: int = int(os.getenv("STORAGE_SWEEP_BATCH", "500"))
+    BASE64_MEMO_MAX_BYTES: int = int(os.getenv("BASE64_MEMO_MAX_BYTES", str(128 * 1024 * 1024)))
+    NORMALIZE_ENABLED: bool = os.getenv("NORMALIZE_ENABLED", "true").lower() in ("1", "true", "yes")
+    NORMALIZE_MAX_EDGE: int = int(os.getenv("NORMALIZE_MAX_EDGE", "1536"))
+    NORMALIZE_FORMAT: str = os.getenv("NORMALIZE_FORMAT", "jpeg").lower()
+    NORMALIZE_QUALITY: int = int(os.getenv("NORMALIZE_QUALITY", "90"))
+    NORMALIZE_WORKERS: int = int(os.getenv("NORMALIZE_WORKERS", "2"))
+    FACE_PROTOTXT: str = os.getenv("FACE_PROTOTXT", "./additional/deploy.prototxt")
+    FACE_CAFFEMODEL: str = os.getenv("FACE_CAFFEMODEL", "./additional/res10_300x300_ssd_iter_140000.caffemodel")
+    FACE_CONFIDENCE: float = float(os.getenv("FACE_CONFIDENCE", "0.7"))
+    EVENTS_QUEUE_SIZE: int = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+    EVENTS_HEARTBEAT: float = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+    EVENTS_POLL_INTERVAL: float = float(os.getenv("EVENTS_POLL_INTERVAL", "2"))
+    EVENTS_RETRY_MS: int = int(os.getenv("EVENTS_RETRY_MS", "3000"))
+    STATUS_MAX_WAIT: float = float(os.getenv("STATUS_MAX_WAIT", "30"))
+    STATUS_MIN_POLL: float = float(os.getenv("STATUS_MIN_POLL", "1"))
+    STATUS_MAX_POLL: float = float(os.getenv("STATUS_MAX_POLL", "30"))
+    ETA_WINDOW: int = int(os.getenv("ETA_WINDOW", "50"))
+    ETA_DEFAULT_SECONDS: float = float(os.getenv("ETA_DEFAULT_SECONDS", "20"))
+    BATCH_MAX_PAGES: int = int(os.getenv("BATCH_MAX_PAGES", "100"))
+    MASK_WORKERS: int = int(os.getenv("MASK_WORKERS", "2"))
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+    METRICS_NAMESPACE: str = os.getenv("METRICS_NAMESPACE", "pictoora")
+    METRICS_TOKEN: Optional[str] = os.getenv("METRICS_TOKEN")
+    METRICS_PUBLIC: bool = os.getenv("METRICS_PUBLIC", "false").lower() in ("1", "true", "yes")
+    SCHEDULER_WORKERS: int = int(os.getenv("SCHEDULER_WORKERS", "4"))
+    SCHEDULER_MAX_QUEUE: int = int(os.getenv("SCHEDULER_MAX_QUEUE", "200"))
+    SCHEDULER_DRAIN_TIMEOUT: float = float(os.getenv("SCHEDULER_DRAIN_TIMEOUT", "30"))
 
     class Config:
         case_sensitive = True
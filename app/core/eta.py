@@ -0,0 +1,71 @@
+from typing import Any, Dict, Optional, Tuple
+from collections import deque
+import math
+from .config import settings
+from .logger import get_logger
+
+logger = get_logger()
+
+class CompletionEstimator:
+    def __init__(
+        self,
+        window: int = settings.ETA_WINDOW,
+        default_latency: float = settings.ETA_DEFAULT_SECONDS,
+        min_poll: float = settings.STATUS_MIN_POLL,
+        max_poll: float = settings.STATUS_MAX_POLL,
+    ):
+        """
+        Estimate when a process will finish from a moving average of recent
+        Segmind latencies, and how long a client should wait before polling again
+        :param window: Number of recent latencies averaged
+        :param default_latency: Latency assumed before any call has completed
+        :param min_poll: Lower bound of the suggested poll delay in seconds
+        :param max_poll: Upper bound of the suggested poll delay in seconds
+        """
+        self.default_latency = default_latency
+        self.min_poll = min_poll
+        self.max_poll = max_poll
+        self._samples: deque = deque(maxlen=window)
+        self._total = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """
+        Record the latency of one completed Segmind call
+        :param seconds: Wall time of the call
+        """
+        if len(self._samples) == self._samples.maxlen:
+            self._total -= self._samples[0]
+        self._samples.append(seconds)
+        self._total += seconds
+
+    def average(self) -> float:
+        if not self._samples:
+            return self.default_latency
+        return self._total / len(self._samples)
+
+    def estimate(self, remaining: int, slots: float) -> Tuple[Optional[float], float]:
+        """
+        Estimate time to completion of a process
+        :param remaining: Pages of the process that are not finished yet
+        :param slots: Workers the process can expect to use at once
+        :return: (seconds until every page is done or None if nothing is left, suggested poll delay)
+        """
+        latency = self.average()
+        if remaining <= 0:
+            return None, self._clamp(latency / 2)
+        rounds = math.ceil(remaining / max(1.0, min(slots, remaining)))
+        eta = latency * rounds
+        # Poll around when the next page is expected to finish, never faster than min_poll
+        return round(eta, 2), self._clamp(min(eta, latency) / 2)
+
+    def _clamp(self, seconds: float) -> float:
+        return round(max(self.min_poll, min(self.max_poll, seconds)), 2)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "samples": len(self._samples),
+            "avg_latency_seconds": round(self.average(), 3),
+        }
+
+# Create a global estimator fed by Segmind call latencies
+estimator = CompletionEstimator()
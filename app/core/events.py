@@ -0,0 +1,87 @@
+from typing import Any, Dict, Set
+from collections import defaultdict
+import asyncio
+from .config import settings
+from .logger import get_logger
+
+logger = get_logger()
+
+# Put on a subscriber's queue in place of the events it lost to overflow:
+# the subscriber must re-read the state instead of relying on events
+RESYNC: Dict[str, Any] = {"type": "resync"}
+
+class EventBus:
+    def __init__(self, max_queue: int = settings.EVENTS_QUEUE_SIZE):
+        """
+        In-process pub/sub of page state changes, keyed by process ID. Every
+        subscriber gets its own bounded queue, so a slow reader never blocks
+        publishers or other readers. When a queue is full its events and the
+        new one are dropped and replaced by a single RESYNC event, so the
+        reader knows it missed changes. Events only reach subscribers in the same worker process.
+        :param max_queue: Events buffered per subscriber
+        """
+        self.max_queue = max_queue
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.resyncs = 0
+
+    def subscribe(self, key: str) -> asyncio.Queue:
+        """
+        Start receiving events for a key
+        :param key: Process ID
+        :return: Queue the events are put on; pass it to unsubscribe when done
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue)
+        self._subscribers[key].add(queue)
+        return queue
+
+    def unsubscribe(self, key: str, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(key)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[key]
+
+    def publish(self, key: str, event: Dict[str, Any]) -> int:
+        """
+        Deliver an event to every subscriber of a key without waiting
+        :param key: Process ID
+        :param event: Event payload
+        :return: Number of subscribers the event was delivered to
+        """
+        self.published += 1
+        subscribers = self._subscribers.get(key)
+        if not subscribers:
+            return 0
+        for queue in subscribers:
+            if queue.full():
+                # The reader re-reads the state, which includes this event too
+                self.dropped += 1
+                while not queue.empty():
+                    if queue.get_nowait() is not RESYNC:
+                        self.dropped += 1
+                queue.put_nowait(RESYNC)
+                self.resyncs += 1
+            else:
+                queue.put_nowait(event)
+        self.delivered += len(subscribers)
+        return len(subscribers)
+
+    def subscribers(self, key: str) -> int:
+        return len(self._subscribers.get(key, ()))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "channels": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "resyncs": self.resyncs,
+        }
+
+# Create a global bus for page state changes
+events = EventBus()
@@ -0,0 +1,107 @@
+from typing import Any, Dict, List, Optional, Sequence
+import threading
+import cv2
+import numpy as np
+from .config import settings
+from .logger import get_logger
+
+logger = get_logger()
+
+class FaceDetector:
+    INPUT_SIZE = (300, 300)
+    MEAN = (104.0, 177.0, 123.0)
+
+    def __init__(
+        self,
+        prototxt: str = settings.FACE_PROTOTXT,
+        caffemodel: str = settings.FACE_CAFFEMODEL,
+        confidence: float = settings.FACE_CONFIDENCE,
+    ):
+        """
+        Resident res10 SSD face detector. The Caffe network is loaded once and
+        reused; several images can be run in a single forward pass. A cv2.dnn
+        Net is not safe to drive from several threads at once, so forward
+        passes are serialized with a lock and callers on a thread pool should
+        batch images to keep throughput up.
+        :param prototxt: Network definition
+        :param caffemodel: Trained weights
+        :param confidence: Minimum detection confidence kept
+        """
+        self.prototxt = prototxt
+        self.caffemodel = caffemodel
+        self.confidence = confidence
+        self._net = None
+        self._load_lock = threading.Lock()
+        self._forward_lock = threading.Lock()
+        self.images = 0
+        self.forwards = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._net is not None
+
+    def load(self) -> None:
+        """
+        Load the network if it is not resident yet
+        :raises RuntimeError: If the model files cannot be loaded
+        """
+        if self._net is not None:
+            return
+        with self._load_lock:
+            if self._net is not None:
+                return
+            try:
+                self._net = cv2.dnn.readNetFromCaffe(str(self.prototxt), str(self.caffemodel))
+            except Exception as e:
+                logger.error(f"Failed to load face detection model: {str(e)}")
+                raise RuntimeError(f"Failed to initialize face detection model: {str(e)}")
+            logger.info(f"Face detection model loaded from {self.caffemodel}")
+
+    def detect(self, image: np.ndarray) -> np.ndarray:
+        """
+        Detect faces in one BGR image
+        :param image: HxWx3 (or HxWx4) uint8 image
+        :return: Int array of shape (N, 4) with clipped (startX, startY, endX, endY) boxes
+        """
+        return self.detect_batch([image])[0]
+
+    def detect_batch(self, images: Sequence[np.ndarray]) -> List[np.ndarray]:
+        """
+        Detect faces in several BGR images with a single forward pass
+        :param images: Images of any size; each is resized to the 300x300 network input
+        :return: One (N, 4) int box array per image, in input order
+        """
+        if not images:
+            return []
+        self.load()
+
+        frames = [image[:, :, :3] if image.ndim == 3 and image.shape[2] == 4 else image for image in images]
+        blob = cv2.dnn.blobFromImages(frames, 1.0, self.INPUT_SIZE, self.MEAN)
+        with self._forward_lock:
+            self._net.setInput(blob)
+            detections = self._net.forward()
+            self.forwards += 1
+            self.images += len(frames)
+
+        # Rows are (image_index, class, confidence, x1, y1, x2, y2) with coordinates in [0, 1]
+        rows = detections.reshape(-1, 7)
+        rows = rows[rows[:, 2] > self.confidence]
+        index = rows[:, 0].astype(np.intp)
+
+        sizes = np.array([[f.shape[1], f.shape[0]] for f in frames], dtype=np.float32)
+        scale = np.tile(sizes[index], 2)
+        boxes = (rows[:, 3:7] * scale).astype(np.int32)
+        np.clip(boxes, 0, scale.astype(np.int32), out=boxes)
+
+        return [boxes[index == i] for i in range(len(frames))]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "confidence": self.confidence,
+            "images": self.images,
+            "forwards": self.forwards,
+        }
+
+# Create a global detector; the network is loaded at startup and kept resident
+face_detector = FaceDetector()
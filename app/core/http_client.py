@@ -0,0 +1,125 @@
+from typing import Any, Dict, Optional
+import aiohttp
+from .config import settings
+from .logger import get_logger
+
+logger = get_logger()
+
+class HTTPClientManager:
+    def __init__(
+        self,
+        limit: int = settings.HTTP_POOL_LIMIT,
+        limit_per_host: int = settings.HTTP_POOL_LIMIT_PER_HOST,
+        keepalive_timeout: float = settings.HTTP_KEEPALIVE_TIMEOUT,
+        dns_cache_ttl: int = settings.HTTP_DNS_CACHE_TTL,
+        connect_timeout: float = settings.HTTP_CONNECT_TIMEOUT,
+        read_timeout: float = settings.HTTP_READ_TIMEOUT,
+    ):
+        """
+        Application-scoped aiohttp connection pool shared by all outbound calls
+        :param limit: Maximum number of open connections across all hosts
+        :param limit_per_host: Maximum number of open connections per host
+        :param keepalive_timeout: Seconds an idle connection is kept alive for reuse
+        :param dns_cache_ttl: Seconds a resolved host is kept in the DNS cache
+        :param connect_timeout: Budget in seconds for acquiring and opening a connection
+        :param read_timeout: Budget in seconds between reads of the response
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._requests = 0
+
+    def timeout(self, read: Optional[float] = None) -> aiohttp.ClientTimeout:
+        """
+        Build a timeout with separate connect and read budgets
+        :param read: Optional read budget overriding the configured default
+        :return: ClientTimeout without an overall deadline
+        """
+        return aiohttp.ClientTimeout(
+            total=None,
+            connect=self.connect_timeout,
+            sock_read=read if read is not None else self.read_timeout,
+        )
+
+    async def start(self) -> None:
+        """
+        Open the shared connector and session. Safe to call more than once.
+        """
+        if self._session is not None and not self._session.closed:
+            return
+        self._connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_cache_ttl,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=self._connector,
+            timeout=self.timeout(),
+            trace_configs=[self._trace_config()],
+        )
+        logger.info(
+            f"HTTP client started with limit: {self.limit}, "
+            f"limit_per_host: {self.limit_per_host}, keepalive: {self.keepalive_timeout}s"
+        )
+
+    async def close(self) -> None:
+        """
+        Close the shared session and release every pooled connection
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("HTTP client closed")
+        self._session = None
+        self._connector = None
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """
+        Get the shared session, starting it lazily when used outside the app lifespan
+        :return: Shared ClientSession
+        """
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            self._requests += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        return trace_config
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get connection pool usage
+        :return: Dict with configured limits, open/idle connection counts and request total
+        """
+        connector = self._connector
+        in_use = 0
+        idle = 0
+        per_host: Dict[str, int] = {}
+        if connector is not None and not connector.closed:
+            in_use = len(getattr(connector, "_acquired", ()))
+            for key, conns in getattr(connector, "_conns", {}).items():
+                idle += len(conns)
+                per_host[f"{key.host}:{key.port}"] = len(conns)
+        return {
+            "running": self._session is not None and not self._session.closed,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "in_use": in_use,
+            "idle": idle,
+            "idle_per_host": per_host,
+            "requests_total": self._requests,
+        }
+
+# Create a global HTTP client shared by every outbound request
+http_client = HTTPClientManager()
@@ -0,0 +1,206 @@
+from typing import Any, Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import uuid
+import cv2
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+from .config import settings
+from .logger import get_logger
+from .memo import SingleFlight
+from .lifecycle import lifecycle
+from .storage import find_stored, storage_path
+
+logger = get_logger()
+
+ENCODERS = {
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+
+EXIF_ORIENTATION = 0x0112
+
+def exif_orientation(path: str) -> int:
+    """
+    Read the EXIF Orientation tag of an image; only the header is parsed
+    :param path: Image file
+    :return: 1-8, 1 (upright) when missing or unreadable
+    """
+    try:
+        with Image.open(path) as image:
+            orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+    except (OSError, UnidentifiedImageError):
+        return 1
+    return orientation if orientation in range(1, 9) else 1
+
+def apply_orientation(image: np.ndarray, orientation: int) -> np.ndarray:
+    """
+    Turn decoded pixels upright, as viewers do from the EXIF Orientation tag
+    :param image: Pixels as stored in the file
+    :param orientation: EXIF Orientation 1-8
+    :return: Upright pixels
+    """
+    if orientation == 2:
+        return cv2.flip(image, 1)
+    if orientation == 3:
+        return cv2.rotate(image, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(image, 0)
+    if orientation == 5:
+        return cv2.transpose(image)
+    if orientation == 6:
+        return cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.flip(cv2.transpose(image), -1)
+    if orientation == 8:
+        return cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return image
+
+class ImageNormalizer:
+    def __init__(
+        self,
+        enabled: bool = settings.NORMALIZE_ENABLED,
+        max_edge: int = settings.NORMALIZE_MAX_EDGE,
+        fmt: str = settings.NORMALIZE_FORMAT,
+        quality: int = settings.NORMALIZE_QUALITY,
+        workers: int = settings.NORMALIZE_WORKERS,
+    ):
+        """
+        Downsize and recompress local images before they are sent to Segmind.
+        Each source is decoded once, turned upright from its EXIF orientation
+        (the re-encoded file carries no EXIF), shrunk so its longest edge is at
+        most max_edge, re-encoded and cached on disk next to the original. Work runs
+        in a thread pool (OpenCV releases the GIL) so the event loop never blocks.
+        :param enabled: Turn the stage on or off
+        :param max_edge: Longest edge in pixels after resizing; smaller images are not upscaled
+        :param fmt: Output format, "jpeg" or "webp"; images with transparency stay PNG
+        :param quality: Encoder quality 1-100
+        :param workers: Threads in the normalization pool
+        """
+        if fmt not in ENCODERS:
+            raise ValueError(f"Unsupported normalization format: {fmt}")
+        self.enabled = enabled
+        self.max_edge = max_edge
+        self.fmt = fmt
+        self.quality = quality
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._flight = SingleFlight()
+        self.normalized = 0
+        self.bytes_saved = 0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="normalize")
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def variant_name(self, image_ref: str, ext: str) -> str:
+        """
+        Deterministic on-disk name of the normalized variant of an upload
+        :param image_ref: Filename relative to UPLOAD_DIR
+        :param ext: Variant extension including the dot
+        :return: Variant filename relative to UPLOAD_DIR
+        """
+        stem = image_ref.rsplit('.', 1)[0]
+        # "u": turned upright; variants named without it kept the EXIF rotation and are not reused
+        return f"{stem}.n{self.max_edge}q{self.quality}u{ext}"
+
+    def _existing_variant(self, image_ref: str, source_mtime_ns: int) -> Optional[str]:
+        # Images with transparency are stored as PNG when the target format is JPEG
+        for ext in (ENCODERS[self.fmt][0], ".png"):
+            variant_ref = self.variant_name(image_ref, ext)
+            variant = find_stored(variant_ref)
+            if variant.exists() and variant.stat().st_mtime_ns >= source_mtime_ns:
+                return variant_ref
+        return None
+
+    async def prepare(self, image_ref: str) -> Tuple[str, int]:
+        """
+        Get the reference to send for an image, normalizing local files on first use
+        :param image_ref: URL or filename relative to UPLOAD_DIR
+        :return: (reference to encode, payload bytes saved versus the original)
+        """
+        if not self.enabled or image_ref.startswith(('http://', 'https://')):
+            return image_ref, 0
+        source = find_stored(image_ref)
+        if not source.exists():
+            return image_ref, 0
+
+        source_stat = source.stat()
+        variant_ref = self._existing_variant(image_ref, source_stat.st_mtime_ns)
+        if variant_ref is None:
+            loop = asyncio.get_running_loop()
+            try:
+                variant_ref, _ = await self._flight.do(
+                    image_ref,
+                    lambda: loop.run_in_executor(self._pool(), self._normalize, image_ref)
+                )
+            except Exception as e:
+                logger.warning(f"Normalization skipped for {image_ref}: {str(e)}")
+                return image_ref, 0
+
+        variant_size = find_stored(variant_ref).stat().st_size
+        if variant_size >= source_stat.st_size:
+            # Already small and well compressed: send the original, unless only the variant is upright
+            loop = asyncio.get_running_loop()
+            if await loop.run_in_executor(self._pool(), exif_orientation, str(source)) == 1:
+                return image_ref, 0
+            return variant_ref, 0
+        saved = source_stat.st_size - variant_size
+        self.bytes_saved += saved
+        return variant_ref, saved
+
+    def _normalize(self, image_ref: str) -> str:
+        source = str(find_stored(image_ref))
+        # IMREAD_UNCHANGED keeps alpha but ignores the EXIF orientation of phone photos
+        image = cv2.imread(source, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise ValueError(f"Cannot decode image: {source}")
+        image = apply_orientation(image, exif_orientation(source))
+
+        h, w = image.shape[:2]
+        scale = self.max_edge / max(h, w)
+        if scale < 1:
+            # INTER_AREA averages source pixels, which keeps faces sharp without ringing
+            image = cv2.resize(image, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+
+        has_alpha = image.ndim == 3 and image.shape[2] == 4
+        if has_alpha and self.fmt == "jpeg":
+            ext = ".png"
+            ok, encoded = cv2.imencode(ext, image, [cv2.IMWRITE_PNG_COMPRESSION, 6])
+        else:
+            ext, flag = ENCODERS[self.fmt]
+            ok, encoded = cv2.imencode(ext, image, [flag, self.quality])
+        if not ok:
+            raise ValueError(f"Cannot encode normalized image: {source}")
+
+        variant_ref = self.variant_name(image_ref, ext)
+        variant = storage_path(variant_ref)
+        tmp = variant.with_name(f".{uuid.uuid4()}.part")
+        tmp.write_bytes(encoded.tobytes())
+        os.replace(tmp, variant)
+        if settings.STORAGE_LIFECYCLE:
+            # Deleted together with the original
+            lifecycle.track(variant_ref, "variant", parent=image_ref)
+        self.normalized += 1
+        logger.debug(f"Normalized {source} from {w}x{h} to {image.shape[1]}x{image.shape[0]}")
+        return variant_ref
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "max_edge": self.max_edge,
+            "format": self.fmt,
+            "quality": self.quality,
+            "normalized": self.normalized,
+            "bytes_saved": self.bytes_saved,
+        }
+
+# Create a global normalizer for images sent to Segmind
+normalizer = ImageNormalizer()
@@ -0,0 +1,433 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from pathlib import Path
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from .config import settings
+from .logger import get_logger
+from .storage import CONTENT_ADDRESSED, find_stored, get_content_store
+
+logger = get_logger()
+
+# Expiry of files adopted from before the index: links to them may still be in
+# use, so only the quota can remove them
+NEVER = float("inf")
+
+# Files no live job claims: only these, and expired ones, may be evicted
+UNCLAIMED = "NOT EXISTS (SELECT 1 FROM claims WHERE claims.name = files.name AND claims.expires_at > ?)"
+
+class StorageLifecycle:
+    def __init__(
+        self,
+        root: str = settings.UPLOAD_DIR,
+        index_path: str = settings.STORAGE_INDEX_PATH,
+        job_ttl: float = settings.JOB_TTL,
+        grace: float = settings.STORAGE_GRACE_SECONDS,
+        quota_bytes: int = settings.STORAGE_QUOTA_BYTES,
+        low_watermark: float = settings.STORAGE_QUOTA_LOW_WATERMARK,
+        min_idle: float = settings.STORAGE_EVICT_MIN_IDLE,
+        interval: float = settings.STORAGE_SWEEP_INTERVAL,
+        batch: int = settings.STORAGE_SWEEP_BATCH,
+    ):
+        """
+        Index and garbage collector for files under UPLOAD_DIR. Every upload,
+        result and derived file is recorded in a SQLite index (shared by all
+        workers) with the init_id that created it, size, last access and
+        expiry. Every job using a file holds a claim on it, recorded apart, that
+        extends its expiry to the job's lifetime plus a grace period. A
+        background sweeper deletes expired files and, above the quota, files
+        no job claims: expired ones first, then the least recently accessed.
+        A claimed file is never evicted. Each pass handles at most
+        batch files through indexed queries, in a worker thread, and never
+        lists the directory; files that predate the index are adopted a
+        batch at a time on the first passes, without an expiry.
+        :param root: Directory holding the files
+        :param index_path: SQLite database of the index
+        :param job_ttl: Seconds a job's state lives (the record TTL of /initiate-process)
+        :param grace: Seconds a file outlives its job
+        :param quota_bytes: Disk ceiling for indexed files; 0 disables eviction
+        :param low_watermark: Eviction stops at this share of the quota
+        :param min_idle: Files accessed more recently than this are never evicted
+        :param interval: Seconds between sweeper passes
+        :param batch: Files deleted, evicted or adopted per pass at most
+        """
+        self.root = Path(root)
+        self.index_path = index_path
+        self.job_ttl = job_ttl
+        self.grace = grace
+        self.quota_bytes = quota_bytes
+        self.low_watermark = low_watermark
+        self.min_idle = min_idle
+        self.interval = interval
+        self.batch = batch
+        self._lock = threading.Lock()
+        self._sweeping = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._touched: Dict[str, float] = {}
+        self._adopting: Optional[Iterator[os.DirEntry]] = None
+        self._task: Optional[asyncio.Task] = None
+        self.expired = 0
+        self.evicted = 0
+        self.bytes_freed = 0
+        self.adopted = 0
+        self.last_sweep: Optional[float] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.index_path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.index_path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    name TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    owner TEXT,
+                    parent TEXT,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS files_expires ON files (expires_at);
+                CREATE INDEX IF NOT EXISTS files_access ON files (last_access);
+                CREATE INDEX IF NOT EXISTS files_parent ON files (parent) WHERE parent IS NOT NULL;
+                CREATE TABLE IF NOT EXISTS claims (
+                    name TEXT NOT NULL,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (name, owner)
+                );
+                CREATE INDEX IF NOT EXISTS claims_expires ON claims (expires_at);
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+                """
+            )
+            self._conn = conn
+        return self._conn
+
+    def _expiry(self, ttl: Optional[float] = None) -> float:
+        return time.time() + (self.job_ttl if ttl is None else ttl) + self.grace
+
+    def track(
+        self,
+        name: str,
+        kind: str,
+        owner: Optional[str] = None,
+        parent: Optional[str] = None,
+        ttl: Optional[float] = None,
+    ) -> None:
+        """
+        Record a file written under root, or extend it if already known
+        :param name: Filename relative to root
+        :param kind: "upload", "result", "variant", "mask", ...
+        :param owner: init_id of the job the file belongs to, if any; the job claims it
+        :param parent: File this one was derived from; it shares the parent's expiry
+        :param ttl: Seconds the file is needed for (default the job TTL), before the grace period
+        """
+        try:
+            size = find_stored(name, str(self.root)).stat().st_size
+        except OSError:
+            return
+        now = time.time()
+        expires_at = self._expiry(ttl)
+        with self._lock:
+            if parent is not None:
+                row = self.conn.execute("SELECT expires_at FROM files WHERE name = ?", (parent,)).fetchone()
+                if row:
+                    expires_at = max(expires_at, row[0])
+            self.conn.execute(
+                "INSERT INTO files (name, kind, owner, parent, size, created_at, last_access, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(name) DO UPDATE SET "
+                "size = excluded.size, owner = COALESCE(excluded.owner, files.owner), last_access = excluded.last_access, "
+                "expires_at = MAX(files.expires_at, excluded.expires_at)",
+                (name, kind, owner, parent, size, now, now, expires_at)
+            )
+            if owner is not None:
+                self.conn.execute(
+                    "INSERT INTO claims (name, owner, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(name, owner) DO UPDATE SET expires_at = MAX(claims.expires_at, excluded.expires_at)",
+                    (name, owner, expires_at)
+                )
+
+    def claim(self, names: Iterable[str], owner: str, ttl: Optional[float] = None) -> None:
+        """
+        Mark files as used by a job: keep them (and files derived from them)
+        until the job expires plus the grace period, and never evict them
+        before. Each job holds its own claim, so a file shared by several
+        jobs keeps its creator and the claims of all of them. Deduplicated
+        uploads also get a reference for the job, released when it expires.
+        :param names: Filenames relative to root, or their file_url; other URLs are ignored
+        :param owner: init_id of the job
+        :param ttl: Seconds the job needs them for (default the job TTL)
+        """
+        names = list({name for name in map(self.stored_name, names) if name})
+        if not names:
+            return
+        now = time.time()
+        expires_at = self._expiry(ttl)
+        with self._lock:
+            self.conn.execute("BEGIN")
+            try:
+                for name in names:
+                    self.conn.execute(
+                        "UPDATE files SET last_access = ?, expires_at = MAX(expires_at, ?) "
+                        "WHERE name = ? OR parent = ?",
+                        (now, expires_at, name, name)
+                    )
+                    self.conn.execute(
+                        "INSERT INTO claims (name, owner, expires_at) "
+                        "SELECT name, ?, ? FROM files WHERE name = ? OR parent = ? "
+                        "ON CONFLICT(name, owner) DO UPDATE SET expires_at = MAX(claims.expires_at, excluded.expires_at)",
+                        (owner, expires_at, name, name)
+                    )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        if settings.UPLOAD_DEDUP:
+            # Shared uploads are reference counted per job, so one job's expiry never frees another's images
+            store = get_content_store()
+            for name in names:
+                if CONTENT_ADDRESSED.match(name):
+                    store.acquire(name, owner, expires_at)
+
+    @staticmethod
+    def stored_name(ref: Optional[str]) -> Optional[str]:
+        """
+        Get the filename an image reference points to under root
+        :param ref: Filename, or a URL such as the file_url returned by /upload
+        :return: Filename, or None for URLs elsewhere
+        """
+        if not ref:
+            return None
+        if not ref.startswith(("http://", "https://")):
+            return ref
+        prefix = f"{settings.APP_URL.rstrip('/')}/storage/uploads/"
+        if not ref.startswith(prefix):
+            return None
+        name = ref[len(prefix):].split("?", 1)[0].split("#", 1)[0]
+        return name if name and "/" not in name else None
+
+    def touch(self, name: str) -> None:
+        """
+        Note a read of a file for LRU eviction; written to the index on the next pass
+        :param name: Filename relative to root
+        """
+        self._touched[name] = time.time()
+
+    async def start(self) -> None:
+        """
+        Start the background sweeper. Safe to call more than once.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(
+                f"Storage sweeper started: every {self.interval}s, batch {self.batch}, "
+                f"grace {self.grace}s, quota {self.quota_bytes or 'off'}"
+            )
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._flush_touches)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.sweep)
+            except Exception as e:
+                logger.error(f"Storage sweep failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def sweep(self) -> Dict[str, int]:
+        """
+        Run one bounded pass: flush access times, adopt a batch of unindexed
+        files, delete a batch of expired files, then evict over the quota.
+        Runs in a worker thread.
+        :return: Files adopted, expired and evicted in this pass
+        """
+        with self._sweeping:
+            return self._sweep()
+
+    def _sweep(self) -> Dict[str, int]:
+        self._flush_touches()
+        with self._lock:
+            self.conn.execute("DELETE FROM claims WHERE expires_at <= ?", (time.time(),))
+        if settings.UPLOAD_DEDUP:
+            get_content_store().release_expired()
+        adopted = self._adopt_batch()
+        expired = self._delete(
+            "SELECT name FROM files WHERE expires_at < ? ORDER BY expires_at LIMIT ?",
+            (time.time(), self.batch)
+        )
+        self.expired += expired
+        evicted = self._evict() if self.quota_bytes else 0
+        self.evicted += evicted
+        self.last_sweep = time.time()
+        if adopted or expired or evicted:
+            logger.info(f"Storage sweep: {adopted} adopted, {expired} expired, {evicted} evicted")
+        return {"adopted": adopted, "expired": expired, "evicted": evicted}
+
+    def _flush_touches(self) -> None:
+        if not self._touched:
+            return
+        touched, self._touched = self._touched, {}
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE files SET last_access = MAX(last_access, ?) WHERE name = ?",
+                [(at, name) for name, at in touched.items()]
+            )
+
+    def _delete(self, select: str, params: Tuple[Any, ...]) -> int:
+        # Rows are removed before the files, in one statement, so two workers
+        # sweeping at once never both delete (or miscount) the same file
+        with self._lock:
+            rows = self.conn.execute(
+                f"DELETE FROM files WHERE name IN ({select}) RETURNING name, size", params
+            ).fetchall()
+            # Derived files (normalized variants) go with their source
+            names = [name for name, _ in rows]
+            for start in range(0, len(names), 500):
+                chunk = names[start:start + 500]
+                rows += self.conn.execute(
+                    f"DELETE FROM files WHERE parent IN ({','.join('?' * len(chunk))}) RETURNING name, size", chunk
+                ).fetchall()
+            self.conn.executemany("DELETE FROM claims WHERE name = ?", [(name,) for name, _ in rows])
+        for name, size in rows:
+            self._unlink(name, size)
+        return len(rows)
+
+    def _unlink(self, name: str, size: int) -> None:
+        try:
+            if settings.UPLOAD_DEDUP and CONTENT_ADDRESSED.match(name):
+                # Kept while a job holds it or a repeat upload may have just handed out its URL
+                if not get_content_store().delete(name, uploaded_before=time.time() - self.min_idle):
+                    self.track(name, "upload")
+                    return
+            else:
+                os.unlink(find_stored(name, str(self.root)))
+            self.bytes_freed += size
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not delete {name}: {str(e)}")
+
+    def _evict(self) -> int:
+        with self._lock:
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+        if total <= self.quota_bytes:
+            return 0
+        target = total - int(self.quota_bytes * self.low_watermark)
+        now = time.time()
+        with self._lock:
+            # Expired files the expiry pass has not reached yet, then files no
+            # job claims, least recently accessed first; files read in the last
+            # min_idle seconds are skipped either way
+            candidates = self.conn.execute(
+                "SELECT name, size FROM files WHERE expires_at <= ? AND last_access < ? "
+                "ORDER BY expires_at LIMIT ?",
+                (now, now - self.min_idle, self.batch)
+            ).fetchall()
+            if len(candidates) < self.batch:
+                candidates += self.conn.execute(
+                    f"SELECT name, size FROM files WHERE last_access < ? AND expires_at > ? AND {UNCLAIMED} "
+                    "ORDER BY last_access LIMIT ?",
+                    (now - self.min_idle, now, now, self.batch - len(candidates))
+                ).fetchall()
+        names, freed = [], 0
+        for name, size in candidates:
+            if freed >= target:
+                break
+            names.append(name)
+            freed += size
+        if not names:
+            logger.warning(f"Storage over quota ({total} > {self.quota_bytes} bytes) but every file is in use or claimed")
+            return 0
+        placeholders = ",".join("?" * len(names))
+        # Checked again in the deleting statement: another worker may have claimed or read a file since
+        evicted = self._delete(
+            f"SELECT name FROM files WHERE name IN ({placeholders}) AND last_access < ? AND (expires_at <= ? OR {UNCLAIMED})",
+            (*names, now - self.min_idle, now, now)
+        )
+        logger.warning(f"Storage over quota ({total} > {self.quota_bytes} bytes): evicted {evicted} files")
+        return evicted
+
+    @classmethod
+    def _walk(cls, directory: Path) -> Iterator[os.DirEntry]:
+        # Flat files from before sharding, then the shard directories
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from cls._walk(Path(entry.path))
+                else:
+                    yield entry
+
+    def _adopt_batch(self) -> int:
+        # Files written before the index existed are picked up a batch per pass;
+        # once the directory has been walked through it is never listed again
+        if self._adopting is None:
+            with self._lock:
+                done = self.conn.execute("SELECT value FROM meta WHERE key = 'adopted'").fetchone()
+            if done or not self.root.is_dir():
+                self._adopting = iter(())
+                return 0
+            self._adopting = self._walk(self.root)
+        rows: List[Tuple[Any, ...]] = []
+        now = time.time()
+        for entry in self._adopting:
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            if entry.name.startswith(".") and entry.name.endswith(".part"):
+                # Leftover temp file of an interrupted write
+                rows.append((entry.name, "temp", stat.st_size, stat.st_mtime, stat.st_mtime, stat.st_mtime + self.grace))
+            elif not entry.name.startswith("."):
+                rows.append((entry.name, "adopted", stat.st_size, stat.st_mtime, stat.st_mtime, NEVER))
+            if len(rows) >= self.batch:
+                break
+        with self._lock:
+            if rows:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO files (name, kind, size, created_at, last_access, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+            if len(rows) < self.batch:
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('adopted', ?)", (str(now),))
+        if len(rows) < self.batch:
+            self._adopting = iter(())
+        self.adopted += len(rows)
+        return len(rows)
+
+    def usage(self) -> Tuple[int, int]:
+        """
+        Get the number and total size of indexed files
+        :return: (files, bytes)
+        """
+        with self._lock:
+            files, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files").fetchone()
+        return files, total
+
+    def stats(self) -> Dict[str, Any]:
+        files, total = self.usage()
+        return {
+            "files": files,
+            "bytes": total,
+            "quota_bytes": self.quota_bytes,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "adopted": self.adopted,
+            "bytes_freed": self.bytes_freed,
+            "pending_touches": len(self._touched),
+            "last_sweep": self.last_sweep,
+        }
+
+# Create a global lifecycle manager for storage/uploads
+lifecycle = StorageLifecycle()
@@ -1,24 +1,108 @@
 from loguru import logger
+from typing import Any, Dict, Optional, Tuple
+import json
 import sys
+import traceback
 import os
+import threading
+import time
+from .config import settings
 
-# Create logs directory if it doesn't exist
-os.makedirs("logs", exist_ok=True)
-
-# Configure loguru logger
-logger.remove()  # Remove default handler
-logger.add(
-    sys.stderr,
-    format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-    level="INFO"
-)
-logger.add(
-    "logs/app.log",
-    rotation="500 MB",
-    retention="10 days",
-    format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-    level="INFO"
-)
+TEXT_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}"
+COLOR_FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+
+def _json_format(record: Dict[str, Any]) -> str:
+    """
+    Render a record as one JSON line. Context bound with logger.contextualize()
+    or logger.bind() (process_id, page_id, ...) becomes top-level fields.
+    """
+    entry = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+    }
+    entry.update((key, value) for key, value in record["extra"].items() if not key.startswith("_"))
+    if record["exception"] is not None:
+        entry["exception"] = "".join(traceback.format_exception(*record["exception"]))
+    record["extra"]["_json"] = json.dumps(entry, default=str)
+    return "{extra[_json]}\n"
+
+class LogSampler:
+    def __init__(self, interval: float = settings.LOG_SAMPLE_INTERVAL):
+        """
+        Let one message per key through every interval seconds and count the rest,
+        for hot paths that would otherwise log on every request
+        :param interval: Seconds between messages with the same key; 0 disables sampling
+        """
+        self.interval = interval
+        self._last: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> Optional[int]:
+        """
+        Decide whether a message with this key may be logged now
+        :param key: Identity of the message, e.g. "auth.rate_limited"
+        :return: Number of messages suppressed since the last one, or None to drop this one
+        """
+        if self.interval <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            last, suppressed = self._last.get(key, (0.0, 0))
+            if last and now - last < self.interval:
+                self._last[key] = (last, suppressed + 1)
+                return None
+            self._last[key] = (now, 0)
+            return suppressed
+
+sampler = LogSampler()
+
+def log_sampled(level: str, key: str, message: str) -> None:
+    """
+    Log a hot-path message at most once per LOG_SAMPLE_INTERVAL for its key
+    :param level: Loguru level name
+    :param key: Sampling key
+    :param message: Message text
+    """
+    suppressed = sampler.allow(key)
+    if suppressed is None:
+        return
+    if suppressed:
+        message = f"{message} ({suppressed} similar messages suppressed)"
+    logger.opt(depth=1).log(level, message)
+
+def configure_logging() -> None:
+    """
+    (Re)install the stderr and file sinks from settings. With LOG_ENQUEUE the
+    sinks are loguru's enqueued sinks: the line is formatted by the caller and
+    written by loguru's worker thread, so logging never writes to the
+    terminal or the log file on the event loop.
+    """
+    structured = settings.LOG_FORMAT == "json"
+    logger.remove()  # Remove default handler (and flush enqueued sinks)
+    logger.add(
+        sys.stderr,
+        format=_json_format if structured else COLOR_FORMAT,
+        colorize=False if structured else None,
+        enqueue=settings.LOG_ENQUEUE,
+        level=settings.LOG_LEVEL
+    )
+    if settings.LOG_FILE:
+        # Create logs directory if it doesn't exist
+        os.makedirs(os.path.dirname(settings.LOG_FILE) or ".", exist_ok=True)
+        logger.add(
+            settings.LOG_FILE,
+            rotation=settings.LOG_ROTATE_BYTES or None,
+            retention=settings.LOG_RETENTION or None,
+            format=_json_format if structured else TEXT_FORMAT,
+            enqueue=settings.LOG_ENQUEUE,
+            level=settings.LOG_LEVEL
+        )
+
+configure_logging()
 
 def get_logger():
-    return logger 
\ No newline at end of file
+    return logger
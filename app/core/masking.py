@@ -1,100 +1,124 @@
 import cv2
 import numpy as np
 import os
-import tempfile
-import logging
+import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional, Union
 from ..core.config import settings
 from ..core.logger import get_logger
+from ..core.face_detector import face_detector
+from ..core.lifecycle import lifecycle
+from ..core.storage import storage_path
 
 logger = get_logger()
 
-def mask_child_face(input_path):
+# Masking is CPU bound; keep it off the event loop
+_executor: Optional[ThreadPoolExecutor] = None
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.MASK_WORKERS, thread_name_prefix="mask")
+    return _executor
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+def mask_faces(image: Union[bytes, np.ndarray], encode: Optional[str] = ".png") -> Union[bytes, np.ndarray]:
+    """
+    Make every detected face fully transparent, entirely in memory
+    :param image: Encoded image bytes or a BGR/BGRA ndarray
+    :param encode: Extension to encode the result with (".png" keeps transparency);
+                   None returns the BGRA ndarray
+    :return: Encoded bytes or BGRA ndarray
+    """
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        image = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Image bytes could not be decoded")
+
+    (h, w) = image.shape[:2]
+    logger.debug(f"Processing image with dimensions: {w}x{h}")
+
     try:
-        base_dir = Path(settings.BASE_DIR)
-        prototxt = "./additional/deploy.prototxt"
-        caffemodel = "./additional/res10_300x300_ssd_iter_140000.caffemodel"
-        
-        # Load the face detection model
-        try:
-            net = cv2.dnn.readNetFromCaffe(str(prototxt), str(caffemodel))
-        except Exception as e:
-            logger.error(f"Failed to load face detection model: {str(e)}")
-            raise RuntimeError(f"Failed to initialize face detection model: {str(e)}")
-        
-        # Read and validate input image
-        try:
-            image = cv2.imread(input_path)
-            if image is None:
-                logger.error(f"Failed to load image at path: {input_path}")
-                raise FileNotFoundError(f"Image not found or invalid at {input_path}")
-        except Exception as e:
-            logger.error(f"Error reading image {input_path}: {str(e)}")
-            raise
-        
-        (h, w) = image.shape[:2]
-        logger.debug(f"Processing image with dimensions: {w}x{h}")
-        
-        try:
-            blob = cv2.dnn.blobFromImage(
-                cv2.resize(image, (300, 300)), 
-                1.0, 
-                (300, 300),
-                (104.0, 177.0, 123.0)
-            )
-            net.setInput(blob)
-            detections = net.forward()
-            
-            # Convert to BGRA to support transparency
+        boxes = face_detector.detect(image)
+
+        # Convert to BGRA to support transparency
+        if image.ndim == 3 and image.shape[2] == 4:
+            image = image.copy()
+        else:
             image = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
-            
-            faces_detected = 0
-            for i in range(detections.shape[2]):
-                confidence = detections[0, 0, i, 2]
-                if confidence > 0.7:
-                    faces_detected += 1
-                    box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-                    (startX, startY, endX, endY) = box.astype("int")
-                    startX, startY = max(0, startX), max(0, startY)
-                    endX, endY = min(w, endX), min(h, endY)
-                    
-                    # Set face region to fully transparent
-                    image[startY:endY, startX:endX, 3] = 0
-            
-            logger.info(f"Detected and set {faces_detected} faces to transparent")
-            
-        except Exception as e:
-            logger.error(f"Error during face detection and masking: {str(e)}")
-            raise RuntimeError(f"Face detection and masking failed: {str(e)}")
-        
+
+        # Set face regions to fully transparent
+        for (startX, startY, endX, endY) in boxes:
+            image[startY:endY, startX:endX, 3] = 0
+
+        logger.info(f"Detected and set {len(boxes)} faces to transparent")
+
+    except Exception as e:
+        logger.error(f"Error during face detection and masking: {str(e)}")
+        raise RuntimeError(f"Face detection and masking failed: {str(e)}")
+
+    if encode is None:
+        return image
+    ok, encoded = cv2.imencode(encode, image)
+    if not ok:
+        raise RuntimeError(f"Failed to encode masked image as {encode}")
+    return encoded.tobytes()
+
+async def mask_faces_async(image: Union[bytes, np.ndarray], encode: Optional[str] = ".png") -> Union[bytes, np.ndarray]:
+    """
+    Run mask_faces on the masking thread pool
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool(), mask_faces, image, encode)
+
+def mask_child_face(input_path, output_dir: Optional[str] = None) -> str:
+    """
+    Mask faces in an image file and save the result under a name unique to this call
+    :param input_path: Image to mask
+    :param output_dir: Directory for the result (default UPLOAD_DIR)
+    :return: Path of the masked PNG
+    """
+    try:
+        # Read and validate input image
+        image = cv2.imread(str(input_path))
+        if image is None:
+            logger.error(f"Failed to load image at path: {input_path}")
+            raise FileNotFoundError(f"Image not found or invalid at {input_path}")
+
+        encoded = mask_faces(image, encode=".png")
+
         # Save the processed image
         try:
-            temp_file = tempfile.NamedTemporaryFile(suffix=".png", delete=False)
-            cv2.imwrite(temp_file.name, image)
-            
-            output_dir = Path(base_dir) / "storage" / "uploads"
+            output_dir = Path(output_dir or settings.UPLOAD_DIR)
             output_dir.mkdir(parents=True, exist_ok=True)
-            
-            output_path = output_dir / "mask.png"
-            
-            # Save the masked image using direct file writing
-            with open(output_path, "wb") as buffer:
-                _, img_encoded = cv2.imencode('.png', image)
-                buffer.write(img_encoded.tobytes())
-            
+            in_storage = output_dir.resolve() == Path(settings.UPLOAD_DIR).resolve()
+            output_name = f"mask_{uuid.uuid4()}.png"
+            output_path = storage_path(output_name, str(output_dir)) if in_storage else output_dir / output_name
+
+            # Write to a temp name and move into place so readers never see a partial file
+            tmp_path = output_dir / f".{uuid.uuid4()}.part"
+            with open(tmp_path, "wb") as buffer:
+                buffer.write(encoded)
+            os.replace(tmp_path, output_path)
+            if settings.STORAGE_LIFECYCLE and in_storage:
+                lifecycle.track(output_name, "mask")
+
             logger.info(f"Successfully saved transparent-masked image to {output_path}")
-            return temp_file.name
-            
+            return str(output_path)
+
         except Exception as e:
             logger.error(f"Error saving processed image: {str(e)}")
-            # Clean up temp file if it was created
-            if 'temp_file' in locals():
-                try:
-                    os.unlink(temp_file.name)
-                except Exception:
-                    pass
+            if 'tmp_path' in locals() and tmp_path.exists():
+                os.unlink(tmp_path)
             raise RuntimeError(f"Failed to save processed image: {str(e)}")
-            
+
     except Exception as e:
         logger.error(f"Unexpected error in mask_child_face: {str(e)}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,139 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+from collections import OrderedDict
+import asyncio
+import os
+from .config import settings
+from .logger import get_logger
+
+logger = get_logger()
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Collapse concurrent calls for the same key into one in-flight call
+        whose result (or exception) is shared by every caller
+        """
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.joined = 0
+
+    def running(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run func for key, or wait for the call already running for key. If the
+        caller running func is cancelled, a waiting caller runs it instead, so
+        one caller's cancellation is never raised in the others.
+        :param key: Identity of the work
+        :param func: Coroutine function producing the result
+        :return: (result, shared) where shared is True if another caller ran func
+        """
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            self.joined += 1
+            try:
+                # Shield so this caller's cancellation does not cancel the others
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The caller running func was cancelled, not this one: take over
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure is not logged as never retrieved
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._inflight.pop(key, None)
+
+class Base64Memo:
+    def __init__(self, max_bytes: int = settings.BASE64_MEMO_MAX_BYTES):
+        """
+        Bounded LRU of base64-encoded local files, keyed by path, mtime and size
+        so a rewritten file is never served stale. Concurrent misses for the
+        same file share one read and encode.
+        :param max_bytes: Total size of cached encoded strings
+        """
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._bytes = 0
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+
+    async def get(self, path: str, encode: Callable[[str], Awaitable[str]]) -> str:
+        """
+        Get the base64 encoding of a file, encoding it at most once per version
+        :param path: File path
+        :param encode: Coroutine function reading and encoding a path
+        :return: Base64 string
+        """
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        encoded = self._entries.get(key)
+        if encoded is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.bytes_saved += len(encoded)
+            return encoded
+
+        encoded, shared = await self._flight.do(key, lambda: encode(path))
+        if shared:
+            self.hits += 1
+            self.bytes_saved += len(encoded)
+            return encoded
+
+        self.misses += 1
+        self._store(key, encoded)
+        return encoded
+
+    def _store(self, key: Tuple[str, int, int], encoded: str) -> None:
+        size = len(encoded)
+        if size > self.max_bytes or key in self._entries:
+            return
+        self._entries[key] = encoded
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get hit rate, bytes saved and capacity usage
+        :return: Dict of memo statistics
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "current_bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "joined": self._flight.joined,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "evictions": self.evictions,
+        }
+
+# Create a global memo for encoded source/target images
+base64_memo = Base64Memo()
@@ -0,0 +1,248 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from bisect import bisect_left
+import math
+import time
+from .config import settings
+from .logger import get_logger
+
+logger = get_logger()
+
+# Seconds; spans a cache lookup (sub-millisecond) to a slow Segmind call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """
+        Base of a metric family. Children (one per label combination) are
+        created on first use and cached, so hot paths can resolve them once.
+        :param name: Metric name, including the namespace prefix
+        :param documentation: HELP text
+        :param labelnames: Label names; values are passed to labels() in this order
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values: str):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self._default.inc(amount)
+
+    def samples(self) -> Iterable[str]:
+        for key, child in list(self._children.items()):
+            yield f"{self.name}{_labels(self.labelnames, key)} {_format_value(child.value)}"
+
+class HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        # Per-bucket (not cumulative) counts: one list slot and one float per sample
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def time(self) -> "Timer":
+        return Timer(self)
+
+class Timer:
+    __slots__ = ("child", "started")
+
+    def __init__(self, child: HistogramChild):
+        self.child = child
+
+    def __enter__(self) -> "Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.child.observe(time.perf_counter() - self.started)
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.bounds)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def time(self) -> Timer:
+        return self._default.time()
+
+    def samples(self) -> Iterable[str]:
+        for key, child in list(self._children.items()):
+            counts = list(child.counts)
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_format_value(child.sum)}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+class CallbackMetric(Metric):
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], Any],
+        labelnames: Sequence[str] = (),
+        type: str = "gauge",
+    ):
+        """
+        Metric read from existing state at scrape time, so it costs nothing
+        between scrapes
+        :param callback: Returns a number, or a dict of label value tuple -> number
+        :param type: "gauge" or "counter"
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self.type = type
+
+    def labels(self, *values: str):
+        raise TypeError(f"{self.name} is read from a callback")
+
+    def samples(self) -> Iterable[str]:
+        value = self.callback()
+        if not isinstance(value, dict):
+            value = {(): value}
+        for key, number in value.items():
+            yield f"{self.name}{_labels(self.labelnames, key)} {_format_value(number)}"
+
+class MetricsRegistry:
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, namespace: str = settings.METRICS_NAMESPACE):
+        """
+        Process-local metric registry rendered in the Prometheus text format.
+        Recording takes no lock: metrics are updated from the event loop thread,
+        and a scrape racing an update at worst sees a sample in a bucket before
+        it is added to the sum.
+        :param namespace: Prefix of every metric name
+        """
+        self.namespace = namespace
+        self._metrics: Dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def _name(self, name: str) -> str:
+        return f"{self.namespace}_{name}" if self.namespace else name
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self._name(name), documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self._name(name), documentation, labelnames, buckets))
+
+    def gauge_callback(self, name: str, documentation: str, callback: Callable[[], Any], labelnames: Sequence[str] = ()) -> CallbackMetric:
+        return self._register(CallbackMetric(self._name(name), documentation, callback, labelnames))
+
+    def counter_callback(self, name: str, documentation: str, callback: Callable[[], Any], labelnames: Sequence[str] = ()) -> CallbackMetric:
+        return self._register(CallbackMetric(self._name(name), documentation, callback, labelnames, type="counter"))
+
+    def render(self) -> str:
+        """
+        Render every metric; a failing callback is skipped and logged
+        :return: Exposition text
+        """
+        blocks: List[str] = []
+        for metric in list(self._metrics.values()):
+            try:
+                blocks.append(metric.render())
+            except Exception as e:
+                logger.error(f"Error collecting metric {metric.name}: {str(e)}")
+        return "\n".join(blocks) + "\n"
+
+# Create a global registry and the metrics recorded on hot paths
+metrics = MetricsRegistry()
+
+http_requests = metrics.counter(
+    "http_requests_total", "HTTP requests by method, route and status", ("method", "route", "status")
+)
+http_request_seconds = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency by method and route", ("method", "route")
+)
+page_stage_seconds = metrics.histogram(
+    "page_stage_duration_seconds", "Time spent in each stage of a page job", ("stage",)
+)
+scheduler_wait_seconds = metrics.histogram(
+    "scheduler_wait_seconds", "Time jobs wait in the scheduler queue before a worker picks them up"
+)
+page_jobs = metrics.counter(
+    "page_jobs_total", "Finished page jobs by outcome and result source", ("status", "result_source")
+)
+cache_operation_seconds = metrics.histogram(
+    "cache_operation_duration_seconds", "Job store operation latency", ("operation",),
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+)
+upload_bytes = metrics.counter("upload_bytes_total", "Bytes received by /upload")
+uploads = metrics.counter("uploads_total", "Files accepted by /upload", ("deduplicated",))
+openai_seconds = metrics.histogram("openai_request_duration_seconds", "OpenAI call latency by endpoint", ("endpoint",))
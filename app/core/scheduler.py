@@ -0,0 +1,256 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+from collections import OrderedDict, deque
+import asyncio
+import time
+from .config import settings
+from .metrics import scheduler_wait_seconds
+from .logger import get_logger
+
+logger = get_logger()
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the scheduler queue is at capacity"""
+
+    def __init__(self, depth: int, retry_after: int):
+        super().__init__(f"Job queue is full ({depth} jobs waiting)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+class SchedulerClosedError(Exception):
+    """Raised when a job is submitted after the scheduler started draining"""
+
+class Job:
+    __slots__ = ("key", "func", "args", "kwargs", "priority", "on_abort", "enqueued_at")
+
+    def __init__(
+        self,
+        key: str,
+        func: Callable[..., Awaitable[Any]],
+        args: tuple,
+        kwargs: dict,
+        priority: bool,
+        on_abort: Optional[Callable[[str], Any]] = None,
+    ):
+        self.key = key
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.on_abort = on_abort
+        self.enqueued_at = time.monotonic()
+
+    def abort(self, reason: str) -> None:
+        # Let the owner record the job as failed; it will never run (again)
+        if self.on_abort is None:
+            return
+        try:
+            self.on_abort(reason)
+        except Exception as e:
+            logger.error(f"Recording aborted job for {self.key} failed: {str(e)}")
+
+class JobScheduler:
+    def __init__(
+        self,
+        workers: int = settings.SCHEDULER_WORKERS,
+        max_queue: int = settings.SCHEDULER_MAX_QUEUE,
+        drain_timeout: float = settings.SCHEDULER_DRAIN_TIMEOUT,
+    ):
+        """
+        In-process job scheduler with a bounded queue and a fixed worker pool.
+        Jobs are grouped by key (the init_id) and served round-robin across keys,
+        so a large book cannot starve a small one. Priority jobs are always served
+        before normal ones, with the same per-key fairness.
+        :param workers: Number of concurrent workers
+        :param max_queue: Maximum number of waiting jobs across both lanes
+        :param drain_timeout: Seconds to wait for queued and running jobs on shutdown
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        self.drain_timeout = drain_timeout
+        self._lanes: Dict[bool, "OrderedDict[str, deque]"] = {True: OrderedDict(), False: OrderedDict()}
+        self._depth = 0
+        self._in_flight = 0
+        self._running: Dict[str, int] = {}
+        self._pending = asyncio.Semaphore(0)
+        self._tasks: list = []
+        self._closing = False
+        self._avg_wait = 0.0
+        self._avg_run = 0.0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    async def start(self) -> None:
+        """
+        Spawn the worker pool. Safe to call more than once.
+        """
+        if self._tasks:
+            return
+        self._closing = False
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Job scheduler started with {self.workers} workers, max queue: {self.max_queue}")
+
+    def submit(
+        self,
+        key: str,
+        func: Callable[..., Awaitable[Any]],
+        *args,
+        priority: bool = False,
+        on_abort: Optional[Callable[[str], Any]] = None,
+        **kwargs
+    ) -> int:
+        """
+        Enqueue a coroutine function for execution by the worker pool
+        :param key: Fairness key, normally the init_id of the book
+        :param func: Coroutine function to run
+        :param priority: Put the job in the priority lane
+        :param on_abort: Called with a reason if shutdown drops the job from the
+                         queue or cancels it while running
+        :return: Queue depth after the job was added
+        :raises QueueFullError: If the queue is at capacity
+        :raises SchedulerClosedError: If the scheduler is draining
+        """
+        if self._closing:
+            raise SchedulerClosedError("Job scheduler is shutting down")
+        if self._depth >= self.max_queue:
+            self._rejected += 1
+            raise QueueFullError(self._depth, self._retry_after())
+        if not self._tasks:
+            asyncio.get_running_loop().create_task(self.start())
+
+        lane = self._lanes[priority]
+        if key not in lane:
+            lane[key] = deque()
+        lane[key].append(Job(key, func, args, kwargs, priority, on_abort))
+        self._depth += 1
+        self._pending.release()
+        return self._depth
+
+    def _pop(self) -> Job:
+        lane = self._lanes[True] if self._lanes[True] else self._lanes[False]
+        key, jobs = next(iter(lane.items()))
+        job = jobs.popleft()
+        if jobs:
+            lane.move_to_end(key)
+        else:
+            del lane[key]
+        self._depth -= 1
+        return job
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            await self._pending.acquire()
+            if self._depth == 0:
+                # Woken by stop() with nothing left to drain
+                return
+            job = self._pop()
+            started = time.monotonic()
+            self._avg_wait = self._ewma(self._avg_wait, started - job.enqueued_at)
+            scheduler_wait_seconds.observe(started - job.enqueued_at)
+            self._in_flight += 1
+            self._running[job.key] = self._running.get(job.key, 0) + 1
+            try:
+                await job.func(*job.args, **job.kwargs)
+                self._completed += 1
+            except asyncio.CancelledError:
+                job.abort("Cancelled by shutdown")
+                raise
+            except Exception as e:
+                self._failed += 1
+                logger.error(f"Scheduled job for {job.key} failed: {str(e)}")
+            finally:
+                self._in_flight -= 1
+                if self._running[job.key] == 1:
+                    del self._running[job.key]
+                else:
+                    self._running[job.key] -= 1
+                self._avg_run = self._ewma(self._avg_run, time.monotonic() - started)
+
+    def _ewma(self, current: float, sample: float) -> float:
+        return sample if current == 0.0 else 0.9 * current + 0.1 * sample
+
+    def _retry_after(self) -> int:
+        # Rough time until a slot frees up, bounded to something a client can wait for
+        per_slot = self._avg_run / max(self.workers, 1)
+        return max(1, min(60, int(per_slot) + 1))
+
+    async def stop(self) -> None:
+        """
+        Stop accepting jobs and drain queued and in-flight jobs, cancelling
+        whatever is still running after the drain timeout
+        """
+        if not self._tasks:
+            return
+        self._closing = True
+        for _ in self._tasks:
+            self._pending.release()
+        logger.info(f"Draining job scheduler: {self._depth} queued, {self._in_flight} in flight")
+        done, pending = await asyncio.wait(self._tasks, timeout=self.drain_timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            dropped = self._depth
+            while self._depth:
+                self._pop().abort("Dropped by shutdown before it ran")
+            logger.warning(f"Job scheduler drain timed out, dropped {dropped} queued jobs")
+        self._tasks = []
+        # Wake-ups meant for the stopped workers must not reach the next pool
+        self._pending = asyncio.Semaphore(0)
+        logger.info("Job scheduler stopped")
+
+    def queued_for(self, key: str) -> int:
+        """
+        Get the number of waiting jobs for a key
+        :param key: Fairness key
+        :return: Number of queued jobs
+        """
+        return sum(len(lane.get(key, ())) for lane in self._lanes.values())
+
+    def running_for(self, key: str) -> int:
+        return self._running.get(key, 0)
+
+    def fair_share(self, key: str) -> float:
+        """
+        Estimate how many workers a key gets while its jobs run, given
+        round-robin service across every key with queued or running jobs
+        :param key: Fairness key
+        :return: Expected number of workers, at least 1
+        """
+        keys = set(self._running)
+        for lane in self._lanes.values():
+            keys.update(lane)
+        keys.add(key)
+        return max(1.0, self.workers / len(keys))
+
+    def oldest_wait(self) -> float:
+        now = time.monotonic()
+        heads = [jobs[0].enqueued_at for lane in self._lanes.values() for jobs in lane.values()]
+        return round(now - min(heads), 3) if heads else 0.0
+
+    def stats(self, key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get queue depth, wait times and job counters
+        :param key: Optional fairness key to include its own queued count
+        :return: Dict of scheduler statistics
+        """
+        data = {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "depth": self._depth,
+            "priority_depth": sum(len(jobs) for jobs in self._lanes[True].values()),
+            "in_flight": self._in_flight,
+            "avg_wait_seconds": round(self._avg_wait, 3),
+            "avg_run_seconds": round(self._avg_run, 3),
+            "oldest_wait_seconds": self.oldest_wait(),
+            "completed": self._completed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+        }
+        if key is not None:
+            data["process_queued"] = self.queued_for(key)
+            data["process_running"] = self.running_for(key)
+        return data
+
+# Create a global scheduler for page processing jobs
+scheduler = JobScheduler()
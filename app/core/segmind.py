@@ -0,0 +1,385 @@
+from typing import Any, Dict, Optional, Tuple, Union
+from collections import deque
+from pathlib import Path
+import asyncio
+import os
+import random
+import time
+import aiohttp
+from .config import settings
+from .http_client import http_client, HTTPClientManager
+from .storage import stream_to_temp
+from .streaming import JSONStreamPayload
+from .logger import get_logger
+
+logger = get_logger()
+
+# Responses worth retrying: throttling and server-side trouble
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Failures to connect: the request was never sent, so sending it again cannot
+# run (and bill) the swap twice
+NOT_SENT_ERRORS = (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError)
+
+class SegmindError(Exception):
+    """Raised when a Segmind call fails for good"""
+
+    def __init__(
+        self,
+        message: str,
+        status: Optional[int] = None,
+        retryable: bool = False,
+        retry_after: Optional[float] = None,
+    ):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+class CircuitOpenError(SegmindError):
+    """Raised when the circuit breaker stays open longer than a caller may wait"""
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        initial: int = settings.SEGMIND_INITIAL_CONCURRENCY,
+        minimum: int = settings.SEGMIND_MIN_CONCURRENCY,
+        maximum: int = settings.SEGMIND_MAX_CONCURRENCY,
+        slow_seconds: float = settings.SEGMIND_SLOW_SECONDS,
+        decrease_factor: float = settings.SEGMIND_DECREASE_FACTOR,
+        max_error_rate: float = settings.SEGMIND_MAX_ERROR_RATE,
+        window: int = 50,
+    ):
+        """
+        Concurrency limit adjusted by AIMD: a fast success while the limit is
+        in use adds 1/limit (about one slot per round of calls), and a failure
+        or slow call multiplies the limit by decrease_factor. The limit only
+        grows when callers are waiting on it and recent calls mostly succeed,
+        so it stays near the concurrency actually used and a decrease takes
+        effect at once. Decreases are applied at most once per average call
+        latency, so one burst of failures counts as one congestion signal.
+        :param initial: Starting limit
+        :param minimum: Lowest limit
+        :param maximum: Highest limit
+        :param slow_seconds: Calls slower than this count as congestion
+        :param decrease_factor: Multiplier applied on congestion
+        :param max_error_rate: No increases while the recent error rate is above this
+        :param window: Recent outcomes kept for the error rate
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.slow_seconds = slow_seconds
+        self.decrease_factor = decrease_factor
+        self.max_error_rate = max_error_rate
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.in_flight = 0
+        self._cond = asyncio.Condition()
+        self._outcomes: deque = deque(maxlen=window)
+        self._avg_latency = 0.0
+        self._last_decrease = 0.0
+        self.increases = 0
+        self.decreases = 0
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, latency: float, ok: bool) -> None:
+        """
+        Give a slot back and adjust the limit from the call's outcome
+        :param latency: Seconds the call took
+        :param ok: False for failures that signal overload (timeouts, 429, 5xx)
+        """
+        async with self._cond:
+            # Saturated: every slot was taken while this call ran
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            self._outcomes.append(ok)
+            self._avg_latency = latency if self._avg_latency == 0.0 else 0.8 * self._avg_latency + 0.2 * latency
+            now = time.monotonic()
+            if ok and latency <= self.slow_seconds:
+                if saturated and self.limit < self.maximum and self.error_rate() <= self.max_error_rate:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                    self.increases += 1
+            elif now - self._last_decrease >= self._avg_latency:
+                self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                self._last_decrease = now
+                self.decreases += 1
+                logger.warning(f"Segmind concurrency limit lowered to {int(self.limit)} (latency {latency:.1f}s, ok={ok})")
+            self._cond.notify_all()
+
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return 1 - sum(self._outcomes) / len(self._outcomes)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "error_rate": round(self.error_rate(), 3),
+            "avg_latency_seconds": round(self._avg_latency, 3),
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        threshold: int = settings.SEGMIND_BREAKER_THRESHOLD,
+        reset_timeout: float = settings.SEGMIND_BREAKER_RESET,
+    ):
+        """
+        Opens after threshold consecutive failures. While open, callers wait for
+        the reset timeout instead of sending calls that would fail; then a single
+        probe is let through and its outcome closes or re-opens the breaker.
+        :param threshold: Consecutive failures that open the breaker
+        :param reset_timeout: Seconds the breaker stays open before probing
+        """
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._changed = asyncio.Event()
+        self.trips = 0
+
+    async def wait_ready(self, max_wait: float) -> None:
+        """
+        Wait until a call may be sent
+        :param max_wait: Longest time to wait for the breaker to close
+        :raises CircuitOpenError: If the breaker is still open after max_wait
+        """
+        deadline = time.monotonic() + max_wait
+        while True:
+            now = time.monotonic()
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            remaining = deadline - now
+            if remaining <= 0:
+                raise CircuitOpenError("Segmind circuit breaker is open", retryable=True)
+            if self.state == self.OPEN:
+                remaining = min(remaining, self._opened_at + self.reset_timeout - now)
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=max(remaining, 0.01))
+            except asyncio.TimeoutError:
+                pass
+
+    def record(self, ok: bool) -> None:
+        if ok:
+            if self.state != self.CLOSED:
+                logger.info("Segmind circuit breaker closed")
+            self.state = self.CLOSED
+            self._failures = 0
+        else:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                    logger.warning(f"Segmind circuit breaker opened after {self._failures} failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+        self._probing = False
+        self._changed.set()
+
+    def abandon(self) -> None:
+        """
+        Release the probe slot of a call that ended without an outcome (cancelled)
+        """
+        self._probing = False
+        self._changed.set()
+
+    def stats(self) -> Dict[str, Any]:
+        data = {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "trips": self.trips,
+        }
+        if self.state == self.OPEN:
+            data["retry_in_seconds"] = round(max(0.0, self._opened_at + self.reset_timeout - time.monotonic()), 1)
+        return data
+
+class SegmindClient:
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        read_timeout: float = settings.SEGMIND_READ_TIMEOUT,
+        retries: int = settings.SEGMIND_RETRIES,
+        backoff_base: float = settings.SEGMIND_BACKOFF_BASE,
+        backoff_max: float = settings.SEGMIND_BACKOFF_MAX,
+        breaker_max_wait: float = settings.SEGMIND_BREAKER_MAX_WAIT,
+        limiter: Optional[AdaptiveLimiter] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        http: HTTPClientManager = http_client,
+    ):
+        """
+        Segmind face swap client with adaptive concurrency, retries with jittered
+        exponential backoff and a circuit breaker
+        :param url: Endpoint; defaults to settings.SEGMIND_API_URL at call time
+        :param api_key: Key; defaults to settings.SEGMIND_API_KEY at call time
+        :param read_timeout: Seconds allowed between reads of the response
+        :param retries: Extra attempts after a 429, a 5xx or a failure to connect
+        :param backoff_base: First backoff in seconds, doubled on every retry
+        :param backoff_max: Cap of a single backoff
+        :param breaker_max_wait: Longest time a call waits for an open breaker
+        :param limiter: Concurrency limiter (AIMD by default)
+        :param breaker: Circuit breaker
+        :param http: Connection pool to send requests through
+        """
+        self.url = url
+        self.api_key = api_key
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_max_wait = breaker_max_wait
+        self.limiter = limiter or AdaptiveLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.http = http
+        self.calls = 0
+        self.attempts = 0
+        self.retried = 0
+        self.failed = 0
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Delay before the next attempt: full jitter over an exponential ceiling,
+        never shorter than a server-sent Retry-After
+        :param attempt: Zero-based attempt that just failed
+        :param retry_after: Seconds requested by the server, if any
+        :return: Seconds to sleep
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    async def swap(self, payload: Dict[str, Any]) -> bytes:
+        """
+        Run one face swap
+        :param payload: Request body
+        :return: Result image bytes
+        :raises SegmindError: On a non-retryable error or when retries are exhausted
+        """
+        return await self._call(payload)
+
+    async def swap_to_file(self, payload: Dict[str, Any], path: Union[str, Path]) -> Tuple[str, int]:
+        """
+        Run one face swap without holding images in memory: ImageSource values
+        of the body are base64-encoded from their files while the request is
+        sent, and the response is written to path in chunks as it arrives.
+        path only appears once the whole result was received.
+        :param payload: Request body; ImageSource values are streamed
+        :param path: Result file
+        :return: (SHA-256 hex digest, size in bytes) of the result
+        :raises SegmindError: On a non-retryable error or when retries are exhausted
+        """
+        return await self._call(payload, Path(path))
+
+    async def _call(self, payload: Dict[str, Any], path: Optional[Path] = None) -> Any:
+        self.calls += 1
+        error: Optional[SegmindError] = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retried += 1
+                await asyncio.sleep(self.backoff(attempt - 1, error.retry_after))
+            try:
+                await self.breaker.wait_ready(self.breaker_max_wait)
+            except CircuitOpenError:
+                self.failed += 1
+                raise
+            try:
+                return await self._attempt(payload, path)
+            except SegmindError as e:
+                error = e
+                if not e.retryable:
+                    break
+                logger.warning(f"Segmind attempt {attempt + 1}/{self.retries + 1} failed: {str(e)}")
+            except BaseException:
+                self.breaker.abandon()
+                raise
+        self.failed += 1
+        raise error
+
+    async def _attempt(self, payload: Dict[str, Any], path: Optional[Path] = None) -> Any:
+        await self.limiter.acquire()
+        self.attempts += 1
+        started = time.monotonic()
+        overloaded = False
+        try:
+            session = await self.http.get_session()
+            # A streamed body is consumed by sending it; every attempt gets its own
+            body = {"json": payload} if path is None else {"data": JSONStreamPayload(payload)}
+            async with session.post(
+                self.url or settings.SEGMIND_API_URL,
+                headers={'x-api-key': self.api_key or settings.SEGMIND_API_KEY},
+                timeout=self.http.timeout(read=self.read_timeout),
+                **body
+            ) as response:
+                if response.status == 200:
+                    if path is None:
+                        result = await response.read()
+                    else:
+                        tmp_path, digest, size = await stream_to_temp(response.content.read, path.parent, None)
+                        os.replace(tmp_path, path)
+                        result = (digest, size)
+                    self.breaker.record(True)
+                    return result
+
+                error_text = await response.text()
+                logger.error(f"Segmind API error: {response.status} - {error_text[:200]}")
+                retryable = response.status in RETRYABLE_STATUSES
+                overloaded = retryable
+                # Only server errors count against the breaker; a 4xx means Segmind is up
+                self.breaker.record(response.status < 500)
+                raise SegmindError(
+                    f"Segmind API error {response.status}",
+                    response.status,
+                    retryable,
+                    self._retry_after(response.headers.get("Retry-After"))
+                )
+        except NOT_SENT_ERRORS as e:
+            overloaded = True
+            self.breaker.record(False)
+            raise SegmindError(f"Segmind connection failed: {type(e).__name__} {str(e)}".strip(), retryable=True) from e
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            # Read timeouts and dropped connections: Segmind may have run the
+            # swap already, and each call is billed, so it is not sent again
+            overloaded = True
+            self.breaker.record(False)
+            raise SegmindError(f"Segmind request failed: {type(e).__name__} {str(e)}".strip()) from e
+        finally:
+            await self.limiter.release(time.monotonic() - started, not overloaded)
+
+    @staticmethod
+    def _retry_after(value: Optional[str]) -> Optional[float]:
+        try:
+            return float(value) if value else None
+        except ValueError:
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limiter": self.limiter.stats(),
+            "breaker": self.breaker.stats(),
+            "calls": self.calls,
+            "attempts": self.attempts,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+# Create a global Segmind client
+segmind = SegmindClient()
@@ -0,0 +1,128 @@
+from typing import Optional
+from email.utils import formatdate
+from mimetypes import guess_type
+from urllib.parse import quote
+import os
+import re
+from starlette.datastructures import Headers, QueryParams
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+from .config import settings
+from .storage import CONTENT_ADDRESSED, shard_of
+from .lifecycle import lifecycle
+from .variants import VariantRenderer, variants
+
+# Stored names are never reused: uploads and results carry a UUID or the
+# digest of their bytes, and a variant's name is derived from its source's
+UNIQUE_NAME = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+class StoredFileResponse(FileResponse):
+    # Stored images are mostly 0.5-5 MB; fewer, larger reads mean fewer thread hops
+    # when the server cannot send the file itself
+    chunk_size = 256 * 1024
+
+class StorageFiles(StaticFiles):
+    def __init__(
+        self,
+        directory: str,
+        max_age: int = settings.STATIC_MAX_AGE,
+        accel_redirect: Optional[str] = settings.STATIC_ACCEL_REDIRECT,
+    ):
+        """
+        Static serving of stored files by their flat name, as in every
+        file_url handed out. Names are looked up in their shard first and
+        then in the flat directory, where files from before sharding stay.
+        Responses carry a strong ETag, answer If-None-Match with 304, and
+        honour Range and If-Range. Files that can never change under their
+        name are marked immutable so clients and CDNs keep them.
+        The body goes out with sendfile when the server supports the ASGI
+        pathsend extension, or through nginx with accel_redirect.
+        :param directory: Storage directory
+        :param max_age: Cache lifetime in seconds of names that may be reused
+        :param accel_redirect: Internal nginx location of directory; when set
+                               only headers are sent and nginx sends the file
+        """
+        super().__init__(directory=directory)
+        self.max_age = max_age
+        self.accel_redirect = accel_redirect.rstrip("/") if accel_redirect else None
+
+    def lookup_path(self, path: str):
+        if settings.STORAGE_SHARDED and os.sep not in path:
+            full_path, stat_result = super().lookup_path(os.path.join(shard_of(path), path))
+            if stat_result is not None:
+                return full_path, stat_result
+        return super().lookup_path(path)
+
+    @staticmethod
+    def etag(name: str, stat_result: os.stat_result) -> str:
+        """
+        Get the strong ETag of a stored file
+        :param name: Stored filename
+        :param stat_result: File status
+        :return: The content digest for content-addressed names, else mtime and size
+        """
+        match = CONTENT_ADDRESSED.match(name)
+        if match and "." not in name[len(match.group(0)):]:
+            return f'"{match.group(1)}"'
+        # Files are only ever replaced whole (os.replace), which changes the mtime
+        return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+    def cache_control(self, name: str) -> str:
+        if CONTENT_ADDRESSED.match(name) or UNIQUE_NAME.search(name):
+            return f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+        return f"public, max-age={self.max_age}"
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        name = os.path.basename(full_path)
+        headers = {"etag": self.etag(name, stat_result), "cache-control": self.cache_control(name)}
+        if settings.STORAGE_LIFECYCLE:
+            lifecycle.touch(name)
+
+        if self.accel_redirect:
+            relative = os.path.relpath(full_path, os.path.realpath(self.directory))
+            headers.update({
+                "x-accel-redirect": quote(f"{self.accel_redirect}/{relative.replace(os.sep, '/')}"),
+                "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+            })
+            response = Response(
+                status_code=status_code,
+                headers=headers,
+                media_type=guess_type(name)[0] or "application/octet-stream"
+            )
+        else:
+            response = StoredFileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+class VariantFiles(StorageFiles):
+    def __init__(self, directory: str, renderer: VariantRenderer = variants, **kwargs):
+        """
+        Preview variants of stored files: /{file}?w=400&fmt=webp renders the
+        variant on first request and serves it like any stored file after
+        :param directory: Storage directory
+        :param renderer: Variant renderer
+        """
+        super().__init__(directory=directory, **kwargs)
+        self.renderer = renderer
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405, headers={"Allow": "GET, HEAD"})
+        if os.sep in path:
+            raise HTTPException(status_code=404)
+        params = QueryParams(scope.get("query_string", b""))
+        try:
+            width = int(params.get("w", ""))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Query parameter w must be a width in pixels")
+        try:
+            variant_ref = await self.renderer.get(path, width, params.get("fmt", "webp").lower())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except FileNotFoundError:
+            raise HTTPException(status_code=404)
+        return await super().get_response(variant_ref, scope)
@@ -0,0 +1,361 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from functools import lru_cache
+from pathlib import Path
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import aiofiles
+from .config import settings
+from .logger import get_logger
+
+logger = get_logger()
+
+# Files named after the SHA-256 of their bytes (deduplicated uploads and their variants)
+CONTENT_ADDRESSED = re.compile(r"^([0-9a-f]{64})\.")
+
+def shard_of(name: str) -> str:
+    """
+    Get the subdirectory a stored file goes in: two levels of two hex digits
+    taken from the digest of content-addressed names, or from a hash of the
+    name otherwise, so files spread evenly and no directory grows large
+    :param name: Stored filename
+    :return: e.g. "3f/a0"
+    """
+    match = CONTENT_ADDRESSED.match(name)
+    key = match.group(1) if match else hashlib.md5(name.encode("utf-8")).hexdigest()
+    return f"{key[:2]}/{key[2:4]}"
+
+def storage_path(name: str, root: Optional[str] = None) -> Path:
+    """
+    Get the path to write a new stored file to, creating its shard directory
+    :param name: Stored filename
+    :param root: Storage directory (default UPLOAD_DIR)
+    :return: Path of the file
+    """
+    root_path = Path(root or settings.UPLOAD_DIR)
+    if not settings.STORAGE_SHARDED:
+        return root_path / name
+    path = root_path / shard_of(name) / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+def find_stored(name: str, root: Optional[str] = None) -> Path:
+    """
+    Get the path of an existing stored file. Files written before sharding
+    was enabled stay in the flat directory and are still found there.
+    :param name: Stored filename
+    :param root: Storage directory (default UPLOAD_DIR)
+    :return: Path of the file; the sharded path if it exists nowhere
+    """
+    root_path = Path(root or settings.UPLOAD_DIR)
+    if not settings.STORAGE_SHARDED:
+        return root_path / name
+    path = root_path / shard_of(name) / name
+    if not path.exists():
+        flat = root_path / name
+        if flat.exists():
+            return flat
+    return path
+
+class UploadTooLargeError(Exception):
+    """Raised when a streamed file exceeds the configured size limit"""
+
+    def __init__(self, limit: int):
+        super().__init__(f"File exceeds maximum size of {limit} bytes")
+        self.limit = limit
+
+async def stream_to_temp(
+    read: Callable[[int], Awaitable[bytes]],
+    directory: Path,
+    max_bytes: Optional[int] = settings.UPLOAD_MAX_BYTES,
+    chunk_size: int = settings.UPLOAD_CHUNK_SIZE,
+) -> Tuple[Path, str, int]:
+    """
+    Copy a stream into a temp file in directory in fixed-size chunks, hashing
+    it in the same pass. The temp file lives on the same filesystem as its
+    destination so the caller can move it into place atomically with os.replace. It is removed
+    if the copy fails or the limit is exceeded.
+    :param read: Async callable returning up to n bytes, b"" at end of stream
+    :param directory: Directory for the temp file
+    :param max_bytes: Abort once more than this many bytes were read (None for no limit)
+    :param chunk_size: Bytes read per iteration
+    :return: (temp path, SHA-256 hex digest, size in bytes)
+    :raises UploadTooLargeError: If the stream is larger than max_bytes
+    """
+    tmp_path = directory / f".{uuid.uuid4()}.part"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as f:
+            while True:
+                chunk = await read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise UploadTooLargeError(max_bytes)
+                digest.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        if tmp_path.exists():
+            os.unlink(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest(), size
+
+class ContentStore:
+    def __init__(
+        self,
+        root: str = settings.UPLOAD_DIR,
+        index_path: str = settings.UPLOAD_INDEX_PATH,
+        chunk_size: int = settings.UPLOAD_CHUNK_SIZE,
+        max_bytes: Optional[int] = settings.UPLOAD_MAX_BYTES,
+    ):
+        """
+        Content-addressed file storage. Files are named by the SHA-256 of their
+        bytes and stored once, so the same photo uploaded for many books takes
+        one file. A SQLite index shared by all workers maps digests to files,
+        counts uploads of each and reference counts them: every job using a
+        file holds one reference, released when the job expires.
+        Files are only deleted through delete(), which the storage lifecycle
+        uses, and only once no reference is left, so a repeat upload never gets
+        the URL of a file being deleted and a job never loses its images.
+        :param root: Directory files are stored in
+        :param index_path: SQLite database holding digests, upload and reference counts
+        :param chunk_size: Bytes read from the source per iteration
+        :param max_bytes: Largest file accepted (None for no limit)
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.index_path = index_path
+        Path(index_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(index_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                uploads INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_upload REAL NOT NULL DEFAULT 0,
+                refcount INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(blobs)")}
+        if "uploads" not in columns:
+            # Indexes written when the count of uploads was the only count
+            self._conn.execute("ALTER TABLE blobs RENAME COLUMN refcount TO uploads")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(blobs)")}
+        if "last_upload" not in columns:
+            self._conn.execute("ALTER TABLE blobs ADD COLUMN last_upload REAL NOT NULL DEFAULT 0")
+        if "refcount" not in columns:
+            self._conn.execute("ALTER TABLE blobs ADD COLUMN refcount INTEGER NOT NULL DEFAULT 0")
+        # One reference per job using a blob, released when the job expires
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS refs (
+                digest TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (digest, owner)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS refs_expires ON refs (expires_at)")
+        self.deduplicated = 0
+        self.bytes_saved = 0
+
+    async def ingest(self, read: Callable[[int], Awaitable[bytes]], extension: str) -> Tuple[str, bool]:
+        """
+        Stream a file into the store, hashing it in the same pass
+        :param read: Async callable returning up to n bytes, b"" at end of stream
+        :param extension: File extension without the dot
+        :return: (filename, created) where created is False if the content already existed
+        :raises UploadTooLargeError: If the stream is larger than max_bytes
+        """
+        tmp_path, hexdigest, size = await stream_to_temp(read, self.root, self.max_bytes, self.chunk_size)
+        try:
+            filename, uploads = self._commit(tmp_path, hexdigest, extension, size)
+        except BaseException:
+            if tmp_path.exists():
+                os.unlink(tmp_path)
+            raise
+
+        created = uploads == 1
+        if not created:
+            self.deduplicated += 1
+            self.bytes_saved += size
+            logger.info(f"Deduplicated upload {filename} (uploads: {uploads})")
+        return filename, created
+
+    def _commit(self, tmp_path: Path, digest: str, extension: str, size: int) -> Tuple[str, int]:
+        # The existence check, the move into place and the index update form one
+        # write transaction, which delete() also takes: across workers, a file is
+        # either deleted before the check (and written again) or kept
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT filename FROM blobs WHERE digest = ?", (digest,)).fetchone()
+                filename = row[0] if row else f"{digest}.{extension}"
+                if find_stored(filename, self.root).exists():
+                    os.unlink(tmp_path)
+                else:
+                    os.replace(tmp_path, storage_path(filename, self.root))
+                now = time.time()
+                uploads = self._conn.execute(
+                    "INSERT INTO blobs (digest, filename, size, uploads, created_at, last_upload) VALUES (?, ?, ?, 1, ?, ?) "
+                    "ON CONFLICT(digest) DO UPDATE SET uploads = blobs.uploads + 1, last_upload = excluded.last_upload "
+                    "RETURNING uploads",
+                    (digest, filename, size, now, now)
+                ).fetchone()[0]
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return filename, uploads
+
+    def lookup(self, digest: str) -> Optional[str]:
+        """
+        Get the stored filename for a digest
+        :param digest: SHA-256 hex digest
+        :return: Filename or None if unknown
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT filename FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        return row[0] if row else None
+
+    def acquire(self, filename: str, owner: str, expires_at: float) -> int:
+        """
+        Take a reference to a stored file for a job, or extend the one it holds
+        :param filename: Stored filename
+        :param owner: init_id of the job
+        :param expires_at: Time the job expires; the reference is released then
+        :return: References held on the file, 0 if it is not in the index
+        """
+        digest = filename.split(".", 1)[0]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT refcount FROM blobs WHERE digest = ? AND filename = ?", (digest, filename)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("ROLLBACK")
+                    return 0
+                refcount = row[0]
+                held = self._conn.execute(
+                    "UPDATE refs SET expires_at = MAX(expires_at, ?) WHERE digest = ? AND owner = ?",
+                    (expires_at, digest, owner)
+                ).rowcount
+                if not held:
+                    self._conn.execute(
+                        "INSERT INTO refs (digest, owner, expires_at) VALUES (?, ?, ?)", (digest, owner, expires_at)
+                    )
+                    refcount = self._conn.execute(
+                        "UPDATE blobs SET refcount = refcount + 1 WHERE digest = ? RETURNING refcount", (digest,)
+                    ).fetchone()[0]
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return refcount
+
+    def release_expired(self, now: Optional[float] = None) -> int:
+        """
+        Release the references of jobs that have expired
+        :param now: Current time (default time.time())
+        :return: Number of references released
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "DELETE FROM refs WHERE expires_at <= ? RETURNING digest", (time.time() if now is None else now,)
+                ).fetchall()
+                self._conn.executemany("UPDATE blobs SET refcount = MAX(refcount - 1, 0) WHERE digest = ?", rows)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def refcount(self, filename: str) -> int:
+        """
+        Get the number of jobs holding a stored file
+        :param filename: Stored filename
+        :return: References held, 0 if the file is not in the index
+        """
+        digest = filename.split(".", 1)[0]
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT refcount FROM blobs WHERE digest = ? AND filename = ?", (digest, filename)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def delete(self, filename: str, uploaded_before: float) -> bool:
+        """
+        Delete a stored file and its index entry once no job holds a reference
+        to it, unless it was uploaded again since uploaded_before (the upload
+        that got its URL may not have been used by a job yet)
+        :param filename: Stored filename
+        :param uploaded_before: Keep the file if uploaded at or after this time
+        :return: True if deleted (or already gone), False if kept
+        :raises OSError: If the file could not be deleted
+        """
+        digest = filename.split(".", 1)[0]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT last_upload, refcount FROM blobs WHERE digest = ? AND filename = ?", (digest, filename)
+                ).fetchone()
+                if row and (row[0] >= uploaded_before or row[1] > 0):
+                    self._conn.execute("ROLLBACK")
+                    return False
+                self._conn.execute("DELETE FROM blobs WHERE digest = ? AND filename = ?", (digest, filename))
+                self._conn.execute("DELETE FROM refs WHERE digest = ?", (digest,))
+                try:
+                    os.unlink(find_stored(filename, self.root))
+                except FileNotFoundError:
+                    pass
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get stored file totals and deduplication counters for this worker
+        :return: Dict of storage statistics
+        """
+        with self._lock:
+            files, total_bytes, total_uploads, total_refs = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(uploads), 0), COALESCE(SUM(refcount), 0) FROM blobs"
+            ).fetchone()
+        return {
+            "files": files,
+            "bytes": total_bytes,
+            "uploads": total_uploads,
+            "references": total_refs,
+            "deduplicated": self.deduplicated,
+            "bytes_saved": self.bytes_saved,
+        }
+
+@lru_cache()
+def get_content_store() -> ContentStore:
+    """
+    Get the shared content store, opening its index on first use
+    :return: ContentStore instance
+    """
+    return ContentStore()
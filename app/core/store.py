@@ -0,0 +1,542 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+import heapq
+import json
+import random
+import sqlite3
+import sys
+import threading
+import time
+from .config import settings
+from .logger import get_logger
+
+logger = get_logger()
+
+class JobStore(ABC):
+    """
+    Storage backend for process state. Keys are init_ids; values are dicts
+    keyed by page_id, which stores index so a page can be found on its own.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """Return the live value for key, or None if missing or expired"""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, expire: Optional[int] = None) -> None:
+        """Store value under key, expiring after expire seconds (or the store default)"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove key if present"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove every entry"""
+
+    @abstractmethod
+    def items(self) -> Iterator[Tuple[str, Any, Optional[float]]]:
+        """Yield (key, value, ttl_remaining) for every live entry"""
+
+    @abstractmethod
+    def find_by_page(self, page_id: str) -> Optional[str]:
+        """Return the key of the live entry holding page_id"""
+
+    def update_page(self, key: str, page_id: str, fields: Dict[str, Any]) -> int:
+        """
+        Atomically merge fields into one page of the record under key, creating
+        the page (and the record, with the default TTL) if missing. The record's
+        expiry is left unchanged.
+        Return the record's new version.
+        """
+        return self.update_pages(key, {page_id: fields})
+
+    @abstractmethod
+    def update_pages(self, key: str, pages: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Like update_page for several pages of one record in a single atomic
+        write; the version is bumped once.
+        Return the record's new version.
+        """
+
+    @abstractmethod
+    def get_record(self, key: str) -> Optional[Tuple[int, Any]]:
+        """Return (version, value) for a live record, with value a snapshot safe to iterate"""
+
+    @abstractmethod
+    def get_version(self, key: str) -> Optional[int]:
+        """Return the record's version without reading its value"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of live entries"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "current_size": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+        }
+
+def deep_sizeof(value: Any) -> int:
+    """
+    Approximate the memory held by a JSON-like value, including nested containers
+    :param value: Value to measure
+    :return: Size in bytes
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += deep_sizeof(k) + deep_sizeof(v)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += deep_sizeof(item)
+    return size
+
+class MemoryJobStore(JobStore):
+    name = "memory"
+
+    def __init__(
+        self,
+        ttl: int = 3600,
+        maxsize: int = 1000,
+        max_bytes: int = 64 * 1024 * 1024,
+        size_func: Callable[[Any], int] = deep_sizeof,
+    ):
+        """
+        Process-local store; state is not shared between workers or restarts.
+        Every entry carries its own expiry, tracked in a lazily-pruned heap.
+        Capacity is bounded by both entry count and total bytes, evicting the
+        least recently used entries first.
+        :param ttl: Default time to live in seconds
+        :param maxsize: Maximum number of entries
+        :param max_bytes: Maximum total size of stored values, as measured by size_func
+        :param size_func: Callable returning the size in bytes of a value
+        """
+        super().__init__()
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.size_func = size_func
+        # key -> (value, expires_at, size), ordered from least to most recently used
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._pages: Dict[str, str] = {}
+        self._versions: Dict[str, int] = {}
+
+    def _remove(self, key: str) -> None:
+        value, _, size = self._entries.pop(key)
+        self._bytes -= size
+        self._versions.pop(key, None)
+        if isinstance(value, dict):
+            for page_id in value:
+                if self._pages.get(page_id) == key:
+                    del self._pages[page_id]
+
+    def _expire(self, now: float) -> None:
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, key = heapq.heappop(heap)
+            entry = self._entries.get(key)
+            # Skip heap records left behind by a later set() of the same key
+            if entry is not None and entry[1] == expires_at:
+                self._remove(key)
+                self.expirations += 1
+        if len(heap) > 2 * len(self._entries) + 64:
+            self._expiry_heap = [(entry[1], key) for key, entry in self._entries.items()]
+            heapq.heapify(self._expiry_heap)
+
+    def _live(self, key: str, now: float) -> Optional[Tuple[Any, float, int]]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] <= now:
+            self._remove(key)
+            self.expirations += 1
+            return None
+        return entry
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._live(key, time.monotonic())
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, value: Any, expire: Optional[int] = None) -> None:
+        size = self.size_func(value)
+        if size > self.max_bytes:
+            raise ValueError(f"Value of {size} bytes exceeds cache budget of {self.max_bytes} bytes")
+        with self._lock:
+            now = time.monotonic()
+            expires_at = now + (expire or self.ttl)
+            version = self._versions.get(key, 0) + 1
+            if key in self._entries:
+                self._remove(key)
+            self._insert(key, value, expires_at, size, version)
+            self._expire(now)
+            self._evict(keep=key)
+
+    def _insert(self, key: str, value: Any, expires_at: float, size: int, version: int) -> None:
+        self._entries[key] = (value, expires_at, size)
+        self._versions[key] = version
+        self._bytes += size
+        heapq.heappush(self._expiry_heap, (expires_at, key))
+        if isinstance(value, dict):
+            for page_id in value:
+                self._pages[page_id] = key
+
+    def _evict(self, keep: str) -> None:
+        while len(self._entries) > self.maxsize or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            if oldest == keep and len(self._entries) == 1:
+                break
+            self._remove(oldest)
+            self.evictions += 1
+
+    def update_pages(self, key: str, pages: Dict[str, Dict[str, Any]]) -> int:
+        with self._lock:
+            now = time.monotonic()
+            entry = self._live(key, now)
+            if entry is None:
+                self._insert(key, {}, now + self.ttl, self.size_func({}), 1)
+                entry = self._entries[key]
+            value, expires_at, size = entry
+            delta = 0
+            for page_id, fields in pages.items():
+                page = value.get(page_id)
+                if page is None:
+                    container = sys.getsizeof(value)
+                    page = value[page_id] = {}
+                    self._pages[page_id] = key
+                    delta += sys.getsizeof(value) - container + self.size_func(page_id) + self.size_func(page)
+                # Only the touched pages are measured; the record itself is mutated in place
+                before = self.size_func(page)
+                page.update(fields)
+                delta += self.size_func(page) - before
+            self._entries[key] = (value, expires_at, size + delta)
+            self._entries.move_to_end(key)
+            self._bytes += delta
+            version = self._versions[key] = self._versions[key] + 1
+            self._evict(keep=key)
+            return version
+
+    def get_record(self, key: str) -> Optional[Tuple[int, Any]]:
+        with self._lock:
+            entry = self._live(key, time.monotonic())
+            if entry is None:
+                self.misses += 1
+                return None
+            # Status polls keep a live job at the recent end
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry[0]
+            if isinstance(value, dict):
+                value = {page_id: dict(page) if isinstance(page, dict) else page for page_id, page in value.items()}
+            return self._versions[key], value
+
+    def get_version(self, key: str) -> Optional[int]:
+        with self._lock:
+            if self._live(key, time.monotonic()) is None:
+                return None
+            self._entries.move_to_end(key)
+            return self._versions[key]
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._expiry_heap.clear()
+            self._pages.clear()
+            self._versions.clear()
+            self._bytes = 0
+
+    def items(self) -> Iterator[Tuple[str, Any, Optional[float]]]:
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            snapshot = list(self._entries.items())
+        for key, (value, expires_at, _) in snapshot:
+            yield key, value, round(expires_at - now, 3)
+
+    def find_by_page(self, page_id: str) -> Optional[str]:
+        with self._lock:
+            key = self._pages.get(page_id)
+            entry = self._live(key, time.monotonic()) if key is not None else None
+            if entry is not None and isinstance(entry[0], dict) and page_id in entry[0]:
+                return key
+            # Owner expired or was evicted; drop the stale index entry
+            self._pages.pop(page_id, None)
+            return None
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        data = super().stats()
+        data.update({
+            "max_size": self.maxsize,
+            "ttl": self.ttl,
+            "current_bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+        })
+        return data
+
+class SqliteJobStore(JobStore):
+    name = "sqlite"
+
+    PURGE_EVERY = 100
+    # Keep each json_set call well under SQLite's function argument limit
+    JSON_SET_PAIRS = 40
+
+    def __init__(
+        self,
+        path: str,
+        ttl: int = 3600,
+        busy_timeout: float = settings.CACHE_SQLITE_BUSY_TIMEOUT,
+        retries: int = settings.CACHE_SQLITE_RETRIES,
+    ):
+        """
+        Shared on-disk store in WAL mode, so every uvicorn worker on the host
+        sees the same state, and records outlive restarts (queued jobs do not:
+        they live in the in-process scheduler). Values must be JSON serializable.
+        Calls run on the caller's thread, usually the event loop, so waiting
+        for another worker's write lock is kept short: each attempt waits at
+        most busy_timeout and a locked database is retried a few times with a
+        short backoff before the call fails.
+        :param path: SQLite database file
+        :param ttl: Default time to live in seconds
+        :param busy_timeout: Seconds one attempt waits for a lock held by another connection
+        :param retries: Further attempts when the database stays locked
+        """
+        super().__init__()
+        self.path = path
+        self.ttl = ttl
+        self.retries = retries
+        self.busy_retries = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._run(self._init_schema)
+
+    @staticmethod
+    def _init_schema(conn: sqlite3.Connection) -> None:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                version INTEGER NOT NULL DEFAULT 1
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_expires ON entries (expires_at);
+            CREATE TABLE IF NOT EXISTS pages (
+                page_id TEXT PRIMARY KEY,
+                key TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_pages_key ON pages (key);
+            """
+        )
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(entries)")]
+        if "version" not in columns:
+            conn.execute("ALTER TABLE entries ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+    def _run(self, work: Callable[[sqlite3.Connection], Any]) -> Any:
+        # Run work under the connection lock, retrying while another worker holds the write lock
+        with self._lock:
+            for attempt in range(self.retries + 1):
+                try:
+                    return work(self._conn)
+                except sqlite3.OperationalError as e:
+                    message = str(e)
+                    if attempt == self.retries or ("locked" not in message and "busy" not in message):
+                        raise
+                    self.busy_retries += 1
+                    time.sleep(min(0.1, 0.01 * 2 ** attempt) * random.uniform(0.5, 1))
+
+    def _transaction(self, conn: sqlite3.Connection, work: Callable[[], Any]) -> Any:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._run(lambda conn: conn.execute(
+            "SELECT value FROM entries WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone())
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, expire: Optional[int] = None) -> None:
+        expires_at = time.time() + (expire or self.ttl)
+        payload = json.dumps(value)
+
+        def write(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "INSERT INTO entries (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, "
+                "expires_at = excluded.expires_at, version = entries.version + 1",
+                (key, payload, expires_at)
+            )
+            if isinstance(value, dict):
+                conn.executemany(
+                    "INSERT OR REPLACE INTO pages (page_id, key, expires_at) VALUES (?, ?, ?)",
+                    [(page_id, key, expires_at) for page_id in value]
+                )
+
+        self._run(lambda conn: self._transaction(conn, lambda: write(conn)))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._run(self._purge_expired)
+
+    def update_pages(self, key: str, pages: Dict[str, Dict[str, Any]]) -> int:
+        now = time.time()
+        # Ensure each page object exists, then set each field in place inside SQLite,
+        # so concurrent writers (in this or another worker) never overwrite each other.
+        # A json_set call cannot edit an object it created itself, so the pages are
+        # created in one pass and their fields set in the next.
+        ensure: List[Tuple[str, List[Any]]] = []
+        assign: List[Tuple[str, List[Any]]] = []
+        for page_id, fields in pages.items():
+            page_path = f'$."{page_id}"'
+            ensure.append(("?, json(COALESCE(json_extract(value, ?), '{}'))", [page_path, page_path]))
+            for field, field_value in fields.items():
+                assign.append(("?, json(?)", [f'{page_path}."{field}"', json.dumps(field_value)]))
+        expr = "value"
+        params: List[Any] = []
+        for pairs in (ensure, assign):
+            for start in range(0, len(pairs), self.JSON_SET_PAIRS):
+                chunk = pairs[start:start + self.JSON_SET_PAIRS]
+                expr = f"json_set({expr}, {', '.join(sql for sql, _ in chunk)})"
+                for _, chunk_params in chunk:
+                    params.extend(chunk_params)
+
+        def write(conn: sqlite3.Connection) -> int:
+            conn.execute(
+                "INSERT INTO entries (key, value, expires_at) VALUES (?, '{}', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = '{}', expires_at = excluded.expires_at, "
+                "version = entries.version + 1 WHERE entries.expires_at <= ?",
+                (key, now + self.ttl, now)
+            )
+            row = conn.execute(
+                f"UPDATE entries SET value = {expr}, version = version + 1 "
+                "WHERE key = ? RETURNING version, expires_at",
+                (*params, key)
+            ).fetchone()
+            conn.executemany(
+                "INSERT OR REPLACE INTO pages (page_id, key, expires_at) VALUES (?, ?, ?)",
+                [(page_id, key, row[1]) for page_id in pages]
+            )
+            return row[0]
+
+        return self._run(lambda conn: self._transaction(conn, lambda: write(conn)))
+
+    def get_record(self, key: str) -> Optional[Tuple[int, Any]]:
+        row = self._run(lambda conn: conn.execute(
+            "SELECT version, value FROM entries WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone())
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0], json.loads(row[1])
+
+    def get_version(self, key: str) -> Optional[int]:
+        row = self._run(lambda conn: conn.execute(
+            "SELECT version FROM entries WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone())
+        return row[0] if row else None
+
+    def _purge_expired(self, conn: sqlite3.Connection) -> None:
+        now = time.time()
+        self.expirations += conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,)).rowcount
+        conn.execute("DELETE FROM pages WHERE expires_at <= ?", (now,))
+
+    def delete(self, key: str) -> None:
+        def write(conn: sqlite3.Connection) -> None:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            conn.execute("DELETE FROM pages WHERE key = ?", (key,))
+        self._run(lambda conn: self._transaction(conn, lambda: write(conn)))
+
+    def clear(self) -> None:
+        def write(conn: sqlite3.Connection) -> None:
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM pages")
+        self._run(lambda conn: self._transaction(conn, lambda: write(conn)))
+
+    def items(self) -> Iterator[Tuple[str, Any, Optional[float]]]:
+        now = time.time()
+        rows = self._run(lambda conn: conn.execute(
+            "SELECT key, value, expires_at FROM entries WHERE expires_at > ?", (now,)
+        ).fetchall())
+        for key, value, expires_at in rows:
+            yield key, json.loads(value), round(expires_at - now, 3)
+
+    def find_by_page(self, page_id: str) -> Optional[str]:
+        row = self._run(lambda conn: conn.execute(
+            "SELECT key FROM pages WHERE page_id = ? AND expires_at > ?",
+            (page_id, time.time())
+        ).fetchone())
+        return row[0] if row else None
+
+    def __len__(self) -> int:
+        row = self._run(lambda conn: conn.execute(
+            "SELECT COUNT(*) FROM entries WHERE expires_at > ?", (time.time(),)
+        ).fetchone())
+        return row[0]
+
+    def stats(self) -> Dict[str, Any]:
+        data = super().stats()
+        data.update({"path": self.path, "ttl": self.ttl, "busy_retries": self.busy_retries})
+        return data
+
+def create_store(ttl: int = 3600, maxsize: int = 1000, max_bytes: int = settings.CACHE_MAX_BYTES) -> JobStore:
+    """
+    Build the job store selected by settings.CACHE_BACKEND
+    :param ttl: Default time to live in seconds
+    :param maxsize: Maximum entries for the memory backend
+    :param max_bytes: Byte budget for the memory backend
+    :return: JobStore instance
+    """
+    backend = settings.CACHE_BACKEND.lower()
+    if backend == "sqlite":
+        return SqliteJobStore(settings.CACHE_SQLITE_PATH, ttl=ttl)
+    if backend != "memory":
+        logger.warning(f"Unknown CACHE_BACKEND '{settings.CACHE_BACKEND}', falling back to memory")
+    return MemoryJobStore(ttl=ttl, maxsize=maxsize, max_bytes=max_bytes)
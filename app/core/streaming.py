@@ -0,0 +1,154 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+from collections import OrderedDict
+from pathlib import Path
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import threading
+import aiofiles
+from aiohttp.abc import AbstractStreamWriter
+from aiohttp.payload import Payload
+
+# Bytes read from an image per chunk; a multiple of 3 so every chunk
+# base64-encodes on its own without padding
+ENCODE_CHUNK_SIZE = 3 * 64 * 1024
+
+# Digests of image files reused across pages (a book's source photo), keyed by
+# path, mtime and size so a rewritten file is never matched
+_digests: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_digests_lock = threading.Lock()
+DIGEST_MEMO_SIZE = 1024
+
+def _file_digest(path: str, key: Tuple[str, int, int]) -> str:
+    with _digests_lock:
+        if key in _digests:
+            _digests.move_to_end(key)
+            return _digests[key]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(ENCODE_CHUNK_SIZE):
+            digest.update(chunk)
+    with _digests_lock:
+        _digests[key] = digest.hexdigest()
+        if len(_digests) > DIGEST_MEMO_SIZE:
+            _digests.popitem(last=False)
+    return digest.hexdigest()
+
+class ImageSource:
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        data: Optional[bytes] = None,
+        encoded: Optional[str] = None,
+    ):
+        """
+        An image sent to Segmind as a base64 JSON string, either a file read
+        chunk by chunk while the request is sent, or bytes already in memory
+        (masked or downloaded images)
+        :param path: Image file
+        :param data: Image bytes
+        :param encoded: Shared base64 string of the file at path, sent instead of reading it
+        """
+        if (path is None) == (data is None):
+            raise ValueError("Give either a path or data")
+        self.path = str(path) if path is not None else None
+        self.data = data
+        self.encoded: Optional[str] = None
+        if self.path is not None:
+            stat = os.stat(self.path)
+            self.size = stat.st_size
+            self._key = (self.path, stat.st_mtime_ns, stat.st_size)
+            if encoded is not None and len(encoded) == self.encoded_size:
+                # A length mismatch means the file was rewritten since; read it instead
+                self.encoded = encoded
+        else:
+            self.size = len(data)
+
+    @property
+    def encoded_size(self) -> int:
+        return 4 * ((self.size + 2) // 3)
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """
+        Yield the base64 encoding of the image, one chunk at a time
+        :raises RuntimeError: If the file changed size since this source was created
+        """
+        if self.encoded is not None:
+            step = ENCODE_CHUNK_SIZE // 3 * 4
+            for start in range(0, len(self.encoded), step):
+                yield self.encoded[start:start + step].encode("ascii")
+            return
+        if self.data is not None:
+            view = memoryview(self.data)
+            for start in range(0, self.size, ENCODE_CHUNK_SIZE):
+                yield base64.b64encode(view[start:start + ENCODE_CHUNK_SIZE])
+            return
+        sent = 0
+        async with aiofiles.open(self.path, "rb") as f:
+            while chunk := await f.read(ENCODE_CHUNK_SIZE):
+                sent += len(chunk)
+                yield base64.b64encode(chunk)
+        if sent != self.size:
+            # Content-Length was announced from the size; the body would not match it
+            raise RuntimeError(f"{self.path} changed while being sent")
+
+    async def base64(self) -> str:
+        """
+        Get the whole base64 string, for the buffered request path
+        """
+        if self.encoded is not None:
+            return self.encoded
+        if self.data is not None:
+            return base64.b64encode(self.data).decode("utf-8")
+        async with aiofiles.open(self.path, "rb") as f:
+            return base64.b64encode(await f.read()).decode("utf-8")
+
+    async def digest(self) -> str:
+        """
+        Get the SHA-256 of the image bytes; file digests are hashed off the
+        event loop and remembered
+        :return: Hex digest
+        """
+        if self.data is not None:
+            return hashlib.sha256(self.data).hexdigest()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, _file_digest, self.path, self._key)
+
+class JSONStreamPayload(Payload):
+    def __init__(self, fields: Dict[str, Any]):
+        """
+        JSON object body whose ImageSource values are encoded while the request
+        is written, so no base64 copy or serialized body of the images is ever
+        held in memory. The size is known up front and sent as Content-Length.
+        A new payload is needed for every attempt.
+        :param fields: Body fields; ImageSource values become base64 strings
+        """
+        super().__init__(fields, content_type="application/json")
+        self._parts: List[Union[bytes, ImageSource]] = []
+        buffer = b"{"
+        for index, (key, value) in enumerate(fields.items()):
+            buffer += (b"," if index else b"") + json.dumps(key).encode("utf-8") + b":"
+            if isinstance(value, ImageSource):
+                self._parts += [buffer + b'"', value]
+                buffer = b'"'
+            else:
+                buffer += json.dumps(value).encode("utf-8")
+        self._parts.append(buffer + b"}")
+        self._size = sum(part.encoded_size if isinstance(part, ImageSource) else len(part) for part in self._parts)
+
+    def decode(self, encoding: str = "utf-8", errors: str = "strict") -> str:
+        raise TypeError("A streamed JSON body is never held in memory")
+
+    async def write(self, writer: AbstractStreamWriter) -> None:
+        for part in self._parts:
+            if isinstance(part, ImageSource):
+                async for chunk in part.chunks():
+                    await writer.write(chunk)
+            else:
+                await writer.write(part)
+
+    async def write_with_length(self, writer: AbstractStreamWriter, content_length: Optional[int]) -> None:
+        # The announced length is always the full body
+        await self.write(writer)
@@ -0,0 +1,172 @@
+from typing import Any, Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import re
+import uuid
+from PIL import Image, ImageOps, UnidentifiedImageError
+from .config import settings
+from .logger import get_logger
+from .memo import SingleFlight
+from .lifecycle import lifecycle
+from .storage import find_stored, storage_path
+
+logger = get_logger()
+
+# Output format -> (Pillow format, extension)
+FORMATS = {
+    "webp": ("WEBP", "webp"),
+    "jpeg": ("JPEG", "jpg"),
+    "jpg": ("JPEG", "jpg"),
+}
+SOURCE_EXTENSIONS = ("png", "jpg", "jpeg", "webp")
+# Normalized copies and variants; never used as sources, so variants of variants cannot pile up
+DERIVED_NAME = re.compile(r"\.(?:n\d+q\d+u?|w\d+q\d+)\.[a-z]+$")
+
+class VariantRenderer:
+    def __init__(
+        self,
+        widths: str = settings.VARIANT_WIDTHS,
+        quality: int = settings.VARIANT_QUALITY,
+        workers: int = settings.VARIANT_WORKERS,
+    ):
+        """
+        Resized WebP/JPEG copies of stored images for previews. Each variant
+        is rendered once with Pillow in a thread pool and kept on disk under
+        a name derived from its source, width and quality, so later requests
+        are plain file reads. Concurrent requests for a variant being rendered
+        wait for that render. Only the configured widths are accepted, which
+        bounds the variants per source.
+        :param widths: Comma-separated allowed widths in pixels
+        :param quality: Encoder quality 1-100
+        :param workers: Threads in the render pool
+        """
+        self.widths: Tuple[int, ...] = tuple(sorted({int(w) for w in widths.split(",") if w.strip()}))
+        self.quality = quality
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.rendered = 0
+        self.failed = 0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="variant")
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def variant_name(self, name: str, width: int, fmt: str) -> str:
+        """
+        Deterministic on-disk name of a variant
+        :param name: Source filename
+        :param width: Variant width
+        :param fmt: Output format
+        :return: Variant filename
+        """
+        stem = name.rsplit(".", 1)[0]
+        return f"{stem}.w{width}q{self.quality}.{FORMATS[fmt][1]}"
+
+    async def get(self, name: str, width: int, fmt: str = "webp") -> str:
+        """
+        Get the variant of a stored image, rendering it on first use
+        :param name: Source filename
+        :param width: One of the allowed widths; narrower images are not upscaled
+        :param fmt: "webp" or "jpeg"
+        :return: Variant filename
+        :raises ValueError: If the width or format is not allowed
+        :raises FileNotFoundError: If the source does not exist
+        """
+        if width not in self.widths:
+            raise ValueError(f"Width must be one of {', '.join(map(str, self.widths))}")
+        if fmt not in FORMATS:
+            raise ValueError("Format must be webp or jpeg")
+        if "." not in name or name.rsplit(".", 1)[1].lower() not in SOURCE_EXTENSIONS or DERIVED_NAME.search(name):
+            raise FileNotFoundError(name)
+        source = find_stored(name)
+        if not source.exists():
+            raise FileNotFoundError(name)
+
+        variant_ref = self.variant_name(name, width, fmt)
+        variant = find_stored(variant_ref)
+        if variant.exists() and variant.stat().st_mtime_ns >= source.stat().st_mtime_ns:
+            self.hits += 1
+            return variant_ref
+
+        loop = asyncio.get_running_loop()
+        try:
+            await self._flight.do(
+                variant_ref,
+                lambda: loop.run_in_executor(self._pool(), self._render, name, variant_ref, width, fmt)
+            )
+        except FileNotFoundError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Rendering {variant_ref} failed: {str(e)}")
+            raise
+        return variant_ref
+
+    def _render(self, name: str, variant_ref: str, width: int, fmt: str) -> None:
+        source = find_stored(name)
+        pil_format = FORMATS[fmt][0]
+        try:
+            opened = Image.open(source)
+        except UnidentifiedImageError:
+            raise ValueError(f"Cannot decode image: {name}")
+        with opened:
+            # JPEG sources are decoded at a reduced scale when much larger than needed
+            opened.draft("RGB", (width, width))
+            image = ImageOps.exif_transpose(opened)
+            if image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                # reducing_gap shrinks by whole factors first, then filters the rest with Lanczos
+                image = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+            has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+            if pil_format == "JPEG" and has_alpha:
+                # JPEG has no alpha: flatten on white, as the pages are shown
+                rgba = image.convert("RGBA")
+                image = Image.new("RGB", rgba.size, (255, 255, 255))
+                image.paste(rgba, mask=rgba.getchannel("A"))
+            elif image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if has_alpha else "RGB")
+
+            options: Dict[str, Any] = {"quality": self.quality}
+            if pil_format == "JPEG":
+                options.update(optimize=True, progressive=True)
+            else:
+                options.update(method=4)
+
+            variant = storage_path(variant_ref)
+            tmp = variant.with_name(f".{uuid.uuid4()}.part")
+            try:
+                image.save(tmp, format=pil_format, **options)
+                os.replace(tmp, variant)
+            except BaseException:
+                if tmp.exists():
+                    os.unlink(tmp)
+                raise
+
+        if settings.STORAGE_LIFECYCLE:
+            # Deleted together with the source
+            lifecycle.track(variant_ref, "thumbnail", parent=name)
+        self.rendered += 1
+        logger.debug(f"Rendered {variant_ref}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "widths": list(self.widths),
+            "quality": self.quality,
+            "hits": self.hits,
+            "rendered": self.rendered,
+            "joined": self._flight.joined,
+            "failed": self.failed,
+        }
+
+# Create a global renderer for preview variants of stored images
+variants = VariantRenderer()
@@ -1,10 +1,18 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from .core.config import settings
 from .core.logger import get_logger
-from .middleware.api_key import verify_api_key
-from .api.endpoints import health, upload, process, cache, seo
+from .core.http_client import http_client
+from .core.scheduler import scheduler
+from .core.imaging import normalizer
+from .core.face_detector import face_detector
+from .core.masking import shutdown_executor as shutdown_masking
+from .core.lifecycle import lifecycle
+from .core.static import StorageFiles, VariantFiles
+from .core.variants import variants
+from .middleware.api_key import APIKeyMiddleware
+from .middleware.metrics import MetricsMiddleware
+from .api.endpoints import health, upload, process, cache, seo, metrics
 import os
 from pathlib import Path
 
@@ -18,6 +26,10 @@ app = FastAPI(
     ]
 )
 
+# Add API key middleware; added before CORS so CORS wraps it and preflights and
+# auth errors still get CORS headers
+app.add_middleware(APIKeyMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -27,22 +39,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Add metrics middleware last so it is outermost and also times rejected requests
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Ensure upload directory exists
 upload_path = Path("storage/uploads")
 upload_path.mkdir(parents=True, exist_ok=True)
 
-# Mount static files directory for uploads
-app.mount("/storage/uploads", StaticFiles(directory=str(upload_path.absolute())), name="uploads")
+# Mount stored files; flat names resolve to their shard, so every file_url keeps working
+app.mount("/storage/uploads", StorageFiles(directory=str(upload_path.absolute())), name="uploads")
 
-# Add API key middleware
-@app.middleware("http")
-async def api_key_middleware(request: Request, call_next):
-    # Skip API key check for static files
-    if request.url.path.startswith(f"storage/uploads"):
-        return await call_next(request)
-    await verify_api_key(request)
-    response = await call_next(request)
-    return response
+# Resized previews of stored images, rendered on first request and cached alongside them
+app.mount("/storage/variants", VariantFiles(directory=str(upload_path.absolute())), name="variants")
 
 # Include routers
 app.include_router(health.router, prefix=settings.API_V1_STR)
@@ -50,11 +59,31 @@ app.include_router(upload.router, prefix=settings.API_V1_STR)
 app.include_router(process.router, prefix=settings.API_V1_STR)
 app.include_router(cache.router, prefix=settings.API_V1_STR)
 app.include_router(seo.router, prefix=settings.API_V1_STR)
+if settings.METRICS_ENABLED:
+    # Served at the root, where Prometheus looks by default
+    app.include_router(metrics.router)
  
 @app.on_event("startup")
 async def startup_event():
     logger.info("Application starting up...")
+    await http_client.start()
+    await scheduler.start()
+    if settings.STORAGE_LIFECYCLE:
+        await lifecycle.start()
+    try:
+        face_detector.load()
+    except RuntimeError:
+        logger.warning("Face detection model unavailable; masking will fail until it is installed")
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    logger.info("Application shutting down...") 
\ No newline at end of file
+    logger.info("Application shutting down...")
+    await scheduler.stop()
+    if settings.STORAGE_LIFECYCLE:
+        await lifecycle.stop()
+    normalizer.shutdown()
+    variants.shutdown()
+    shutdown_masking()
+    await http_client.close()
+    # Flush lines still queued for the enqueued log sinks
+    await logger.complete() 
\ No newline at end of file
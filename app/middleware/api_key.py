@@ -1,32 +1,175 @@
-from fastapi import Request, HTTPException
-from fastapi.security import APIKeyHeader
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Pattern
+from collections import OrderedDict
+import hmac
+import math
+import re
+import time
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
 from ..core.config import settings
-from ..core.logger import get_logger
+from ..core.logger import get_logger, log_sampled
 
 logger = get_logger()
-api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
-async def verify_api_key(request: Request) -> Optional[str]:
-    if request.url.path == "/api/v1/health":
+def compile_allowlist(paths: Iterable[str]) -> Optional[Pattern[str]]:
+    """
+    Compile public paths into one regex. An entry ending in "*" matches as a prefix.
+    :param paths: Exact paths or prefixes such as "/storage/uploads/*"
+    :return: Compiled pattern, or None if the list is empty
+    """
+    alternatives = []
+    for path in paths:
+        path = path.strip()
+        if not path:
+            continue
+        if path.endswith("*"):
+            alternatives.append(re.escape(path[:-1]) + ".*")
+        else:
+            alternatives.append(re.escape(path))
+    if not alternatives:
         return None
-        
-    api_key = await api_key_header(request)
-    
-    if not settings.API_KEY:
-        logger.warning("No API key set in environment, skipping API key check")
-        return None
-        
-    if not api_key:
-        raise HTTPException(
-            status_code=401,
-            detail="API Key header missing"
-        )
-        
-    if api_key != settings.API_KEY:
-        raise HTTPException(
-            status_code=403,
-            detail="Invalid API Key"
-        )
-        
-    return api_key 
\ No newline at end of file
+    return re.compile("(?:" + "|".join(alternatives) + ")")
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: int, max_keys: int = 10000):
+        """
+        Token-bucket rate limiter keyed by client identity
+        :param rate: Tokens added per second; 0 disables limiting
+        :param burst: Bucket capacity
+        :param max_keys: Buckets kept; the least recently used is dropped beyond this
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.limited = 0
+
+    def acquire(self, key: str) -> float:
+        """
+        Take one token for a key
+        :param key: Client identity
+        :return: 0 if allowed, otherwise seconds until a token is available
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.burst, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0.0
+        self.limited += 1
+        return (1 - bucket.tokens) / self.rate
+
+class APIKeyMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        api_keys: Optional[str] = settings.API_KEY,
+        public_paths: str = settings.AUTH_PUBLIC_PATHS,
+        rate: float = settings.RATE_LIMIT_PER_SECOND,
+        burst: int = settings.RATE_LIMIT_BURST,
+        metrics_path: str = "/metrics",
+        metrics_token: Optional[str] = settings.METRICS_TOKEN,
+        metrics_public: bool = settings.METRICS_PUBLIC,
+    ):
+        """
+        Pure ASGI authentication: checks the X-API-Key header in constant time
+        and rate limits each key with a token bucket. Public paths (health,
+        static uploads) and CORS preflights skip both checks. Scrapers, which
+        send bearer tokens rather than custom headers, may read the metrics
+        path with the metrics token instead, without rate limiting.
+        :param app: Wrapped ASGI application
+        :param api_keys: Accepted key, or a comma-separated list of keys; empty disables the check
+        :param public_paths: Comma-separated allowlist; entries ending in "*" are prefixes
+        :param rate: Requests per second allowed per key; 0 disables rate limiting
+        :param burst: Requests a key may make at once before being limited
+        :param metrics_path: Path of the Prometheus endpoint
+        :param metrics_token: Bearer token accepted on metrics_path; empty accepts API keys only
+        :param metrics_public: Serve metrics_path without any credentials
+        """
+        self.app = app
+        self._keys: List[bytes] = [key.strip().encode() for key in (api_keys or "").split(",") if key.strip()]
+        self._public = compile_allowlist(public_paths.split(","))
+        self.limiter = RateLimiter(rate, burst)
+        self.metrics_path = metrics_path
+        self._metrics_token = metrics_token.encode() if metrics_token else None
+        self._metrics_public = metrics_public
+        self._warned = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        if self._public is not None and self._public.fullmatch(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        if scope["path"] == self.metrics_path and (self._metrics_public or self._bearer_matches(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        if self._keys:
+            presented = Headers(scope=scope).get("x-api-key")
+            if not presented:
+                await self._reject(scope, receive, send, 401, "API Key header missing")
+                return
+            if not self._matches(presented.encode()):
+                await self._reject(scope, receive, send, 403, "Invalid API Key")
+                return
+            retry_after = self.limiter.acquire(presented)
+            if retry_after:
+                await self._reject(
+                    scope, receive, send, 429, "Rate limit exceeded",
+                    headers={"Retry-After": str(math.ceil(retry_after))}
+                )
+                return
+        elif not self._warned:
+            # Without keys there is no client identity to limit: behind a proxy
+            # every request shares its address, so a per-IP bucket would cap the service
+            logger.warning("No API key set in environment, skipping API key check and rate limiting")
+            self._warned = True
+        await self.app(scope, receive, send)
+
+    def _bearer_matches(self, scope: Scope) -> bool:
+        if self._metrics_token is None:
+            return False
+        scheme, _, token = (Headers(scope=scope).get("authorization") or "").partition(" ")
+        if scheme.lower() != "bearer":
+            return False
+        return hmac.compare_digest(token.strip().encode(), self._metrics_token)
+
+    def _matches(self, presented: bytes) -> bool:
+        # Compare against every key so timing does not reveal which one (if any) matched
+        matched = False
+        for key in self._keys:
+            matched |= hmac.compare_digest(presented, key)
+        return matched
+
+    async def _reject(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+        status_code: int,
+        detail: str,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        # Runaway clients can hit this on every request; keep one line per reason per interval
+        log_sampled("WARNING", f"auth.{status_code}", f"Rejected {scope['method']} {scope['path']}: {detail}")
+        response = JSONResponse({"detail": detail}, status_code=status_code, headers=headers)
+        await response(scope, receive, send)
@@ -0,0 +1,56 @@
+import time
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from ..core.metrics import http_requests, http_request_seconds
+
+def route_template(scope: Scope) -> str:
+    """
+    Get the template of the route that handled a request, with router prefixes
+    :param scope: ASGI scope after the application ran
+    :return: e.g. "/api/v1/process/{process_id}/events", or "unmatched"
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template:
+        # Routes of included routers carry their path without the prefix; take the
+        # prefix from the request path, as many segments as the template lacks
+        depth = template.count("/")
+        segments = scope["path"].split("/")
+        return "/".join(segments[:len(segments) - depth]) + template
+    mounted = scope.get("root_path", "")[len(scope.get("app_root_path", "")):]
+    if mounted:
+        # Mounted apps (static uploads) have no routes of their own
+        return f"{mounted}/{{path}}"
+    return "unmatched"
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        """
+        Pure ASGI middleware counting requests and timing them per route.
+        Routes are labelled by their template ("/api/v1/process/{process_id}/events"),
+        not the raw path, so the number of series stays bounded; requests that
+        never reached a route (unknown paths, rejected API keys) share "unmatched".
+        :param app: Wrapped ASGI application
+        """
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            template = route_template(scope)
+            method = scope["method"]
+            http_requests.labels(method, template, status).inc()
+            http_request_seconds.labels(method, template).observe(time.perf_counter() - started)
@@ -45,5 +45,16 @@ class InitiateProcessResponse(BaseResponse[InitProcessData]):
 class ProcessBookResponse(BaseResponse[ProcessStatus]):
     pass
 
+class BatchPageStatus(ProcessStatus):
+    index: int  # Position of the page in the batch request
+    error: Optional[str] = None  # Why the page could not be queued
+
+class ProcessBookBatchResponse(BaseResponse[list[BatchPageStatus]]):
+    pass
+
 class ProcessStatusResponse(BaseResponse[list[ProcessStatus]]):
-    pass 
\ No newline at end of file
+    version: Optional[int] = None  # Bumped on every page state change
+    queue: Optional[Dict[str, Any]] = None  # Scheduler depth and wait times
+    eta_seconds: Optional[float] = None  # Estimated time until every page is done
+    estimated_completion_at: Optional[float] = None  # Unix time of eta_seconds
+    next_poll_seconds: Optional[float] = None  # Suggested delay before polling again 
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""
+Measure face detection throughput on CPU: the previous reload-per-call
+approach, the resident FaceDetector one image at a time, and batched calls.
+
+Needs the res10 weights at FACE_CAFFEMODEL. Usage (from the repository root):
+
+    python benchmarks/face_detector_benchmark.py --images 64 --batch-sizes 4 8 16
+    python benchmarks/face_detector_benchmark.py --image-dir storage/uploads
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.core.face_detector import FaceDetector  # noqa: E402
+
+def load_images(image_dir: str, count: int, width: int, height: int) -> list:
+    if image_dir:
+        paths = sorted(p for p in Path(image_dir).iterdir() if p.suffix.lower() in (".png", ".jpg", ".jpeg"))
+        images = [img for img in (cv2.imread(str(p)) for p in paths) if img is not None]
+        if not images:
+            raise SystemExit(f"No readable images in {image_dir}")
+        return (images * (count // len(images) + 1))[:count]
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+def legacy_detect(detector: FaceDetector, image: np.ndarray) -> None:
+    # What mask_child_face did before: load the network on every call
+    net = cv2.dnn.readNetFromCaffe(detector.prototxt, detector.caffemodel)
+    blob = cv2.dnn.blobFromImage(cv2.resize(image, (300, 300)), 1.0, (300, 300), FaceDetector.MEAN)
+    net.setInput(blob)
+    net.forward()
+
+def timed(label: str, count: int, fn) -> None:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {count / elapsed:>10.1f} img/s {elapsed * 1000 / count:>10.2f} ms/img")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--image-dir", default=None)
+    parser.add_argument("--width", type=int, default=1024)
+    parser.add_argument("--height", type=int, default=1024)
+    parser.add_argument("--threads", type=int, default=0, help="cv2.setNumThreads value (0 keeps the default)")
+    args = parser.parse_args()
+
+    if args.threads:
+        cv2.setNumThreads(args.threads)
+    images = load_images(args.image_dir, args.images, args.width, args.height)
+    detector = FaceDetector()
+    detector.load()
+    detector.detect_batch(images[:2])  # warm up
+
+    print(f"{len(images)} images, OpenCV {cv2.__version__}, {cv2.getNumThreads()} threads")
+    legacy_count = min(len(images), 16)
+    timed("reload per call", legacy_count, lambda: [legacy_detect(detector, img) for img in images[:legacy_count]])
+    timed("resident, single", len(images), lambda: [detector.detect(img) for img in images])
+    for size in args.batch_sizes:
+        timed(
+            f"resident, batch {size}",
+            len(images),
+            lambda: [detector.detect_batch(images[i:i + size]) for i in range(0, len(images), size)],
+        )
+
+if __name__ == "__main__":
+    main()
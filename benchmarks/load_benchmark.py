@@ -0,0 +1,355 @@
+"""
+End-to-end load test of the real app against local Segmind and OpenAI
+stand-ins (benchmarks/segmind_stub.py), so no credits are spent.
+
+Scenarios are read from a JSONL file, one JSON object per line (see
+benchmarks/scenarios.jsonl). Each scenario starts a fresh uvicorn subprocess
+in a scratch directory, reconfigures the stand-in, and runs virtual users
+through the client workflow: upload a source photo, POST /initiate-process,
+POST /process/book for every page, then poll /process/status until every
+page is COMPLETED or FAILED (optionally also POST /generate-keywords). It
+reports throughput, per-step latency percentiles, book completion time,
+failures and the server's peak RSS. Usage (from the repository root):
+
+    python benchmarks/load_benchmark.py
+    python benchmarks/load_benchmark.py --only baseline slow-segmind --output load.json
+    python benchmarks/load_benchmark.py --scenarios my_scenarios.jsonl
+
+Scenario keys (all optional except name):
+
+    name            Label in the report
+    books           Books to run in total (default 20)
+    users           Concurrent virtual users, one book at a time each (default 4)
+    pages           Pages per book (default 8)
+    image_px        Side of the uploaded JPEG photos in pixels (default 768)
+    poll            "interval" (every poll_interval seconds) or "long" (if_version + wait_seconds)
+    poll_interval   Seconds between status polls (default 0.5)
+    seo_rate        Share of books that also call /generate-keywords (default 0)
+    priority        Send pages in the priority lane (default false)
+    segmind         Stand-in settings, e.g. {"latency": 2, "distribution": "lognormal", "error_rate": 0.05}
+    env             Extra environment for the app, e.g. {"SCHEDULER_WORKERS": "8"}
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+STUB = Path(__file__).resolve().parent / "segmind_stub.py"
+DEFAULT_SCENARIOS = Path(__file__).resolve().parent / "scenarios.jsonl"
+
+SCENARIO_DEFAULTS = {
+    "books": 20,
+    "users": 4,
+    "pages": 8,
+    "image_px": 768,
+    "poll": "interval",
+    "poll_interval": 0.5,
+    "seo_rate": 0.0,
+    "priority": False,
+    "segmind": {},
+    "env": {},
+}
+
+# Stand-in settings restored before every scenario
+STUB_DEFAULTS = {
+    "latency": 1.0, "jitter": 0.2, "distribution": "uniform", "sigma": 0.5, "payload_bytes": 200 * 1024,
+    "error_rate": 0.0, "throttle_rate": 0.0, "hang_rate": 0.0, "retry_after": 1, "max_concurrency": 0,
+    "openai_latency": 0.5, "openai_error_rate": 0.0,
+}
+
+STEPS = ("upload", "initiate", "book", "status", "seo")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def peak_rss_bytes(pid: int) -> Optional[int]:
+    # VmHWM: high-water mark of the server's resident set (Linux only)
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def load_scenarios(path: Path, only: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    scenarios = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                scenario = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise SystemExit(f"{path}:{number}: invalid JSON: {e}")
+            unknown = set(scenario) - set(SCENARIO_DEFAULTS) - {"name"}
+            if "name" not in scenario or unknown:
+                raise SystemExit(f"{path}:{number}: needs a name; unknown keys: {sorted(unknown)}")
+            scenarios.append({**SCENARIO_DEFAULTS, **scenario})
+    if only:
+        scenarios = [s for s in scenarios if s["name"] in only]
+    return scenarios
+
+def make_photo(size: int, seed: int) -> bytes:
+    from PIL import Image
+
+    # Smooth gradients plus noise compress like a photo, not like a flat fill
+    rng = random.Random(seed)
+    image = Image.radial_gradient("L").resize((size, size)).convert("RGB")
+    noise = Image.frombytes("RGB", (size, size), rng.randbytes(size * size * 3))
+    image = Image.blend(image, noise, 0.3)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {step: [] for step in STEPS}
+        self.errors: Dict[str, int] = {step: 0 for step in STEPS}
+        self.book_seconds: List[float] = []
+        self.pages = {"COMPLETED": 0, "FAILED": 0}
+        self.throttled = 0
+        self.failed_books = 0
+
+    async def call(self, step: str, request) -> Any:
+        started = time.perf_counter()
+        try:
+            response = await request
+        except Exception:
+            self.errors[step] += 1
+            raise
+        self.latencies[step].append(time.perf_counter() - started)
+        if response.status_code >= 500:
+            self.errors[step] += 1
+        return response
+
+async def post_page(client, recorder: Recorder, body: Dict[str, Any]) -> None:
+    # A real client backs off on 429 (queue full) and tries again
+    for _ in range(30):
+        response = await recorder.call("book", client.post("/api/v1/process/book", json=body))
+        if response.status_code != 429:
+            if response.json().get("status_code") != 4000:
+                recorder.errors["book"] += 1
+            return
+        recorder.throttled += 1
+        await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+    recorder.errors["book"] += 1
+
+async def wait_for_book(client, recorder: Recorder, scenario: Dict[str, Any], init_id: str) -> None:
+    version = None
+    while True:
+        body: Dict[str, Any] = {"process_id": init_id}
+        if scenario["poll"] == "long" and version is not None:
+            body.update(if_version=version, wait_seconds=10)
+        response = await recorder.call("status", client.post("/api/v1/process/status", json=body))
+        data = response.json()
+        version = data.get("version", version)
+        pages = data.get("data")
+        if pages and all(page["status"] in ("COMPLETED", "FAILED") for page in pages):
+            for page in pages:
+                recorder.pages[page["status"]] += 1
+            return
+        if scenario["poll"] != "long":
+            await asyncio.sleep(scenario["poll_interval"])
+
+async def run_book(client, recorder: Recorder, scenario: Dict[str, Any], photo: bytes, targets: List[str], index: int) -> None:
+    response = await recorder.call(
+        "upload", client.post("/api/v1/upload", files={"file": (f"child{index}.jpg", photo, "image/jpeg")})
+    )
+    source = response.json()["data"]["file_path"].rsplit("/", 1)[-1]
+    response = await recorder.call("initiate", client.post("/api/v1/initiate-process"))
+    init_id = response.json()["data"]["init_id"]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        post_page(client, recorder, {
+            "init_id": init_id,
+            "source_url": source,
+            "target_url": target,
+            "prompt": {"prompt": f"page {page}"},
+            "priority": scenario["priority"],
+        })
+        for page, target in enumerate(targets)
+    ))
+    if random.random() < scenario["seo_rate"]:
+        await recorder.call(
+            "seo", client.post("/api/v1/generate-keywords", json={"description": f"A storybook about child {index}"})
+        )
+    await wait_for_book(client, recorder, scenario, init_id)
+    recorder.book_seconds.append(time.perf_counter() - started)
+
+async def drive(port: int, scenario: Dict[str, Any]) -> Dict[str, Any]:
+    import httpx
+
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=scenario["users"] * 4, max_keepalive_connections=scenario["users"] * 4)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+        for _ in range(300):
+            try:
+                (await client.get("/api/v1/health")).raise_for_status()
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        else:
+            raise RuntimeError("Benchmark server did not start")
+
+        # Book page templates are uploaded once, like a shop's catalogue
+        targets = []
+        for page in range(scenario["pages"]):
+            photo = make_photo(scenario["image_px"], seed=10_000 + page)
+            response = await client.post("/api/v1/upload", files={"file": (f"page{page}.jpg", photo, "image/jpeg")})
+            targets.append(response.json()["data"]["file_path"].rsplit("/", 1)[-1])
+        photos = [make_photo(scenario["image_px"], seed=user) for user in range(scenario["users"])]
+
+        remaining = list(range(scenario["books"]))
+
+        async def user(number: int) -> None:
+            while remaining:
+                index = remaining.pop()
+                try:
+                    await run_book(client, recorder, scenario, photos[number], targets, index)
+                except Exception as e:
+                    # An unexpected answer ends this book, not the run
+                    recorder.failed_books += 1
+                    print(f"  book {index} aborted: {type(e).__name__} {e}", file=sys.stderr)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(number) for number in range(scenario["users"])))
+        elapsed = time.perf_counter() - started
+
+    pages = sum(recorder.pages.values())
+    return {
+        "elapsed_seconds": elapsed,
+        "books_per_second": scenario["books"] / elapsed,
+        "pages_per_second": pages / elapsed,
+        "pages_completed": recorder.pages["COMPLETED"],
+        "pages_failed": recorder.pages["FAILED"],
+        "throttled": recorder.throttled,
+        "books_aborted": recorder.failed_books,
+        "book_seconds": {
+            "p50": percentile(recorder.book_seconds, 50),
+            "p95": percentile(recorder.book_seconds, 95),
+            "p99": percentile(recorder.book_seconds, 99),
+        },
+        "steps": {
+            step: {
+                "requests": len(values),
+                "errors": recorder.errors[step],
+                "p50_ms": percentile(values, 50) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+            }
+            for step, values in recorder.latencies.items() if values or recorder.errors[step]
+        },
+    }
+
+def stub_request(port: int, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    import httpx
+
+    response = httpx.request(method, f"http://127.0.0.1:{port}{path}", json=body, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+def run_scenario(scenario: Dict[str, Any], stub_port: int, quiet_logs: bool = True) -> Dict[str, Any]:
+    stub_request(stub_port, "POST", "/_control", {**STUB_DEFAULTS, **scenario["segmind"]})
+    before = stub_request(stub_port, "GET", "/_stats")
+    port = free_port()
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {
+            **os.environ,
+            "PYTHONPATH": str(ROOT),
+            "APP_URL": f"http://127.0.0.1:{port}",
+            "API_KEY": "",
+            "RATE_LIMIT_PER_SECOND": "0",
+            "CACHE_BACKEND": "memory",
+            "SEGMIND_API_URL": f"http://127.0.0.1:{stub_port}/v1/faceswap-comic",
+            "SEGMIND_API_KEY": "stub",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{stub_port}/v1",
+            "OPENAI_API_KEY": "stub",
+            "LOG_LEVEL": "WARNING" if quiet_logs else "INFO",
+            **{key: str(value) for key, value in scenario["env"].items()},
+        }
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log"],
+            cwd=workdir,
+            env=env,
+            stderr=subprocess.DEVNULL if quiet_logs else None,
+        )
+        try:
+            result = asyncio.run(drive(port, scenario))
+            result["peak_rss_mb"] = (peak_rss_bytes(server.pid) or 0) / 1024 / 1024
+        finally:
+            server.terminate()
+            server.wait()
+    after = stub_request(stub_port, "GET", "/_stats")
+    result["stub"] = {
+        key: after[key] - before[key]
+        for key in ("requests", "ok", "errors", "throttled", "openai_requests", "bytes_received")
+    }
+    result["stub"]["peak_in_flight"] = after["peak_in_flight"]
+    return result
+
+def print_result(name: str, r: Dict[str, Any]) -> None:
+    book = r["book_seconds"]
+    print(
+        f"{name:<18} {r['books_per_second']:>7.2f} {r['pages_per_second']:>8.2f} {book['p50']:>8.2f} {book['p99']:>8.2f} "
+        f"{r['pages_failed']:>6} {r['throttled']:>6} {r['peak_rss_mb']:>8.1f}"
+    )
+    for step, s in r["steps"].items():
+        print(f"  {step:<10} {s['requests']:>6} req {s['errors']:>4} err  p50 {s['p50_ms']:>8.1f} ms  p99 {s['p99_ms']:>8.1f} ms")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=Path, default=DEFAULT_SCENARIOS, help="JSONL file of scenarios")
+    parser.add_argument("--only", nargs="+", help="Run only these scenario names")
+    parser.add_argument("--stub-port", type=int, default=0, help="Port of the stand-in (default: any free port)")
+    parser.add_argument("--output", type=Path, help="Also write the results as JSON")
+    parser.add_argument("--server-logs", action="store_true", help="Show the app's log output")
+    args = parser.parse_args()
+
+    scenarios = load_scenarios(args.scenarios, args.only)
+    if not scenarios:
+        raise SystemExit("No scenarios to run")
+    stub_port = args.stub_port or free_port()
+    stub = subprocess.Popen([sys.executable, str(STUB), "--port", str(stub_port)], stdout=subprocess.DEVNULL)
+    results = {}
+    try:
+        for _ in range(100):
+            try:
+                stub_request(stub_port, "GET", "/_stats")
+                break
+            except Exception:
+                time.sleep(0.1)
+        print(f"{'scenario':<18} {'books/s':>7} {'pages/s':>8} {'book p50':>8} {'book p99':>8} {'failed':>6} {'429s':>6} {'RSS MB':>8}")
+        for scenario in scenarios:
+            results[scenario["name"]] = run_scenario(scenario, stub_port, quiet_logs=not args.server_logs)
+            print_result(scenario["name"], results[scenario["name"]])
+    finally:
+        stub.terminate()
+        stub.wait()
+    if args.output:
+        args.output.write_text(json.dumps({"scenarios": scenarios, "results": results}, indent=2))
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
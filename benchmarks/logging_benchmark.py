@@ -0,0 +1,155 @@
+"""
+Compare request throughput of the real app with logging off, with the
+blocking (synchronous) sinks, and with loguru's enqueued sinks in text
+and JSON format.
+
+Each mode runs the app in its own uvicorn subprocess, in a scratch working
+directory so logs/app.log and storage/ stay out of the repository. The target
+endpoint, POST /api/v1/initiate-process, logs one INFO line per request.
+--slow-sink-kbps replaces the log file with a FIFO drained at that rate, to
+show what a stalled disk or log shipper does to each mode. Usage (from the
+repository root):
+
+    python benchmarks/logging_benchmark.py --requests 5000 --concurrency 32
+    python benchmarks/logging_benchmark.py --slow-sink-kbps 16
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MODES = {
+    "off": {"LOG_LEVEL": "CRITICAL", "LOG_ENQUEUE": "false"},
+    "sync": {"LOG_LEVEL": "INFO", "LOG_ENQUEUE": "false", "LOG_FORMAT": "text"},
+    "enqueue": {"LOG_LEVEL": "INFO", "LOG_ENQUEUE": "true", "LOG_FORMAT": "text"},
+    "json": {"LOG_LEVEL": "INFO", "LOG_ENQUEUE": "true", "LOG_FORMAT": "json"},
+}
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def run_load(port: int, path: str, requests: int, concurrency: int) -> dict:
+    import httpx
+
+    base = f"http://127.0.0.1:{port}"
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        for _ in range(200):
+            try:
+                (await client.get(f"{base}/api/v1/health")).raise_for_status()
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        else:
+            raise RuntimeError("Benchmark server did not start")
+
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(f"{base}{path}")
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        # Warm up connections and code paths before timing
+        await asyncio.gather(*[one() for _ in range(concurrency * 2)])
+        latencies.clear()
+
+        started = time.perf_counter()
+        await asyncio.gather(*[one() for _ in range(requests)])
+        elapsed = time.perf_counter() - started
+
+    return {
+        "throughput_rps": requests / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+DRAIN = """
+import sys, time
+rate = float(sys.argv[2]) * 1024
+total = 0
+with open(sys.argv[1], "rb", buffering=0) as fifo:
+    while True:
+        chunk = fifo.read(4096)
+        if not chunk:
+            break
+        total += len(chunk)
+        time.sleep(len(chunk) / rate)
+with open(sys.argv[1] + ".size", "w") as out:
+    out.write(str(total))
+"""
+
+def bench(mode: str, path: str, requests: int, concurrency: int, slow_sink_kbps: float = 0) -> dict:
+    port = free_port()
+    with tempfile.TemporaryDirectory() as workdir:
+        log_path = os.path.join(workdir, "logs", "app.log")
+        drain = None
+        if slow_sink_kbps:
+            os.makedirs(os.path.dirname(log_path))
+            os.mkfifo(log_path)
+            drain = subprocess.Popen([sys.executable, "-c", DRAIN, log_path, str(slow_sink_kbps)])
+        env = {
+            **os.environ,
+            **MODES[mode],
+            "PYTHONPATH": str(ROOT),
+            "LOG_FILE": log_path,
+            "LOG_ROTATE_BYTES": "0",
+            "CACHE_BACKEND": "memory",
+            "API_KEY": "",
+            "RATE_LIMIT_PER_SECOND": "0",
+        }
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log"],
+            cwd=workdir,
+            env=env,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            result = asyncio.run(run_load(port, path, requests, concurrency))
+        finally:
+            server.terminate()
+            server.wait()
+        if drain is not None:
+            drain.wait()
+            size_file = Path(log_path + ".size")
+            result["log_kb"] = int(size_file.read_text()) / 1024 if size_file.exists() else 0.0
+        else:
+            log_file = Path(log_path)
+            result["log_kb"] = log_file.stat().st_size / 1024 if log_file.exists() else 0.0
+        return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--path", default="/api/v1/initiate-process")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--slow-sink-kbps", type=float, default=0, help="Log to a FIFO drained at this rate")
+    args = parser.parse_args()
+
+    sink = f", log sink drained at {args.slow_sink_kbps:g} KB/s" if args.slow_sink_kbps else ""
+    print(f"POST {args.path}, {args.requests} requests, concurrency {args.concurrency}{sink}")
+    print(f"{'mode':<10} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'log KB':>9}")
+    for mode in args.modes:
+        r = bench(mode, args.path, args.requests, args.concurrency, args.slow_sink_kbps)
+        print(f"{mode:<10} {r['throughput_rps']:>8.1f} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['log_kb']:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""
+Micro-benchmarks of the in-process hot paths: the job cache under concurrent
+access, base64 encoding of uploads into the Segmind request body, face
+masking, OpenCV decode/encode at book-page sizes, and serialization of
+/process/status responses.
+
+Every case reports wall time per operation (best and median of --repeat
+rounds), the tracemalloc peak and retained bytes of one round, and the
+process's peak RSS during the case (Linux; the high-water mark is reset
+between cases through /proc/self/clear_refs).
+
+Results can be saved as a JSON baseline and later runs compared against it;
+--compare exits with status 1 when a case got slower, or allocates more,
+by more than --threshold percent. Baselines are machine specific: compare
+runs made on the same host. Usage (from the repository root):
+
+    python benchmarks/micro_benchmark.py --save benchmarks/micro_baseline.json
+    python benchmarks/micro_benchmark.py --compare benchmarks/micro_baseline.json --threshold 15
+    python benchmarks/micro_benchmark.py --filter cache. serialize.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("LOG_FILE", "")
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+
+# Book pages: a square print page, a spread, and an A4 page at 300 dpi
+PAGE_SIZES = ((1024, 1024), (2048, 2048), (2480, 3508))
+FILE_SIZES_KB = (100, 1024, 5120)
+PAGE_COUNTS = (1, 10, 100, 500)
+
+class Case:
+    def __init__(self, run: Callable[[], Any], number: int, ops: int = 1, cleanup: Optional[Callable[[], None]] = None):
+        """
+        One benchmark case
+        :param run: Callable timed as one iteration
+        :param number: Iterations per timing round
+        :param ops: Operations performed by one call of run (per-op numbers divide by it)
+        :param cleanup: Called once after measuring
+        """
+        self.run = run
+        self.number = number
+        self.ops = ops
+        self.cleanup = cleanup
+
+class Skip(Exception):
+    """Raised by a case factory when the case cannot run here"""
+
+def reset_peak_rss() -> None:
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def measure(case: Case, repeat: int) -> Dict[str, Any]:
+    case.run()  # Warm up caches and lazy imports
+    reset_peak_rss()
+    rounds = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        for _ in range(case.number):
+            case.run()
+        rounds.append((time.perf_counter() - started) / (case.number * case.ops))
+
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for _ in range(case.number):
+        case.run()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    per_op = case.number * case.ops
+    return {
+        "best_us": min(rounds) * 1e6,
+        "median_us": statistics.median(rounds) * 1e6,
+        "ops_per_second": 1 / min(rounds),
+        "alloc_peak_kb": (peak - before) / 1024,
+        "alloc_retained_kb_per_op": (after - before) / 1024 / per_op,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def cache_case(backend: str, operation: str, threads: int) -> Callable[[Path], Case]:
+    def factory(workdir: Path) -> Case:
+        from app.core.cache import CacheManager
+        from app.core.store import MemoryJobStore, SqliteJobStore
+
+        if backend == "sqlite":
+            store = SqliteJobStore(str(workdir / f"cache_{operation}_{threads}.db"))
+        else:
+            store = MemoryJobStore(maxsize=10_000)
+        cache = CacheManager(store=store)
+        record = {f"page-{i}": {"status": "COMPLETED", "url": f"http://localhost/storage/uploads/p_{i}.png"} for i in range(8)}
+        keys = [f"process-{i}" for i in range(1000)]
+        for key in keys:
+            cache.set(key, record)
+        per_thread = 200
+
+        def worker(offset: int) -> None:
+            for i in range(per_thread):
+                key = keys[(offset * per_thread + i) % len(keys)]
+                if operation == "get":
+                    cache.get(key)
+                else:
+                    cache.set(key, record)
+
+        pool = ThreadPoolExecutor(max_workers=threads)
+
+        def run() -> None:
+            list(pool.map(worker, range(threads)))
+
+        def cleanup() -> None:
+            pool.shutdown()
+            close = getattr(store, "close", None)
+            if close:
+                close()
+
+        return Case(run, number=5, ops=threads * per_thread, cleanup=cleanup)
+    return factory
+
+class NullWriter:
+    """Request body sink: counts the bytes a payload writes"""
+
+    def __init__(self):
+        self.written = 0
+
+    async def write(self, chunk: bytes) -> None:
+        self.written += len(chunk)
+
+def base64_case(size_kb: int, mode: str) -> Callable[[Path], Case]:
+    # cold: memo cleared before each call; warm: encoding shared from the memo;
+    # stream: memo off, the file is read and encoded while the body is written
+    def factory(workdir: Path) -> Case:
+        from app.api.endpoints import process
+        from app.core.memo import base64_memo
+        from app.core.streaming import JSONStreamPayload
+
+        settings.UPLOAD_DIR = str(workdir)
+        name = f"b64_{size_kb}.jpg"
+        (workdir / name).write_bytes(os.urandom(size_kb * 1024))
+        loop = asyncio.new_event_loop()
+        max_bytes = base64_memo.max_bytes
+        if mode == "stream":
+            base64_memo.max_bytes = 0
+
+        async def send() -> int:
+            # Resolve the upload and write the Segmind request body, as run_segmind does
+            payload = JSONStreamPayload({"source_image": await process.resolve_image(name), "base64": False})
+            writer = NullWriter()
+            await payload.write(writer)
+            return writer.written
+
+        def run() -> None:
+            if mode == "cold":
+                base64_memo.clear()
+            loop.run_until_complete(send())
+
+        def cleanup() -> None:
+            base64_memo.max_bytes = max_bytes
+            base64_memo.clear()
+            loop.close()
+
+        return Case(run, number=max(3, 20_000 // size_kb), cleanup=cleanup)
+    return factory
+
+def page_image(width: int, height: int) -> np.ndarray:
+    # Gradients with noise: compresses like an illustration, not like a flat fill
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=2)
+    noise = rng.normal(0, 12, (height, width, 3)).astype(np.float32)
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+def opencv_case(operation: str, extension: str, width: int, height: int) -> Callable[[Path], Case]:
+    def factory(workdir: Path) -> Case:
+        image = page_image(width, height)
+        ok, encoded = cv2.imencode(extension, image)
+        data = encoded.tobytes()
+        if operation == "decode":
+            run = lambda: cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)  # noqa: E731
+        else:
+            run = lambda: cv2.imencode(extension, image)  # noqa: E731
+        return Case(run, number=3)
+    return factory
+
+def mask_case(width: int, height: int) -> Callable[[Path], Case]:
+    def factory(workdir: Path) -> Case:
+        from app.core.face_detector import face_detector
+        from app.core.masking import mask_child_face
+
+        try:
+            face_detector.load()
+        except RuntimeError as e:
+            raise Skip(f"face model unavailable ({settings.FACE_CAFFEMODEL})") from e
+        path = workdir / f"mask_{width}x{height}.png"
+        cv2.imwrite(str(path), page_image(width, height))
+        out_dir = workdir / "masked"
+        out_dir.mkdir(exist_ok=True)
+        return Case(lambda: mask_child_face(str(path), str(out_dir)), number=3)
+    return factory
+
+def serialize_case(pages: int) -> Callable[[Path], Case]:
+    def factory(workdir: Path) -> Case:
+        from app.schemas.responses import ProcessStatus, ProcessStatusResponse
+
+        process_id = "9b2f6c3e-8a41-4d0e-9d55-0f6f3f4c2a11"
+        statuses = [
+            {
+                "process_id": process_id,
+                "page_id": f"{i:08d}-5c1e-4b7a-8f1d-3e2a6b9c0d4f",
+                "status": "COMPLETED" if i % 3 else "PROCESSING",
+                "url": f"http://localhost:8000/storage/uploads/p_{i}_result.png" if i % 3 else None,
+            }
+            for i in range(pages)
+        ]
+
+        def run() -> bytes:
+            # What the status endpoint does: build the models, then FastAPI dumps them
+            response = ProcessStatusResponse(
+                status_code=5000,
+                message="Status retrieved successfully",
+                data=[ProcessStatus(**status) for status in statuses],
+                version=pages,
+                queue={"depth": 0, "in_flight": 4},
+                eta_seconds=12.5,
+                next_poll_seconds=2.0,
+            )
+            return response.model_dump_json().encode()
+
+        return Case(run, number=max(5, 5000 // pages))
+    return factory
+
+def build_cases() -> Dict[str, Callable[[Path], Case]]:
+    cases: Dict[str, Callable[[Path], Case]] = {}
+    for backend in ("memory", "sqlite"):
+        for operation in ("get", "set"):
+            for threads in (1, 4):
+                cases[f"cache.{backend}.{operation}.threads{threads}"] = cache_case(backend, operation, threads)
+    for size_kb in FILE_SIZES_KB:
+        for mode in ("cold", "warm", "stream"):
+            cases[f"base64.{mode}.{size_kb}kb"] = base64_case(size_kb, mode)
+    for width, height in PAGE_SIZES:
+        for extension in (".png", ".jpg"):
+            fmt = extension[1:]
+            cases[f"opencv.decode.{fmt}.{width}x{height}"] = opencv_case("decode", extension, width, height)
+            cases[f"opencv.encode.{fmt}.{width}x{height}"] = opencv_case("encode", extension, width, height)
+        cases[f"mask.{width}x{height}"] = mask_case(width, height)
+    for pages in PAGE_COUNTS:
+        cases[f"serialize.status.{pages}pages"] = serialize_case(pages)
+    return cases
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    List cases that regressed against a baseline
+    :param results: Current results by case
+    :param baseline: Baseline results by case
+    :param threshold: Allowed increase in percent
+    :return: One line per regression
+    """
+    regressions = []
+    limit = 1 + threshold / 100
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or "skipped" in current or "skipped" in previous:
+            continue
+        for metric, floor in (("best_us", 0.0), ("alloc_peak_kb", 64.0)):
+            # Allocation changes under floor KB are noise (interned strings, caches)
+            before, after = previous[metric], current[metric]
+            if after > before * limit and after - before > floor:
+                regressions.append(f"{name}: {metric} {before:.1f} -> {after:.1f} (+{(after / before - 1) * 100 if before else float('inf'):.0f}%)")
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", nargs="+", help="Run cases whose name starts with any of these prefixes")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing rounds per case")
+    parser.add_argument("--save", type=Path, help="Write results to this JSON baseline")
+    parser.add_argument("--compare", type=Path, help="Compare against this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed regression in percent")
+    args = parser.parse_args()
+
+    cases = build_cases()
+    if args.filter:
+        cases = {name: factory for name, factory in cases.items() if name.startswith(tuple(args.filter))}
+    baseline = json.loads(args.compare.read_text())["results"] if args.compare else {}
+
+    print(f"{'case':<36} {'best us/op':>12} {'median':>12} {'ops/s':>11} {'alloc KB':>9} {'RSS MB':>7} {'vs base':>8}")
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        for name, factory in cases.items():
+            try:
+                case = factory(workdir)
+            except Skip as e:
+                results[name] = {"skipped": str(e)}
+                print(f"{name:<36} skipped: {e}")
+                continue
+            try:
+                result = results[name] = measure(case, args.repeat)
+            finally:
+                if case.cleanup:
+                    case.cleanup()
+            previous = baseline.get(name, {})
+            delta = f"{(result['best_us'] / previous['best_us'] - 1) * 100:+.0f}%" if previous.get("best_us") else ""
+            print(
+                f"{name:<36} {result['best_us']:>12.2f} {result['median_us']:>12.2f} {result['ops_per_second']:>11.0f} "
+                f"{result['alloc_peak_kb']:>9.1f} {result['peak_rss_mb'] or 0:>7.1f} {delta:>8}"
+            )
+
+    if args.save:
+        meta = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "opencv": cv2.__version__,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        }
+        args.save.write_text(json.dumps({"meta": meta, "results": results}, indent=2))
+        print(f"Baseline written to {args.save}")
+    if args.compare:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:g}%:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:g}% against {args.compare}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Drive SegmindClient against the local stand-in through a scripted sequence of
+healthy, slow, failing and throttling phases. For each phase, print how many
+swaps succeeded, their latency, and the AIMD limit and breaker state the
+client ended in.
+
+Usage (from the repository root):
+
+    python benchmarks/segmind_client_benchmark.py --calls 40 --concurrency 16
+    python benchmarks/segmind_client_benchmark.py --naive   # no retries, fixed limit, no breaker
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import segmind_stub  # noqa: E402
+from app.core.http_client import HTTPClientManager  # noqa: E402
+from app.core.segmind import AdaptiveLimiter, CircuitBreaker, SegmindClient, SegmindError  # noqa: E402
+
+PHASES = [
+    ("healthy", {"latency": 0.2, "jitter": 0.05, "error_rate": 0.0, "throttle_rate": 0.0, "max_concurrency": 0}),
+    ("slow", {"latency": 1.5, "jitter": 0.3}),
+    ("5xx burst", {"latency": 0.2, "jitter": 0.05, "error_rate": 0.6}),
+    ("outage", {"error_rate": 1.0}),
+    ("throttled", {"error_rate": 0.0, "max_concurrency": 3, "retry_after": 0}),
+    ("recovered", {"max_concurrency": 0}),
+]
+
+def build_client(args: argparse.Namespace, url: str) -> SegmindClient:
+    http = HTTPClientManager(limit=64, limit_per_host=64, read_timeout=args.read_timeout)
+    if args.naive:
+        return SegmindClient(
+            url=url, api_key="stub", read_timeout=args.read_timeout, retries=0, http=http,
+            limiter=AdaptiveLimiter(initial=args.concurrency, minimum=args.concurrency, maximum=args.concurrency),
+            breaker=CircuitBreaker(threshold=10 ** 9),
+        )
+    return SegmindClient(
+        url=url, api_key="stub", read_timeout=args.read_timeout, http=http,
+        retries=args.retries, backoff_base=0.2, backoff_max=2.0, breaker_max_wait=args.breaker_reset * 3,
+        limiter=AdaptiveLimiter(initial=4, minimum=1, maximum=args.concurrency, slow_seconds=3.0),
+        breaker=CircuitBreaker(threshold=5, reset_timeout=args.breaker_reset),
+    )
+
+async def run_phase(client: SegmindClient, calls: int, concurrency: int):
+    gate = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one():
+        nonlocal failures
+        async with gate:
+            started = time.perf_counter()
+            try:
+                await client.swap({"source_image": "x", "target_image": "y"})
+                latencies.append(time.perf_counter() - started)
+            except SegmindError:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(calls)))
+    return latencies, failures, time.perf_counter() - started
+
+async def main_async(args: argparse.Namespace) -> None:
+    runner = await segmind_stub.start(port=args.port)
+    state = runner.app["state"]
+    stub_stats = runner.app["stats"]
+    client = build_client(args, f"http://127.0.0.1:{args.port}/v1/faceswap-comic")
+    print(f"{'phase':<11} {'ok':>4} {'fail':>5} {'p50 s':>7} {'p99 s':>7} {'wall s':>7} {'stub req':>9} {'limit':>6} {'breaker':>10}")
+    try:
+        for name, changes in PHASES:
+            state.update(changes)
+            before = stub_stats["requests"]
+            latencies, failures, wall = await run_phase(client, args.calls, args.concurrency)
+            latencies.sort()
+            p50 = statistics.median(latencies) if latencies else float("nan")
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else float("nan")
+            stats = client.stats()
+            print(
+                f"{name:<11} {len(latencies):>4} {failures:>5} {p50:>7.2f} {p99:>7.2f} {wall:>7.1f} "
+                f"{stub_stats['requests'] - before:>9} {stats['limiter']['limit']:>6} {stats['breaker']['state']:>10}"
+            )
+        print(f"client: {client.stats()}")
+        print(f"stub peak in flight: {stub_stats['peak_in_flight']}")
+    finally:
+        await client.http.close()
+        await runner.cleanup()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=40, help="Swaps per phase")
+    parser.add_argument("--concurrency", type=int, default=16, help="Callers per phase (and the AIMD ceiling)")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--read-timeout", type=float, default=5.0)
+    parser.add_argument("--breaker-reset", type=float, default=2.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--naive", action="store_true", help="Fixed concurrency, no retries, no breaker")
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Local stand-in for the Segmind face swap API and the OpenAI chat completions
+API that injects latency and errors.
+
+Every POST (any path) answers with a PNG of payload_bytes after a delay drawn
+from the latency distribution, or with an injected 503, 429 or hang. POST
+/v1/chat/completions answers like OpenAI with a list of keywords. The
+behaviour can be changed while running with POST /_control, e.g.
+{"latency": 5, "error_rate": 0.5}. GET /_stats reports what was served.
+Usage (from the repository root):
+
+    python benchmarks/segmind_stub.py --port 8765 --latency 2 --jitter 0.5 --error-rate 0.1
+    SEGMIND_API_URL=http://127.0.0.1:8765/v1/faceswap-comic OPENAI_BASE_URL=http://127.0.0.1:8765/v1 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import random
+import time
+import zlib
+from typing import Any, Dict
+
+from aiohttp import web
+
+# 1x1 transparent PNG
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6300010000050001a5f645400000000049454e44ae426082"
+)
+
+DEFAULTS = {
+    "latency": 1.0,      # Seconds before answering (mean; median for lognormal)
+    "jitter": 0.0,       # Uniform +/- seconds added to latency
+    "distribution": "uniform",  # uniform (latency +/- jitter), exponential or lognormal
+    "sigma": 0.5,        # Shape of the lognormal distribution
+    "payload_bytes": 0,  # Size of the returned image (0 = 1x1 PNG)
+    "openai_latency": 0.5,  # Mean seconds before a chat completion answers
+    "openai_error_rate": 0.0,  # Share of chat completions answered with 500
+    "keywords": 10,      # Keywords returned per chat completion
+    "error_rate": 0.0,   # Share of requests answered with 503
+    "throttle_rate": 0.0,  # Share of requests answered with 429
+    "hang_rate": 0.0,    # Share of requests that never answer (client timeout)
+    "retry_after": 1,    # Retry-After sent with 429
+    "max_concurrency": 0,  # Above this many in flight, answer 429 (0 = unlimited)
+}
+
+def png_of_size(size: int) -> bytes:
+    """
+    Build a valid PNG of roughly the given size, padded with an ancillary chunk
+    :param size: Target size in bytes
+    :return: PNG bytes
+    """
+    padding = max(0, size - len(PNG) - 12)
+    if not padding:
+        return PNG
+    data = b"pAdd" + bytes(padding)
+    chunk = padding.to_bytes(4, "big") + data + zlib.crc32(data).to_bytes(4, "big")
+    # Ancillary chunks go before IEND, the last 12 bytes
+    return PNG[:-12] + chunk + PNG[-12:]
+
+def draw_latency(state: Dict[str, Any], mean: float) -> float:
+    """
+    Draw one delay from the configured distribution
+    :param state: Current settings
+    :param mean: Mean (median for lognormal) delay in seconds
+    :return: Seconds to wait
+    """
+    distribution = state["distribution"]
+    if mean <= 0:
+        return 0.0
+    if distribution == "exponential":
+        return random.expovariate(1 / mean)
+    if distribution == "lognormal":
+        return mean * random.lognormvariate(0, state["sigma"])
+    return max(0.0, mean + random.uniform(-state["jitter"], state["jitter"]))
+
+def build_app(**config: Any) -> web.Application:
+    """
+    Build the stand-in application
+    :param config: Overrides of DEFAULTS
+    :return: aiohttp application
+    """
+    state: Dict[str, Any] = {**DEFAULTS, **config}
+    stats = {
+        "requests": 0, "ok": 0, "errors": 0, "throttled": 0, "hung": 0, "in_flight": 0, "peak_in_flight": 0,
+        "bytes_received": 0, "openai_requests": 0, "openai_errors": 0,
+    }
+    payloads: Dict[int, bytes] = {}
+
+    async def swap(request: web.Request) -> web.Response:
+        stats["bytes_received"] += len(await request.read())
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+        try:
+            if state["max_concurrency"] and stats["in_flight"] > state["max_concurrency"]:
+                stats["throttled"] += 1
+                return web.Response(status=429, text="Too many requests", headers={"Retry-After": str(state["retry_after"])})
+            roll = random.random()
+            if roll < state["hang_rate"]:
+                stats["hung"] += 1
+                await asyncio.sleep(3600)
+            roll -= state["hang_rate"]
+            await asyncio.sleep(draw_latency(state, state["latency"]))
+            if roll < state["error_rate"]:
+                stats["errors"] += 1
+                return web.Response(status=503, text="Service unavailable")
+            roll -= state["error_rate"]
+            if roll < state["throttle_rate"]:
+                stats["throttled"] += 1
+                return web.Response(status=429, text="Too many requests", headers={"Retry-After": str(state["retry_after"])})
+            stats["ok"] += 1
+            size = state["payload_bytes"]
+            if size not in payloads:
+                payloads[size] = png_of_size(size)
+            return web.Response(body=payloads[size], content_type="image/png")
+        finally:
+            stats["in_flight"] -= 1
+
+    async def chat_completion(request: web.Request) -> web.Response:
+        body = await request.json()
+        stats["openai_requests"] += 1
+        await asyncio.sleep(draw_latency(state, state["openai_latency"]))
+        if random.random() < state["openai_error_rate"]:
+            stats["openai_errors"] += 1
+            return web.json_response(
+                {"error": {"message": "Injected error", "type": "server_error", "code": None}}, status=500
+            )
+        content = ", ".join(f"keyword {i + 1}" for i in range(state["keywords"]))
+        return web.json_response({
+            "id": f"chatcmpl-stub{stats['openai_requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    async def control(request: web.Request) -> web.Response:
+        changes = await request.json()
+        unknown = set(changes) - set(DEFAULTS)
+        if unknown:
+            return web.json_response({"error": f"Unknown settings: {sorted(unknown)}"}, status=400)
+        state.update(changes)
+        return web.json_response(state)
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response({**stats, "config": state})
+
+    app = web.Application(client_max_size=100 * 1024 * 1024)
+    app.router.add_post("/_control", control)
+    app.router.add_get("/_stats", get_stats)
+    app.router.add_post("/v1/chat/completions", chat_completion)
+    app.router.add_post("/{tail:.*}", swap)
+    app["state"] = state
+    app["stats"] = stats
+    return app
+
+async def start(host: str = "127.0.0.1", port: int = 8765, **config: Any) -> web.AppRunner:
+    """
+    Start the stand-in inside the running event loop
+    :return: Runner; await runner.cleanup() to stop it
+    """
+    runner = web.AppRunner(build_app(**config))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    for name, default in DEFAULTS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    args = vars(parser.parse_args())
+    host, port = args.pop("host"), args.pop("port")
+    print(f"Segmind stand-in on http://{host}:{port}/v1/faceswap-comic {args}")
+    web.run_app(build_app(**args), host=host, port=port, print=None)
+
+if __name__ == "__main__":
+    main()
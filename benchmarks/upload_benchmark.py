@@ -0,0 +1,157 @@
+"""
+Compare peak RSS and latency of the streaming /upload path against the
+previous read-everything-then-write path.
+
+Each mode runs in its own uvicorn subprocess so peak RSS is measured per
+mode. Usage (from the repository root):
+
+    python benchmarks/upload_benchmark.py --size-mb 20 --requests 40 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+MODES = ("legacy", "streaming")
+
+def peak_rss_bytes() -> int:
+    # VmHWM is per address space; ru_maxrss on Linux carries the parent's peak across exec
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def build_app(mode: str, upload_dir: str):
+    from fastapi import FastAPI, File, UploadFile
+    from app.core.config import settings
+
+    settings.UPLOAD_DIR = upload_dir
+    settings.UPLOAD_MAX_BYTES = 1024 * 1024 * 1024
+    app = FastAPI()
+
+    if mode == "streaming":
+        from app.api.endpoints import upload
+        app.include_router(upload.router)
+    else:
+        @app.post("/upload")
+        async def legacy_upload(file: UploadFile = File(...)):
+            # The pre-streaming implementation: whole file in memory, blocking write
+            new_filename = f"{uuid.uuid4()}.{file.filename.rsplit('.', 1)[1].lower()}"
+            with open(Path(upload_dir) / new_filename, "wb") as buffer:
+                content = await file.read()
+                buffer.write(content)
+            return {"file_path": new_filename}
+
+    @app.get("/bench/rss")
+    async def rss():
+        return {"peak_rss": peak_rss_bytes()}
+
+    return app
+
+def serve(mode: str, port: int, upload_dir: str) -> None:
+    import uvicorn
+    uvicorn.run(build_app(mode, upload_dir), host="127.0.0.1", port=port, log_level="warning")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def run_load(port: int, payload: bytes, requests: int, concurrency: int) -> dict:
+    import httpx
+
+    base = f"http://127.0.0.1:{port}"
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(timeout=300) as client:
+        for _ in range(100):
+            try:
+                idle = (await client.get(f"{base}/bench/rss")).json()["peak_rss"]
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        else:
+            raise RuntimeError("Benchmark server did not start")
+
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(f"{base}/upload", files={"file": ("photo.jpg", payload, "image/jpeg")})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[one() for _ in range(requests)])
+        elapsed = time.perf_counter() - started
+        peak = (await client.get(f"{base}/bench/rss")).json()["peak_rss"]
+
+    return {
+        "throughput_rps": requests / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "idle_rss_mb": idle / 1024 / 1024,
+        "peak_rss_mb": peak / 1024 / 1024,
+    }
+
+def bench(mode: str, payload: bytes, requests: int, concurrency: int) -> dict:
+    port = free_port()
+    with tempfile.TemporaryDirectory() as upload_dir:
+        server = subprocess.Popen(
+            [sys.executable, __file__, "--serve", mode, "--port", str(port), "--upload-dir", upload_dir],
+            cwd=str(ROOT),
+        )
+        try:
+            return asyncio.run(run_load(port, payload, requests, concurrency))
+        finally:
+            server.terminate()
+            server.wait()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=20)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--serve", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--upload-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.upload_dir)
+        return
+
+    payload = os.urandom(int(args.size_mb * 1024 * 1024))
+    print(f"{len(payload) / 1024 / 1024:.1f} MB uploads, {args.requests} requests, concurrency {args.concurrency}")
+    print(f"{'mode':<10} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'idle RSS MB':>12} {'peak RSS MB':>12}")
+    for mode in args.modes:
+        r = bench(mode, payload, args.requests, args.concurrency)
+        print(
+            f"{mode:<10} {r['throughput_rps']:>8.2f} {r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f} "
+            f"{r['idle_rss_mb']:>12.1f} {r['peak_rss_mb']:>12.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+
+# Settings are read from the environment at import: keep test runs out of logs/
+os.environ.setdefault("LOG_FILE", "")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
@@ -0,0 +1,99 @@
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from app.middleware.api_key import APIKeyMiddleware, RateLimiter, compile_allowlist
+
+async def ok(request):
+    return PlainTextResponse("ok")
+
+def client(**options) -> TestClient:
+    app = Starlette(routes=[
+        Route("/api/v1/health", ok),
+        Route("/api/v1/process/status", ok, methods=["GET", "POST", "OPTIONS"]),
+        Route("/storage/uploads/{name}", ok),
+        Route("/metrics", ok),
+    ])
+    options.setdefault("api_keys", "key-a,key-b")
+    options.setdefault("public_paths", "/api/v1/health,/storage/uploads/*")
+    options.setdefault("rate", 0)
+    options.setdefault("burst", 1)
+    app.add_middleware(APIKeyMiddleware, **options)
+    return TestClient(app)
+
+def test_allowlist_matches_exact_paths_and_prefixes():
+    pattern = compile_allowlist(["/api/v1/health", " /storage/uploads/*", ""])
+    assert pattern.fullmatch("/api/v1/health")
+    assert pattern.fullmatch("/storage/uploads/a/b.png")
+    assert not pattern.fullmatch("/api/v1/health/deep")
+    assert not pattern.fullmatch("/api/v1/process/status")
+    assert compile_allowlist(["", " "]) is None
+
+@pytest.mark.parametrize("headers, status", [
+    ({}, 401),
+    ({"X-API-Key": "wrong"}, 403),
+    ({"X-API-Key": "key-a"}, 200),
+    ({"X-API-Key": "key-b"}, 200),
+])
+def test_keys_are_checked(headers, status):
+    assert client().get("/api/v1/process/status", headers=headers).status_code == status
+
+def test_public_paths_and_preflights_skip_the_check():
+    http = client()
+    assert http.get("/api/v1/health").status_code == 200
+    assert http.get("/storage/uploads/photo.png").status_code == 200
+    assert http.options("/api/v1/process/status").status_code == 200
+
+def test_without_keys_every_request_passes():
+    http = client(api_keys="", rate=1, burst=1)
+    assert all(http.get("/api/v1/process/status").status_code == 200 for _ in range(5))
+
+def test_each_key_has_its_own_bucket():
+    http = client(rate=0.01, burst=2)
+    key_a = {"X-API-Key": "key-a"}
+    assert http.get("/api/v1/process/status", headers=key_a).status_code == 200
+    assert http.get("/api/v1/process/status", headers=key_a).status_code == 200
+    limited = http.get("/api/v1/process/status", headers=key_a)
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) >= 1
+    assert http.get("/api/v1/process/status", headers={"X-API-Key": "key-b"}).status_code == 200
+
+def test_invalid_keys_do_not_fill_the_limiter():
+    http = client(rate=0.01, burst=1)
+    for i in range(20):
+        assert http.get("/api/v1/process/status", headers={"X-API-Key": f"guess-{i}"}).status_code == 403
+    middleware = http.app.middleware_stack
+    while not isinstance(middleware, APIKeyMiddleware):
+        middleware = middleware.app
+    assert len(middleware.limiter._buckets) == 0
+    assert http.get("/api/v1/process/status", headers={"X-API-Key": "key-a"}).status_code == 200
+
+@pytest.mark.parametrize("headers, status", [
+    ({}, 401),
+    ({"Authorization": "Bearer scrape-token"}, 200),
+    ({"Authorization": "bearer scrape-token"}, 200),
+    ({"Authorization": "Bearer wrong"}, 401),
+    ({"Authorization": "Basic scrape-token"}, 401),
+    ({"X-API-Key": "key-a"}, 200),
+])
+def test_metrics_accept_a_bearer_token(headers, status):
+    assert client(metrics_token="scrape-token").get("/metrics", headers=headers).status_code == status
+
+def test_metrics_token_is_only_valid_for_metrics():
+    http = client(metrics_token="scrape-token")
+    headers = {"Authorization": "Bearer scrape-token"}
+    assert http.get("/api/v1/process/status", headers=headers).status_code == 401
+
+def test_metrics_can_be_made_public():
+    assert client(metrics_public=True).get("/metrics").status_code == 200
+    assert client(metrics_token=None).get("/metrics", headers={"Authorization": "Bearer "}).status_code == 401
+
+def test_limiter_reports_the_wait_and_forgets_idle_keys():
+    limiter = RateLimiter(rate=1, burst=1, max_keys=2)
+    assert limiter.acquire("a") == 0
+    assert 0 < limiter.acquire("a") <= 1
+    limiter.acquire("b")
+    limiter.acquire("c")
+    assert list(limiter._buckets) == ["b", "c"]
+    assert RateLimiter(rate=0, burst=1).acquire("a") == 0
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import uuid
+import pytest
+from app.api.endpoints.process import set_page_state, stream_page_events
+from app.core.cache import cache
+from app.core.config import settings
+from app.core.events import RESYNC, EventBus, events
+
+@pytest.fixture
+def fast_polls(monkeypatch):
+    monkeypatch.setattr(settings, "EVENTS_POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(settings, "EVENTS_HEARTBEAT", 60)
+
+def new_process(pages):
+    process_id = str(uuid.uuid4())
+    cache.set(process_id, {page_id: {"status": "PENDING", "url": None} for page_id in pages})
+    return process_id
+
+def parse(chunks):
+    parsed = []
+    for chunk in chunks:
+        fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines() if not line.startswith((":", "retry")))
+        if "event" in fields:
+            parsed.append((fields["event"], json.loads(fields["data"])))
+    return parsed
+
+def subscribe(process_id):
+    # As /process/{id}/events does: subscribe, then read the record
+    queue = events.subscribe(process_id)
+    return queue, cache.get_record(process_id)
+
+async def collect(process_id, queue, record, timeout=2):
+    version, pages = record
+
+    async def read():
+        return [chunk async for chunk in stream_page_events(process_id, queue, version, pages)]
+    return parse(await asyncio.wait_for(read(), timeout))
+
+def test_full_queue_is_replaced_by_a_resync_event():
+    bus = EventBus(max_queue=2)
+    queue = bus.subscribe("p")
+    for i in range(5):
+        bus.publish("p", {"n": i})
+    assert [queue.get_nowait() for _ in range(queue.qsize())] == [RESYNC]
+    assert bus.stats()["dropped"] == 5 and bus.stats()["resyncs"] == 2
+    bus.publish("p", {"n": 5})
+    assert queue.get_nowait() == {"n": 5}
+
+def test_stream_sends_each_change_then_ends(fast_polls):
+    async def scenario():
+        process_id = new_process(["a", "b"])
+        queue, record = subscribe(process_id)
+        set_page_state(process_id, "a", status="PROCESSING")
+        set_page_state(process_id, "a", status="COMPLETED", url="a.png")
+        set_page_state(process_id, "b", status="FAILED", error="bad image")
+        return await collect(process_id, queue, record)
+
+    sent = run_scenario(scenario)
+    assert [(event, data.get("page_id"), data.get("status")) for event, data in sent] == [
+        ("page", "a", "PENDING"),
+        ("page", "b", "PENDING"),
+        ("page", "a", "PROCESSING"),
+        ("page", "a", "COMPLETED"),
+        ("page", "b", "FAILED"),
+        ("end", None, None),
+    ]
+    assert sent[-1][1]["reason"] == "completed"
+
+def test_stream_recovers_events_lost_to_a_full_queue(fast_polls, monkeypatch):
+    monkeypatch.setattr(events, "max_queue", 3)
+
+    async def scenario():
+        process_id = new_process(["a", "b"])
+        queue, record = subscribe(process_id)
+        # Page a's completion is pushed out of the queue by page b's progress
+        set_page_state(process_id, "a", status="COMPLETED", url="a.png")
+        for step in range(10):
+            set_page_state(process_id, "b", status="PROCESSING", step=step)
+        set_page_state(process_id, "b", status="COMPLETED", url="b.png")
+        return await collect(process_id, queue, record)
+
+    sent = run_scenario(scenario)
+    assert ("page", "a", "COMPLETED") in [(event, data.get("page_id"), data.get("status")) for event, data in sent]
+    assert sent[-1][0] == "end" and sent[-1][1]["reason"] == "completed"
+
+def test_stream_picks_up_changes_made_by_another_worker(fast_polls):
+    async def scenario():
+        process_id = new_process(["a"])
+        queue, record = subscribe(process_id)
+        # Written to the store without an event, as another worker would
+        cache.update_page(process_id, "a", status="COMPLETED", url="a.png")
+        return await collect(process_id, queue, record)
+
+    sent = run_scenario(scenario)
+    assert sent[-2][1]["status"] == "COMPLETED"
+    assert sent[-1][1]["reason"] == "completed"
+
+def test_stream_ends_when_the_record_expires(fast_polls):
+    async def scenario():
+        process_id = new_process(["a"])
+        queue, (version, pages) = subscribe(process_id)
+        cache.delete(process_id)
+        chunks = [chunk async for chunk in stream_page_events(process_id, queue, version, pages)]
+        return parse(chunks), events.subscribers(process_id)
+
+    sent, subscribers = run_scenario(scenario)
+    assert sent[-1] == ("end", {"process_id": sent[0][1]["process_id"], "reason": "expired"})
+    assert subscribers == 0
+
+def run_scenario(scenario):
+    return asyncio.run(asyncio.wait_for(scenario(), 5))
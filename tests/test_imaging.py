@@ -0,0 +1,68 @@
+import asyncio
+import cv2
+import numpy as np
+import pytest
+from PIL import Image, ImageOps
+from app.core.config import settings
+from app.core.imaging import ImageNormalizer, apply_orientation
+from app.core.storage import find_stored, storage_path
+
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "STORAGE_LIFECYCLE", False)
+    return tmp_path
+
+def save_jpeg(path, image: Image.Image, orientation: int) -> None:
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    image.save(path, "JPEG", quality=95, exif=exif)
+
+def test_rotated_phone_photo_is_sent_upright(upload_dir):
+    # Stored landscape with the top of the scene on the left; Orientation=6 displays it as portrait
+    stored = Image.new("RGB", (3000, 2000), BLUE)
+    stored.paste(RED, (0, 0, 1500, 2000))
+    save_jpeg(storage_path("phone.jpg"), stored, orientation=6)
+
+    normalizer = ImageNormalizer(enabled=True, max_edge=1000, fmt="jpeg", quality=90, workers=1)
+    variant_ref, saved = asyncio.run(normalizer.prepare("phone.jpg"))
+    normalizer.shutdown()
+
+    assert variant_ref != "phone.jpg" and saved > 0
+    with Image.open(find_stored(variant_ref)) as variant:
+        assert variant.size == (667, 1000)
+        assert variant.getexif().get(0x0112, 1) == 1
+        top = variant.getpixel((333, 100))
+        bottom = variant.getpixel((333, 900))
+    assert top[0] > 200 and top[2] < 60
+    assert bottom[2] > 200 and bottom[0] < 60
+
+def test_small_rotated_photo_still_uses_upright_variant(upload_dir):
+    stored = Image.new("RGB", (60, 40), BLUE)
+    stored.paste(RED, (0, 0, 30, 40))
+    save_jpeg(storage_path("small.jpg"), stored, orientation=8)
+
+    normalizer = ImageNormalizer(enabled=True, max_edge=1000, fmt="jpeg", quality=100, workers=1)
+    variant_ref, _ = asyncio.run(normalizer.prepare("small.jpg"))
+    normalizer.shutdown()
+
+    assert variant_ref != "small.jpg"
+    with Image.open(find_stored(variant_ref)) as variant:
+        assert variant.size == (40, 60)
+
+@pytest.mark.parametrize("orientation", range(1, 9))
+def test_apply_orientation_matches_exif_transpose(tmp_path, orientation):
+    pixels = np.arange(4 * 6 * 3, dtype=np.uint8).reshape(4, 6, 3)
+    path = tmp_path / "image.png"
+    stored = Image.fromarray(pixels)
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    stored.save(path, exif=exif)
+
+    with Image.open(path) as image:
+        expected = np.asarray(ImageOps.exif_transpose(image))
+    decoded = cv2.cvtColor(cv2.imread(str(path), cv2.IMREAD_UNCHANGED), cv2.COLOR_BGR2RGB)
+    assert np.array_equal(apply_orientation(decoded, orientation), expected)
@@ -0,0 +1,152 @@
+import asyncio
+import io
+import threading
+import time
+import pytest
+from app.core import lifecycle as lifecycle_module
+from app.core.config import settings
+from app.core.lifecycle import StorageLifecycle
+from app.core.storage import ContentStore, find_stored, storage_path
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DEDUP", False)
+    path = tmp_path / "uploads"
+    path.mkdir()
+    return path
+
+def make_lifecycle(root, **options):
+    options.setdefault("index_path", str(root.parent / "lifecycle.db"))
+    options.setdefault("job_ttl", 60)
+    options.setdefault("grace", 0)
+    options.setdefault("quota_bytes", 0)
+    options.setdefault("min_idle", 0)
+    options.setdefault("batch", 100)
+    lifecycle = StorageLifecycle(root=str(root), **options)
+    # Nothing predates the index in these tests
+    lifecycle.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('adopted', '0')")
+    return lifecycle
+
+def write(root, name, size=10):
+    storage_path(name, str(root)).write_bytes(b"x" * size)
+    return name
+
+def exists(root, name):
+    return find_stored(name, str(root)).exists()
+
+def claims(lifecycle, name):
+    return sorted(row[0] for row in lifecycle.conn.execute("SELECT owner FROM claims WHERE name = ?", (name,)))
+
+def test_expired_files_go_with_their_variants(root):
+    lifecycle = make_lifecycle(root)
+    lifecycle.track(write(root, "old.png"), "upload", ttl=-1)
+    lifecycle.track(write(root, "old.n1600q85u.jpg"), "variant", parent="old.png")
+    lifecycle.track(write(root, "new.png"), "upload")
+    assert lifecycle.sweep()["expired"] == 2
+    assert not exists(root, "old.png") and not exists(root, "old.n1600q85u.jpg")
+    assert exists(root, "new.png")
+    assert lifecycle.usage() == (1, 10)
+
+def test_claims_extend_expiry_and_keep_the_creator(root, monkeypatch):
+    monkeypatch.setattr(settings, "APP_URL", "http://app.test")
+    lifecycle = make_lifecycle(root)
+    lifecycle.track(write(root, "result.png"), "result", owner="job-a", ttl=-1)
+    lifecycle.claim(["http://app.test/storage/uploads/result.png", "https://elsewhere/x.png"], "job-b")
+    lifecycle.claim(["result.png"], "job-c")
+    owner, expires_at = lifecycle.conn.execute(
+        "SELECT owner, expires_at FROM files WHERE name = 'result.png'"
+    ).fetchone()
+    assert owner == "job-a"
+    assert expires_at > time.time() + 30
+    assert claims(lifecycle, "result.png") == ["job-a", "job-b", "job-c"]
+    assert lifecycle.sweep()["expired"] == 0
+
+def test_eviction_takes_expired_then_unclaimed_files_and_never_claimed_ones(root):
+    lifecycle = make_lifecycle(root, quota_bytes=25, low_watermark=0.5, batch=1)
+    for name in ("expired1.png", "expired2.png"):
+        lifecycle.track(write(root, name), "upload", ttl=-1)
+    lifecycle.track(write(root, "unclaimed.png"), "upload")
+    lifecycle.track(write(root, "claimed.png"), "upload")
+    lifecycle.claim(["claimed.png"], "job")
+    lifecycle.track(write(root, "result.png"), "result", owner="job")
+
+    # One expired file per pass, then eviction: the other expired file goes first
+    assert lifecycle.sweep() == {"adopted": 0, "expired": 1, "evicted": 1}
+    assert not exists(root, "expired1.png") and not exists(root, "expired2.png")
+    assert exists(root, "unclaimed.png")
+
+    assert lifecycle.sweep()["evicted"] == 1
+    assert not exists(root, "unclaimed.png")
+    # Still over quota, but everything left is claimed by a live job
+    assert lifecycle.sweep()["evicted"] == 0
+    assert exists(root, "claimed.png") and exists(root, "result.png")
+
+def test_recently_read_files_are_not_evicted(root):
+    lifecycle = make_lifecycle(root, quota_bytes=5, min_idle=60)
+    lifecycle.track(write(root, "hot.png"), "upload")
+    lifecycle.conn.execute("UPDATE files SET last_access = last_access - 120")
+    lifecycle.touch("hot.png")
+    assert lifecycle.sweep()["evicted"] == 0
+    assert exists(root, "hot.png")
+
+def test_claim_made_by_another_worker_during_eviction_wins(root, monkeypatch):
+    lifecycle = make_lifecycle(root, quota_bytes=5)
+    other = make_lifecycle(root, index_path=lifecycle.index_path)
+    lifecycle.track(write(root, "photo.png"), "upload")
+    delete = lifecycle._delete
+
+    def claim_then_delete(select, params):
+        # Another worker starts a job on the file after it was picked for eviction
+        other.claim(["photo.png"], "job")
+        return delete(select, params)
+
+    monkeypatch.setattr(lifecycle, "_delete", claim_then_delete)
+    assert lifecycle.sweep()["evicted"] == 0
+    assert exists(root, "photo.png")
+
+def test_workers_sweeping_at_once_delete_each_file_once(root):
+    first = make_lifecycle(root, batch=1000)
+    second = make_lifecycle(root, index_path=first.index_path, batch=1000)
+    names = [write(root, f"{i}.png", size=i + 1) for i in range(300)]
+    for name in names:
+        first.track(name, "upload", ttl=-1)
+    results = []
+    threads = [threading.Thread(target=lambda lc=lc: results.append(lc.sweep())) for lc in (first, second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(result["expired"] for result in results) == 300
+    assert first.bytes_freed + second.bytes_freed == sum(range(1, 301))
+    assert not any(exists(root, name) for name in names)
+    assert first.usage() == (0, 0)
+
+def test_expired_claims_are_dropped(root):
+    lifecycle = make_lifecycle(root)
+    lifecycle.track(write(root, "photo.png"), "upload")
+    lifecycle.claim(["photo.png"], "short", ttl=-1)
+    lifecycle.claim(["photo.png"], "long")
+    lifecycle.sweep()
+    assert claims(lifecycle, "photo.png") == ["long"]
+
+def test_shared_upload_is_kept_while_a_job_holds_a_reference(root, monkeypatch):
+    store = ContentStore(root=str(root), index_path=str(root.parent / "uploads.db"))
+    monkeypatch.setattr(settings, "UPLOAD_DEDUP", True)
+    monkeypatch.setattr(lifecycle_module, "get_content_store", lambda: store)
+    stream = io.BytesIO(b"photo")
+
+    async def read(n):
+        return stream.read(n)
+
+    name, _ = asyncio.run(store.ingest(read, "png"))
+    store._conn.execute("UPDATE blobs SET last_upload = 0")
+    lifecycle = make_lifecycle(root)
+    lifecycle.track(name, "upload", ttl=-1)
+    lifecycle.claim([name], "job", ttl=-1)
+    store.acquire(name, "other-job", time.time() + 60)
+
+    # The file and the job's claim have expired, but another job still holds the blob
+    assert lifecycle.sweep()["expired"] == 1
+    assert exists(root, name)
+    assert lifecycle.usage()[0] == 1
+    assert store.refcount(name) == 1
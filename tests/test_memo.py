@@ -0,0 +1,121 @@
+import asyncio
+import os
+import pytest
+from app.core.memo import Base64Memo, SingleFlight
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_concurrent_calls_share_one_run():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "done"
+
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+        return calls, results, flight
+
+    calls, results, flight = run(scenario())
+    assert calls == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert all(result == "done" for result, _ in results)
+    assert flight.joined == 4 and not flight.running("key")
+
+def test_failure_is_shared_with_waiting_callers():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("bad image")
+
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(3)), return_exceptions=True)
+
+    results = run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+
+def test_cancelled_leader_hands_over_to_a_waiting_caller():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return calls
+
+        leader = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        await asyncio.gather(leader, return_exceptions=True)
+        return leader, await follower
+
+    leader, (result, shared) = run(scenario())
+    assert leader.cancelled()
+    assert (result, shared) == (2, False)
+
+def test_cancelled_follower_leaves_the_leader_running():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        leader = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert run(scenario()) == ("done", False)
+
+def test_memo_encodes_each_file_version_once(tmp_path):
+    path = tmp_path / "photo.png"
+    path.write_bytes(b"one")
+    memo = Base64Memo(max_bytes=1000)
+    encodes = []
+
+    async def encode(p):
+        encodes.append(p)
+        with open(p, "rb") as f:
+            return f.read().hex()
+
+    assert run(memo.get(str(path), encode)) == b"one".hex()
+    assert run(memo.get(str(path), encode)) == b"one".hex()
+    assert len(encodes) == 1
+
+    path.write_bytes(b"three")
+    os.utime(path, ns=(1, 1))
+    assert run(memo.get(str(path), encode)) == b"three".hex()
+    assert len(encodes) == 2
+    stats = memo.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2
+
+def test_memo_evicts_least_recently_used_over_budget(tmp_path):
+    memo = Base64Memo(max_bytes=10)
+
+    async def encode(p):
+        return "x" * 6
+
+    paths = []
+    for name in ("a", "b", "c"):
+        path = tmp_path / name
+        path.write_bytes(name.encode())
+        paths.append(str(path))
+    for path in paths:
+        run(memo.get(path, encode))
+    stats = memo.stats()
+    assert stats["entries"] == 1 and stats["current_bytes"] == 6
+    assert stats["evictions"] == 2
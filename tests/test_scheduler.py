@@ -0,0 +1,114 @@
+import asyncio
+import pytest
+from app.core.scheduler import JobScheduler, QueueFullError, SchedulerClosedError
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_keys_are_served_round_robin_and_priority_first():
+    async def scenario():
+        order = []
+        scheduler = JobScheduler(workers=1, max_queue=100, drain_timeout=5)
+
+        async def job(name):
+            order.append(name)
+
+        # Queued before the worker starts, so the service order is the scheduler's alone
+        for i in range(3):
+            scheduler.submit("big", job, f"big{i}")
+        scheduler.submit("small", job, "small0")
+        scheduler.submit("vip", job, "vip0", priority=True)
+        await scheduler.start()
+        await scheduler.stop()
+        return order, scheduler.stats()
+
+    order, stats = run(scenario())
+    assert order == ["vip0", "big0", "small0", "big1", "big2"]
+    assert stats["completed"] == 5 and stats["depth"] == 0
+
+def test_full_queue_rejects_with_retry_after():
+    async def scenario():
+        scheduler = JobScheduler(workers=1, max_queue=2, drain_timeout=5)
+        release = asyncio.Event()
+
+        async def job():
+            await release.wait()
+
+        scheduler.submit("a", job)
+        scheduler.submit("a", job)
+        with pytest.raises(QueueFullError) as raised:
+            scheduler.submit("a", job)
+        release.set()
+        await scheduler.start()
+        await scheduler.stop()
+        return raised.value, scheduler.stats()
+
+    error, stats = run(scenario())
+    assert error.depth == 2 and error.retry_after >= 1
+    assert stats["rejected"] == 1 and stats["completed"] == 2
+
+def test_stop_drains_queued_and_running_jobs():
+    async def scenario():
+        done = []
+        scheduler = JobScheduler(workers=2, max_queue=10, drain_timeout=5)
+        await scheduler.start()
+
+        async def job(i):
+            await asyncio.sleep(0.01)
+            done.append(i)
+
+        for i in range(6):
+            scheduler.submit(f"k{i % 3}", job, i)
+        await scheduler.stop()
+        with pytest.raises(SchedulerClosedError):
+            scheduler.submit("k0", job, 99)
+        return done
+
+    assert sorted(run(scenario())) == list(range(6))
+
+def test_drain_timeout_aborts_running_and_dropped_jobs():
+    async def scenario():
+        aborted = {}
+        scheduler = JobScheduler(workers=1, max_queue=10, drain_timeout=0.05)
+        started = asyncio.Event()
+
+        async def stuck():
+            started.set()
+            await asyncio.sleep(60)
+
+        for name in ("running", "queued1", "queued2"):
+            scheduler.submit("book", stuck, on_abort=lambda reason, name=name: aborted.setdefault(name, reason))
+        await scheduler.start()
+        await started.wait()
+        await scheduler.stop()
+        return aborted, scheduler.stats()
+
+    aborted, stats = run(scenario())
+    assert set(aborted) == {"running", "queued1", "queued2"}
+    assert "Cancelled" in aborted["running"] and "Dropped" in aborted["queued1"]
+    assert stats["depth"] == 0 and stats["in_flight"] == 0
+
+def test_scheduler_restarts_after_a_timed_out_stop():
+    async def scenario():
+        scheduler = JobScheduler(workers=1, max_queue=10, drain_timeout=0.01)
+
+        async def stuck():
+            await asyncio.sleep(60)
+
+        scheduler.submit("a", stuck)
+        await scheduler.start()
+        await asyncio.sleep(0)
+        await scheduler.stop()
+
+        done = asyncio.Event()
+
+        async def job():
+            done.set()
+
+        await scheduler.start()
+        scheduler.submit("a", job)
+        await asyncio.wait_for(done.wait(), timeout=1)
+        scheduler.drain_timeout = 1
+        await scheduler.stop()
+
+    run(scenario())
@@ -0,0 +1,153 @@
+import asyncio
+import socket
+import pytest
+from benchmarks.segmind_stub import PNG, start
+from app.core.http_client import HTTPClientManager
+from app.core.segmind import AdaptiveLimiter, CircuitBreaker, CircuitOpenError, SegmindClient, SegmindError
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 10))
+
+async def with_stub(scenario, **config):
+    runner = await start(port=0, **{"latency": 0, **config})
+    host, port = runner.addresses[0][:2]
+    http = HTTPClientManager(connect_timeout=1, read_timeout=5)
+    try:
+        return await scenario(f"http://{host}:{port}/v1/faceswap", runner.app["stats"], runner.app["state"], http)
+    finally:
+        await http.close()
+        await runner.cleanup()
+
+def client(url, http, **options):
+    options.setdefault("retries", 2)
+    options.setdefault("backoff_base", 0.001)
+    options.setdefault("backoff_max", 0.01)
+    options.setdefault("breaker_max_wait", 0)
+    options.setdefault("limiter", AdaptiveLimiter(initial=4, minimum=1, maximum=8))
+    options.setdefault("breaker", CircuitBreaker(threshold=100, reset_timeout=60))
+    return SegmindClient(url=url, api_key="test", http=http, **options)
+
+def test_successful_swap_returns_the_image():
+    async def scenario(url, stats, state, http):
+        segmind = client(url, http)
+        result = await segmind.swap({"source_img": "a"})
+        return result, segmind.stats()
+
+    result, stats = run(with_stub(scenario))
+    assert result == PNG
+    assert stats["attempts"] == 1 and stats["limiter"]["in_flight"] == 0
+    assert stats["breaker"]["state"] == "closed"
+
+def test_server_errors_are_retried_then_fail():
+    async def scenario(url, stats, state, http):
+        segmind = client(url, http)
+        with pytest.raises(SegmindError) as raised:
+            await segmind.swap({})
+        return raised.value, stats["requests"], segmind.stats()
+
+    error, requests, stats = run(with_stub(scenario, error_rate=1))
+    assert error.status == 503 and error.retryable
+    assert requests == 3
+    assert stats["retried"] == 2 and stats["failed"] == 1
+
+def test_throttled_call_succeeds_on_retry():
+    async def scenario(url, stats, state, http):
+        segmind = client(url, http, retries=10)
+        task = asyncio.create_task(segmind.swap({}))
+        while stats["throttled"] == 0:
+            await asyncio.sleep(0.001)
+        state["throttle_rate"] = 0
+        return await task, stats["throttled"], segmind.stats()
+
+    result, throttled, stats = run(with_stub(scenario, throttle_rate=1, retry_after=0))
+    assert result == PNG
+    assert stats["retried"] == throttled >= 1
+
+def test_read_timeout_is_not_retried():
+    async def scenario(url, stats, state, http):
+        segmind = client(url, http, read_timeout=0.2)
+        with pytest.raises(SegmindError) as raised:
+            await segmind.swap({})
+        return raised.value, stats["requests"]
+
+    # Slower than the read timeout, and short enough for the stub to shut down quickly
+    error, requests = run(with_stub(scenario, latency=1))
+    assert not error.retryable
+    assert requests == 1
+
+def test_connection_failure_is_retried():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    async def scenario():
+        http = HTTPClientManager(connect_timeout=1)
+        try:
+            segmind = client(f"http://127.0.0.1:{port}/v1/faceswap", http)
+            with pytest.raises(SegmindError) as raised:
+                await segmind.swap({})
+            return raised.value, segmind.stats()
+        finally:
+            await http.close()
+
+    error, stats = run(scenario())
+    assert error.retryable
+    assert stats["attempts"] == 3
+
+def test_breaker_opens_then_probes_and_closes():
+    async def scenario(url, stats, state, http):
+        breaker = CircuitBreaker(threshold=2, reset_timeout=0.2)
+        segmind = client(url, http, retries=0, breaker=breaker, breaker_max_wait=0)
+        for _ in range(2):
+            with pytest.raises(SegmindError):
+                await segmind.swap({})
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            await segmind.swap({})
+        assert stats["requests"] == 2
+
+        state["error_rate"] = 0
+        segmind.breaker_max_wait = 1
+        result = await segmind.swap({})
+        return result, breaker.state, breaker.trips
+
+    result, state, trips = run(with_stub(scenario, error_rate=1))
+    assert result == PNG and state == CircuitBreaker.CLOSED and trips == 1
+
+def test_limiter_grows_only_when_saturated_and_shrinks_on_failure():
+    async def scenario():
+        limiter = AdaptiveLimiter(initial=2, minimum=1, maximum=4, slow_seconds=10, decrease_factor=0.5)
+        # One call at a time never uses the whole limit
+        for _ in range(5):
+            await limiter.acquire()
+            await limiter.release(0.01, True)
+        idle_limit = limiter.limit
+
+        for _ in range(3):
+            await asyncio.gather(limiter.acquire(), limiter.acquire())
+            await limiter.release(0.01, True)
+            await limiter.release(0.01, True)
+        grown_limit = limiter.limit
+
+        await limiter.acquire()
+        await limiter.release(0.01, False)
+        return idle_limit, grown_limit, limiter.limit
+
+    idle_limit, grown_limit, shrunk_limit = run(scenario())
+    assert idle_limit == 2
+    assert grown_limit > 2
+    assert shrunk_limit == pytest.approx(grown_limit * 0.5)
+
+def test_limiter_caps_calls_in_flight():
+    async def scenario():
+        limiter = AdaptiveLimiter(initial=2, minimum=1, maximum=2)
+        await limiter.acquire()
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        blocked = not waiter.done()
+        await limiter.release(0.01, True)
+        await asyncio.wait_for(waiter, 1)
+        return blocked, limiter.in_flight
+
+    assert run(scenario()) == (True, 2)
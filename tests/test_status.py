@@ -0,0 +1,63 @@
+import asyncio
+import json
+import uuid
+from fastapi import Response
+from app.api.endpoints.process import ProcessStatusRequest, get_process_status, parse_etag, set_page_state
+from app.core.cache import cache
+
+def new_process():
+    process_id = str(uuid.uuid4())
+    cache.set(process_id, {"a": {"status": "PENDING", "url": None}})
+    return process_id, cache.get_version(process_id)
+
+def status(if_none_match=None, **fields):
+    return get_process_status(ProcessStatusRequest(**fields), Response(), if_none_match)
+
+def test_parse_etag():
+    assert parse_etag('"7"') == 7
+    assert parse_etag(' W/"7" ') == 7
+    assert parse_etag("7") == 7
+    assert parse_etag('"abc"') is None
+    assert parse_etag(None) is None
+    assert parse_etag("") is None
+
+def test_full_answer_carries_the_version():
+    process_id, version = new_process()
+    response = Response()
+    result = asyncio.run(get_process_status(ProcessStatusRequest(process_id=process_id), response, None))
+    assert result.version == version
+    assert response.headers["ETag"] == f'"{version}"'
+    assert [page.status for page in result.data] == ["PENDING"]
+
+def test_unchanged_record_answers_304_to_if_none_match():
+    process_id, version = new_process()
+    result = asyncio.run(status(f'W/"{version}"', process_id=process_id))
+    assert result.status_code == 304
+    assert result.headers["ETag"] == f'"{version}"'
+
+def test_unchanged_record_answers_short_to_if_version():
+    process_id, version = new_process()
+    result = asyncio.run(status(process_id=process_id, if_version=version, wait_seconds=0.05))
+    body = json.loads(result.body)
+    assert body["status_code"] == 5002 and body["version"] == version
+    assert body["data"] is None
+
+def test_long_poll_returns_as_soon_as_the_record_changes():
+    async def scenario():
+        process_id, version = new_process()
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.05, lambda: set_page_state(process_id, "a", status="COMPLETED", url="a.png"))
+        started = loop.time()
+        result = await status(process_id=process_id, if_version=version, wait_seconds=5)
+        return result, version, loop.time() - started
+
+    result, version, elapsed = asyncio.run(scenario())
+    assert elapsed < 1
+    assert result.status_code == 5000 and result.version == version + 1
+    assert result.data[0].status == "COMPLETED"
+
+def test_stale_etag_gets_the_full_answer():
+    process_id, version = new_process()
+    set_page_state(process_id, "a", status="PROCESSING")
+    result = asyncio.run(status(f'"{version}"', process_id=process_id))
+    assert result.status_code == 5000 and result.version == version + 1
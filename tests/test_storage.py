@@ -0,0 +1,73 @@
+import asyncio
+import io
+import sqlite3
+import time
+import pytest
+from app.core.storage import ContentStore, find_stored
+
+@pytest.fixture
+def store(tmp_path):
+    return ContentStore(root=str(tmp_path / "uploads"), index_path=str(tmp_path / "uploads.db"))
+
+def upload(store: ContentStore, data: bytes) -> str:
+    stream = io.BytesIO(data)
+
+    async def read(n: int) -> bytes:
+        return stream.read(n)
+
+    filename, _ = asyncio.run(store.ingest(read, "png"))
+    return filename
+
+def test_repeat_upload_is_stored_once(store):
+    first = upload(store, b"photo")
+    second = upload(store, b"photo")
+    assert first == second
+    assert store.stats()["files"] == 1 and store.stats()["uploads"] == 2
+
+def test_reference_is_counted_once_per_job(store):
+    name = upload(store, b"photo")
+    later = time.time() + 60
+    assert store.acquire(name, "job-a", later) == 1
+    assert store.acquire(name, "job-a", later + 60) == 1
+    assert store.acquire(name, "job-b", later) == 2
+    assert store.acquire("0" * 64 + ".png", "job-a", later) == 0
+
+def test_file_is_deleted_only_when_no_job_holds_it(store):
+    name = upload(store, b"photo")
+    now = time.time()
+    store.acquire(name, "job-a", now + 10)
+    store.acquire(name, "job-b", now + 20)
+    assert not store.delete(name, uploaded_before=now + 100)
+
+    assert store.release_expired(now=now + 15) == 1
+    assert store.refcount(name) == 1
+    assert not store.delete(name, uploaded_before=now + 100)
+
+    assert store.release_expired(now=now + 25) == 1
+    assert store.refcount(name) == 0
+    assert store.delete(name, uploaded_before=now + 100)
+    assert not find_stored(name, str(store.root)).exists()
+    assert store.lookup(name.split(".")[0]) is None
+
+def test_recent_upload_is_kept_until_claimed(store):
+    name = upload(store, b"photo")
+    assert not store.delete(name, uploaded_before=time.time() - 60)
+    assert find_stored(name, str(store.root)).exists()
+
+def test_index_from_before_reference_counting_is_migrated(tmp_path):
+    index_path = str(tmp_path / "uploads.db")
+    conn = sqlite3.connect(index_path)
+    conn.execute(
+        "CREATE TABLE blobs (digest TEXT PRIMARY KEY, filename TEXT NOT NULL, size INTEGER NOT NULL, "
+        "refcount INTEGER NOT NULL, created_at REAL NOT NULL)"
+    )
+    conn.execute("INSERT INTO blobs VALUES (?, ?, 5, 3, 0)", ("a" * 64, "a" * 64 + ".png"))
+    conn.commit()
+    conn.close()
+
+    store = ContentStore(root=str(tmp_path / "uploads"), index_path=index_path)
+    assert store.stats()["uploads"] == 3
+    assert store.refcount("a" * 64 + ".png") == 0
+    # Opening it again leaves the migrated schema alone
+    store = ContentStore(root=str(tmp_path / "uploads"), index_path=index_path)
+    assert store.acquire("a" * 64 + ".png", "job", time.time() + 60) == 1
@@ -0,0 +1,137 @@
+import sqlite3
+import threading
+import time
+import pytest
+from app.core.config import settings
+from app.core.store import MemoryJobStore, SqliteJobStore
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryJobStore(ttl=60)
+    return SqliteJobStore(str(tmp_path / "jobs.db"), ttl=60)
+
+def test_set_get_and_find_by_page(store):
+    store.set("init", {"p1": {"status": "PENDING"}, "p2": {"status": "PENDING"}})
+    assert store.get("init")["p2"] == {"status": "PENDING"}
+    assert store.find_by_page("p1") == "init"
+    assert store.find_by_page("missing") is None
+    store.delete("init")
+    assert store.get("init") is None
+    assert store.find_by_page("p1") is None
+
+def test_entries_expire_by_their_own_ttl(store):
+    store.set("short", {"p1": {}}, expire=0.05)
+    store.set("long", {"p2": {}})
+    time.sleep(0.1)
+    assert store.get("short") is None
+    assert store.find_by_page("p1") is None
+    assert store.get("long") == {"p2": {}}
+    assert len(store) == 1
+
+def test_update_pages_merges_fields_and_bumps_version_once(store):
+    store.set("init", {"p1": {"status": "PENDING", "url": None}})
+    version = store.get_version("init")
+    new_version = store.update_pages("init", {"p1": {"status": "COMPLETED"}, "p2": {"status": "FAILED"}})
+    assert new_version == version + 1
+    record_version, record = store.get_record("init")
+    assert record_version == new_version
+    assert record == {"p1": {"status": "COMPLETED", "url": None}, "p2": {"status": "FAILED"}}
+    assert store.find_by_page("p2") == "init"
+
+def test_update_page_creates_missing_record(store):
+    assert store.update_page("fresh", "p1", {"status": "PENDING"}) >= 1
+    assert store.get("fresh") == {"p1": {"status": "PENDING"}}
+
+def test_concurrent_page_updates_are_not_lost(store):
+    store.set("init", {f"p{i}": {"status": "PENDING"} for i in range(8)})
+
+    def finish(i):
+        for n in range(20):
+            store.update_page("init", f"p{i}", {"status": "PROCESSING", "step": n})
+        store.update_page("init", f"p{i}", {"status": "COMPLETED"})
+
+    threads = [threading.Thread(target=finish, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    record = store.get("init")
+    assert all(record[f"p{i}"] == {"status": "COMPLETED", "step": 19} for i in range(8))
+
+def test_record_snapshot_is_detached(store):
+    store.set("init", {"p1": {"status": "PENDING"}})
+    _, record = store.get_record("init")
+    record["p1"]["status"] = "CHANGED"
+    assert store.get("init")["p1"]["status"] == "PENDING"
+
+def test_memory_store_evicts_least_recently_used_by_count():
+    store = MemoryJobStore(ttl=60, maxsize=2)
+    store.set("a", {})
+    store.set("b", {})
+    store.get("a")
+    store.set("c", {})
+    assert store.get("b") is None
+    assert store.get("a") == {} and store.get("c") == {}
+    assert store.evictions == 1
+
+@pytest.mark.parametrize("read", ["get_record", "get_version"])
+def test_memory_store_status_reads_keep_a_job_recent(read):
+    store = MemoryJobStore(ttl=60, maxsize=2)
+    store.set("polled", {"p1": {}})
+    store.set("idle", {"p2": {}})
+    getattr(store, read)("polled")
+    store.set("new", {})
+    assert store.get("idle") is None
+    assert store.get("polled") == {"p1": {}}
+
+def test_result_fingerprints_do_not_evict_job_records():
+    from app.core.cache import cache, result_cache
+    assert result_cache.stats()["ttl"] == settings.RESULT_CACHE_TTL
+    cache.set("job", {"p1": {}})
+    for i in range(cache.stats().get("max_size", 1000) + 1):
+        result_cache.set(f"result:{i}", f"{i}.png")
+    assert cache.get("job") == {"p1": {}}
+    cache.delete("job")
+    result_cache.clear()
+
+def test_memory_store_evicts_by_bytes():
+    store = MemoryJobStore(ttl=60, max_bytes=100, size_func=lambda value: value["size"])
+    store.set("a", {"size": 60})
+    store.set("b", {"size": 60})
+    assert store.get("a") is None
+    assert store.get("b") == {"size": 60}
+    with pytest.raises(ValueError):
+        store.set("c", {"size": 101})
+
+def test_sqlite_store_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    first = SqliteJobStore(path, ttl=60)
+    second = SqliteJobStore(path, ttl=60)
+    first.set("init", {"p1": {"status": "PENDING"}})
+    second.update_page("init", "p1", {"status": "COMPLETED"})
+    assert first.get("init") == {"p1": {"status": "COMPLETED"}}
+    assert first.get_version("init") == second.get_version("init")
+
+def test_sqlite_store_retries_briefly_while_another_worker_holds_the_lock(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    store = SqliteJobStore(path, ttl=60, busy_timeout=0.01, retries=20)
+    other = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.1, other.execute, args=("COMMIT",)).start()
+    store.set("init", {"p1": {}})
+    assert store.get("init") == {"p1": {}}
+    assert store.stats()["busy_retries"] > 0
+
+def test_sqlite_store_gives_up_quickly_on_a_held_lock(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    store = SqliteJobStore(path, ttl=60, busy_timeout=0.01, retries=2)
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    started = time.monotonic()
+    with pytest.raises(sqlite3.OperationalError):
+        store.set("init", {"p1": {}})
+    assert time.monotonic() - started < 1
+    other.execute("ROLLBACK")
+    store.set("init", {"p1": {}})
+    assert store.get("init") == {"p1": {}}